@@ -24,7 +24,7 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from typing import List, Union
+from typing import List, Optional, Union
 
 from math import log
 
@@ -40,6 +40,8 @@ from gem5.components.processors.random_generator_core import (
     RandomGeneratorCore,
 )
 
+from components.hybrid_trace import TraceGeneratorCore, precompute_stream
+
 
 class HybridGenerator(AbstractGenerator):
     def __init__(
@@ -52,6 +54,8 @@ class HybridGenerator(AbstractGenerator):
         max_addr: int = 131072,
         rd_perc: int = 100,
         data_limit: int = 0,
+        trace_dir: Optional[str] = None,
+        seed: int = 0,
     ) -> None:
         if num_cores < 2:
             raise ValueError("num_cores should be >= 2!")
@@ -65,6 +69,8 @@ class HybridGenerator(AbstractGenerator):
                 max_addr=max_addr,
                 rd_perc=rd_perc,
                 data_limit=data_limit,
+                trace_dir=trace_dir,
+                seed=seed,
             )
         )
         """The hybrid generator
@@ -87,6 +93,11 @@ class HybridGenerator(AbstractGenerator):
                         ``100 - rd_perc``.
         :param data_limit: The amount of data in bytes to read/write by the
                            generator before stopping generation.
+        :param trace_dir: If given, the request stream of every core is
+                          computed ahead of time, stored in this directory
+                          and replayed from a trace (see ``hybrid_trace``).
+                          Streams already in the directory are reused.
+        :param seed: The seed of the precomputed random streams.
         """
 
     def _create_cores(
@@ -99,7 +110,11 @@ class HybridGenerator(AbstractGenerator):
         max_addr: int,
         rd_perc: int,
         data_limit: int,
-    ) -> List[Union[LinearGeneratorCore, RandomGeneratorCore]]:
+        trace_dir: Optional[str] = None,
+        seed: int = 0,
+    ) -> List[
+        Union[LinearGeneratorCore, RandomGeneratorCore, TraceGeneratorCore]
+    ]:
         """
         The helper function to create the cores for the generator, it will use
         the same inputs as the constructor function.
@@ -142,6 +157,21 @@ class HybridGenerator(AbstractGenerator):
         Linear Generator Cores cover the range of min_addr to max_addr
         """
         # (3)
+        if trace_dir is not None:
+            return self._create_trace_cores(
+                addr_ranges=addr_ranges,
+                num_random_cores=num_random_cores,
+                duration=duration,
+                rate=rate,
+                block_size=block_size,
+                min_addr=min_addr,
+                max_addr=max_addr,
+                rd_perc=rd_perc,
+                data_limit=data_limit,
+                trace_dir=trace_dir,
+                seed=seed,
+            )
+
         for i in range(num_linear_cores):
             core_list.append(
                 LinearGeneratorCore(
@@ -180,6 +210,48 @@ class HybridGenerator(AbstractGenerator):
         # (5)
         return core_list
 
+    def _create_trace_cores(
+        self,
+        addr_ranges: List,
+        num_random_cores: int,
+        duration: str,
+        rate: str,
+        block_size: int,
+        min_addr: int,
+        max_addr: int,
+        rd_perc: int,
+        data_limit: int,
+        trace_dir: str,
+        seed: int,
+    ) -> List[TraceGeneratorCore]:
+        """
+        Create trace generator cores replaying the same mix of linear and
+        random streams as the linear and random generator cores would make.
+        """
+        streams = [
+            ("linear", core_min_addr, core_max_addr)
+            for core_min_addr, core_max_addr in addr_ranges
+        ] + [("random", min_addr, max_addr)] * num_random_cores
+
+        core_list = []
+        for i, (kind, core_min_addr, core_max_addr) in enumerate(streams):
+            trace_file = precompute_stream(
+                trace_dir=trace_dir,
+                kind=kind,
+                duration=duration,
+                rate=rate,
+                block_size=block_size,
+                min_addr=core_min_addr,
+                max_addr=core_max_addr,
+                rd_perc=rd_perc,
+                data_limit=data_limit,
+                seed=(seed, i),
+            )
+            core_list.append(
+                TraceGeneratorCore(duration=duration, trace_file=trace_file)
+            )
+        return core_list
+
     @overrides(AbstractGenerator)
     def start_traffic(self) -> None:
         for core in self.cores:
@@ -0,0 +1,319 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Precomputed request streams for the hybrid generator.
+
+Instead of synthesizing every request while the simulation runs, the stream
+of each generator core (its request ticks, addresses and read/write mix) is
+computed ahead of time with NumPy, stored as a memory-mapped `.npy` file and
+encoded as a gem5 packet trace, which a `TraceGeneratorCore` then replays.
+
+The files are named after a hash of the stream's parameters, so the streams
+are computed once and shared by every configuration (e.g., every memory
+model in a sweep) which uses the same trace directory. As the random streams
+come from a seeded generator, every configuration sees exactly the same
+requests.
+
+The ticks are computed for gem5's default tick frequency of 1THz. The trace
+header records it and gem5 refuses to replay a trace with a different
+frequency.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Union
+
+import numpy as np
+
+from m5.objects import BaseTrafficGen, Port, PyTrafficGen
+from m5.ticks import fromSeconds
+from m5.util.convert import toLatency, toMemoryBandwidth
+
+from gem5.utils.override import overrides
+from gem5.components.processors.abstract_generator_core import (
+    AbstractGeneratorCore,
+)
+
+TICKS_PER_SECOND = 10**12
+
+# The MemCmd values of read and write requests.
+READ_REQ = 1
+WRITE_REQ = 4
+
+STREAM_DTYPE = np.dtype([("tick", "<u8"), ("addr", "<u8"), ("cmd", "u1")])
+
+# Bump when the stream generation changes so stale files are not reused.
+STREAM_VERSION = 1
+
+# The number of requests generated and encoded at a time.
+CHUNK_SIZE = 1 << 20
+
+# The ProtoOutputStream magic number ("gem5") which starts every trace.
+_TRACE_MAGIC = 0x356D6567
+
+
+def stream_length(
+    duration: str, rate: str, block_size: int, data_limit: int
+) -> int:
+    """The number of requests a generator core makes."""
+    period = _period_ticks(rate, block_size)
+    num_requests = _to_ticks(duration) // period
+    if data_limit > 0:
+        num_requests = min(num_requests, -(-data_limit // block_size))
+    return num_requests
+
+
+def _to_ticks(duration: str) -> int:
+    return round(toLatency(duration) * TICKS_PER_SECOND)
+
+
+def _period_ticks(rate: str, block_size: int) -> int:
+    return max(
+        1, round(block_size / toMemoryBandwidth(rate) * TICKS_PER_SECOND)
+    )
+
+
+def _fill_stream(
+    stream: np.ndarray,
+    kind: str,
+    period: int,
+    block_size: int,
+    min_addr: int,
+    max_addr: int,
+    rd_perc: int,
+    seed: Union[int, Sequence[int]],
+) -> None:
+    """
+    Fill ``stream`` in place. Linear streams walk from ``min_addr`` to
+    ``max_addr`` a block at a time and wrap around; random streams pick a
+    block aligned address in the range uniformly.
+    """
+    rng = np.random.default_rng(seed)
+    span = (max_addr - min_addr) // block_size
+    if span <= 0:
+        raise ValueError("The address range is smaller than a block.")
+
+    for start in range(0, len(stream), CHUNK_SIZE):
+        chunk = stream[start : start + CHUNK_SIZE]
+        index = np.arange(start, start + len(chunk), dtype=np.uint64)
+        chunk["tick"] = index * np.uint64(period)
+        if kind == "linear":
+            blocks = index % np.uint64(span)
+        else:
+            blocks = rng.integers(0, span, size=len(chunk), dtype=np.uint64)
+        chunk["addr"] = np.uint64(min_addr) + blocks * np.uint64(block_size)
+        if rd_perc >= 100:
+            chunk["cmd"] = READ_REQ
+        elif rd_perc <= 0:
+            chunk["cmd"] = WRITE_REQ
+        else:
+            reads = rng.integers(0, 100, size=len(chunk)) < rd_perc
+            chunk["cmd"] = np.where(reads, READ_REQ, WRITE_REQ)
+
+
+def _varint(values: np.ndarray, width: int):
+    """
+    Encode ``values`` as protobuf varints.
+
+    :returns: A (len(values), width) array of the encoded bytes and a mask of
+    the bytes which are part of each encoding.
+    """
+    shifts = np.arange(width, dtype=np.uint64) * np.uint64(7)
+    groups = values.astype(np.uint64)[:, None] >> shifts
+    more = (groups >> np.uint64(7)) != 0
+    data = (groups & np.uint64(0x7F)).astype(np.uint8)
+    data |= more.astype(np.uint8) << 7
+    used = np.ones_like(more)
+    used[:, 1:] = more[:, :-1]
+    return data, used
+
+
+def _field(tag: int, num_rows: int):
+    return np.full((num_rows, 1), tag, dtype=np.uint8), np.ones(
+        (num_rows, 1), dtype=bool
+    )
+
+
+def _encode_packets(chunk: np.ndarray, block_size: int) -> bytes:
+    """
+    Encode requests as length-delimited `ProtoMessage::Packet`s, i.e., the
+    tick (field 1), cmd (2), addr (3) and size (4) fields.
+    """
+    num_rows = len(chunk)
+    size_data, size_used = _varint(np.array([block_size]), 2)
+    fields = [
+        _field(0x08, num_rows),
+        _varint(chunk["tick"], 10),
+        _field(0x10, num_rows),
+        (chunk["cmd"].reshape(-1, 1), np.ones((num_rows, 1), dtype=bool)),
+        _field(0x18, num_rows),
+        _varint(chunk["addr"], 10),
+        _field(0x20, num_rows),
+        (
+            np.repeat(size_data, num_rows, axis=0),
+            np.repeat(size_used, num_rows, axis=0),
+        ),
+    ]
+    used = np.hstack([field_used for _, field_used in fields])
+    # a packet is at most 27 bytes long, so its length is a single byte
+    length = used.sum(axis=1).astype(np.uint8).reshape(-1, 1)
+    data = np.hstack([length] + [field_data for field_data, _ in fields])
+    used = np.hstack([np.ones((num_rows, 1), dtype=bool), used])
+    return data[used].tobytes()
+
+
+def _encode_header() -> bytes:
+    """Encode the `ProtoMessage::PacketHeader` of the trace."""
+    obj_id = b"hybrid_trace"
+    frequency, used = _varint(np.array([TICKS_PER_SECOND]), 10)
+    header = (
+        bytes([0x0A, len(obj_id)])
+        + obj_id
+        + bytes([0x10, 0x00, 0x18])
+        + frequency[used].tobytes()
+    )
+    return bytes([len(header)]) + header
+
+
+def write_trace(stream: np.ndarray, block_size: int, path: Path) -> None:
+    """Write ``stream`` as a gem5 packet trace."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}")
+    with tmp.open("wb") as f:
+        f.write(_TRACE_MAGIC.to_bytes(4, "little"))
+        f.write(_encode_header())
+        for start in range(0, len(stream), CHUNK_SIZE):
+            f.write(
+                _encode_packets(
+                    stream[start : start + CHUNK_SIZE], block_size
+                )
+            )
+    os.replace(tmp, path)
+
+
+def precompute_stream(
+    trace_dir: str,
+    kind: str,
+    duration: str,
+    rate: str,
+    block_size: int,
+    min_addr: int,
+    max_addr: int,
+    rd_perc: int,
+    data_limit: int,
+    seed: Union[int, Sequence[int]],
+) -> Path:
+    """
+    Compute the request stream of a generator core, unless an identical
+    stream is already in ``trace_dir``.
+
+    :param kind: "linear" or "random".
+    :param seed: The seed of the random addresses and read/write mix. Use a
+    different seed for every core, e.g., (seed, core index).
+
+    :returns: The path of the packet trace. The stream itself is next to it,
+    with the `.npy` suffix, and can be opened with
+    `np.load(path, mmap_mode="r")`.
+    """
+    if kind not in ("linear", "random"):
+        raise ValueError(f"Unknown stream kind {kind}.")
+    params = {
+        "version": STREAM_VERSION,
+        "kind": kind,
+        "num_requests": stream_length(duration, rate, block_size, data_limit),
+        "period": _period_ticks(rate, block_size),
+        "block_size": block_size,
+        "min_addr": min_addr,
+        "max_addr": max_addr,
+        "rd_perc": rd_perc,
+        "seed": list(np.atleast_1d(seed).tolist()),
+    }
+    key = hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    trace_dir = Path(trace_dir)
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    stream_path = trace_dir / f"{kind}-{key}.npy"
+    trace_path = trace_dir / f"{kind}-{key}.trace"
+    if trace_path.exists() and stream_path.exists():
+        return trace_path
+
+    tmp = trace_dir / f".{stream_path.name}.{os.getpid()}"
+    stream = np.lib.format.open_memmap(
+        tmp, mode="w+", dtype=STREAM_DTYPE, shape=(params["num_requests"],)
+    )
+    _fill_stream(
+        stream,
+        kind,
+        params["period"],
+        block_size,
+        min_addr,
+        max_addr,
+        rd_perc,
+        seed,
+    )
+    stream.flush()
+    del stream
+    os.replace(tmp, stream_path)
+
+    write_trace(np.load(stream_path, mmap_mode="r"), block_size, trace_path)
+    return trace_path
+
+
+class TraceGeneratorCore(AbstractGeneratorCore):
+    """A generator core which replays a packet trace."""
+
+    def __init__(self, duration: str, trace_file: str, addr_offset: int = 0):
+        """
+        :param duration: The number of ticks for the generator to replay the
+                         trace.
+        :param trace_file: The packet trace to replay.
+        :param addr_offset: The offset added to every address of the trace.
+        """
+        super().__init__()
+        self.generator = PyTrafficGen()
+        self._duration = duration
+        self._trace_file = str(trace_file)
+        self._addr_offset = addr_offset
+        self._traffic: Optional[Iterator[BaseTrafficGen]] = None
+
+    @overrides(AbstractGeneratorCore)
+    def connect_dcache(self, port: Port) -> None:
+        self.generator.port = port
+
+    def _create_traffic(self) -> Iterator[BaseTrafficGen]:
+        duration = fromSeconds(toLatency(self._duration))
+        yield self.generator.createTrace(
+            duration, self._trace_file, self._addr_offset
+        )
+        yield self.generator.createExit(0)
+
+    @overrides(AbstractGeneratorCore)
+    def start_traffic(self) -> None:
+        self._traffic = self._create_traffic()
+        self.generator.start(self._traffic)
@@ -24,6 +24,7 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import argparse
 
 import m5
 from m5.objects import Root
@@ -39,12 +40,25 @@ from gem5.components.processors.random_generator import RandomGenerator
 # Run with the following command
 # cd ./materials/02-Using-gem5/03-running-in-gem5/06-traffic-gen/completed/step-2-hybrid-gen
 # gem5 --debug-flags=TrafficGen --debug-end=1000000 simple-traffic-generators.py
+#
+# Add `--trace-dir=<dir>` to precompute the request streams into <dir> and
+# replay them from traces. Later runs with the same directory reuse them.
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--trace-dir",
+    type=str,
+    default=None,
+    help="Precompute the request streams into this directory and replay "
+    "them.",
+)
+args = parser.parse_args()
 
 cache_hierarchy = MyPrivateL1SharedL2CacheHierarchy()
 
 memory = SingleChannelDDR3_1600()
 
-generator = HybridGenerator(num_cores=6)
+generator = HybridGenerator(num_cores=6, trace_dir=args.trace_dir)
 
 motherboard = TestBoard(
     clk_freq="3GHz",
@@ -34,9 +34,15 @@ def handle_workbegin():
         yield False
 
 
-def handle_workend():
+def handle_workend(dump_stats=m5.stats.dump):
+    """
+    :param dump_stats: The function called to dump the stats at the end of
+    every ROI, e.g., `BinaryStatsSink(...).dump` from
+    09-sampling/binary_stats.py to write them in binary form instead (or
+    `BinaryStatsSink(..., text=True).dump` for both).
+    """
     while True:
-        m5.stats.dump()
+        dump_stats()
         yield True
 
 
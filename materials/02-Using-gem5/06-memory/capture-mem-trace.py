@@ -0,0 +1,49 @@
+"""
+This script captures the memory traffic of a CPU running a workload, so it
+can be replayed against other memory devices with run-mem.py without
+simulating the CPU again.
+
+The requests reaching memory are recorded by the `TracedMemory` wrapper and
+written to <outdir>/mem_trace0.gz.
+
+This script can be run with the following command:
+gem5 -re --outdir=capture capture-mem-trace.py
+
+and the trace replayed with:
+gem5 run-mem.py -c TraceGenerator --trace capture/mem_trace0.gz
+"""
+
+import m5
+
+from gem5.components.boards.simple_board import SimpleBoard
+from gem5.components.cachehierarchies.classic.private_l1_cache_hierarchy import (
+    PrivateL1CacheHierarchy,
+)
+from gem5.components.memory.single_channel import SingleChannelDDR4_2400
+from gem5.components.processors.cpu_types import CPUTypes
+from gem5.components.processors.simple_processor import SimpleProcessor
+from gem5.isas import ISA
+from gem5.resources.resource import obtain_resource
+from gem5.simulate.simulator import Simulator
+
+from mem_trace import TracedMemory
+
+memory = TracedMemory(SingleChannelDDR4_2400("1GiB"))
+
+board = SimpleBoard(
+    clk_freq="3GHz",
+    processor=SimpleProcessor(
+        cpu_type=CPUTypes.TIMING, isa=ISA.X86, num_cores=1
+    ),
+    memory=memory,
+    cache_hierarchy=PrivateL1CacheHierarchy(
+        l1d_size="32KiB", l1i_size="32KiB"
+    ),
+)
+board.set_workload(obtain_resource("x86-matrix-multiply"))
+
+simulator = Simulator(board=board)
+simulator.run()
+
+for trace_file in memory.get_trace_files(m5.options.outdir):
+    print(f"Wrote {trace_file}")
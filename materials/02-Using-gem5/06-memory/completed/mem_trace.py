@@ -0,0 +1,488 @@
+"""
+Capture the memory traffic of a simulation once and replay it against many
+memory systems.
+
+* `TracedMemory` wraps any memory system of the standard library and puts a
+  `CommMonitor` with a `MemTraceProbe` in front of each of its ports, so the
+  requests reaching memory are written to `<outdir>/<trace_file><i>.gz`.
+* `read_trace` decodes a trace in chunks of NumPy arrays, streaming both the
+  decompression and the protobuf decoding, so traces of any length can be
+  inspected without loading them in memory.
+* `normalize_trace` rewrites a captured trace so it only contains read and
+  write requests, which is what `TraceGen` can replay. Cache writebacks
+  become writes and cache fills become reads.
+* `TraceReplayGenerator` is a generator for the `TestBoard` which replays
+  one or more (normalized) traces.
+
+See `capture-mem-trace.py` and `run-mem.py -c TraceGenerator` for usage.
+"""
+
+import gzip
+import os
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from m5.objects import (
+    AddrRange,
+    BaseTrafficGen,
+    CommMonitor,
+    MemCtrl,
+    MemTraceProbe,
+    Port,
+    PyTrafficGen,
+)
+
+from gem5.components.boards.abstract_board import AbstractBoard
+from gem5.components.memory.abstract_memory_system import (
+    AbstractMemorySystem,
+)
+from gem5.components.processors.abstract_generator import AbstractGenerator
+from gem5.components.processors.abstract_generator_core import (
+    AbstractGeneratorCore,
+)
+from gem5.utils.override import overrides
+
+# The ProtoOutputStream magic number ("gem5") which starts every trace.
+TRACE_MAGIC = 0x356D6567
+
+# MemCmd values, from src/mem/packet.hh.
+READ_REQ = 1
+WRITE_REQ = 4
+READ_CMDS = (
+    READ_REQ,
+    13,  # HardPFReq
+    22,  # ReadExReq
+    24,  # ReadCleanReq
+    25,  # ReadSharedReq
+)
+WRITE_CMDS = (
+    WRITE_REQ,
+    7,  # WritebackDirty
+    8,  # WritebackClean
+    9,  # WriteClean
+    16,  # WriteLineReq
+)
+
+PACKET_DTYPE = np.dtype(
+    [
+        ("tick", "<u8"),
+        ("cmd", "<u4"),
+        ("addr", "<u8"),
+        ("size", "<u4"),
+        ("flags", "<u4"),
+    ]
+)
+
+# The number of bytes read from a trace at a time.
+CHUNK_SIZE = 1 << 22
+
+# A protobuf varint is at most 10 bytes long.
+_MAX_VARINT = 10
+
+
+def _open_trace(path: Path, mode: str):
+    if path.suffix != ".gz":
+        return path.open(mode)
+    if "w" in mode:
+        return gzip.open(path, mode, compresslevel=1)
+    return gzip.open(path, mode)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _decode_varints(buf: np.ndarray, pos: np.ndarray):
+    """
+    Decode the varints starting at ``pos`` in ``buf``.
+
+    :returns: The values and the position after each varint.
+    """
+    window = buf[pos[:, None] + np.arange(_MAX_VARINT)]
+    last = np.argmax(window < 0x80, axis=1)
+    used = np.arange(_MAX_VARINT) <= last[:, None]
+    groups = (window & 0x7F).astype(np.uint64) * used
+    shifts = np.arange(_MAX_VARINT, dtype=np.uint64) * np.uint64(7)
+    values = np.bitwise_or.reduce(groups << shifts, axis=1)
+    return values, pos + last + 1
+
+
+def _decode_packets(
+    buf: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    """
+    Decode the `ProtoMessage::Packet`s at ``starts`` (after their length).
+    The fields are serialized in field order and are all varints, so they
+    are decoded one field number at a time for all the packets at once.
+    Fields other than the ones in `PACKET_DTYPE` (e.g., pkt_id and pc) are
+    skipped.
+    """
+    packets = np.zeros(len(starts), dtype=PACKET_DTYPE)
+    cursor = starts.copy()
+    names = {1: "tick", 2: "cmd", 3: "addr", 4: "size", 5: "flags"}
+    for field in range(1, 8):
+        present = (cursor < ends) & (buf[cursor] == field << 3)
+        if not present.any():
+            continue
+        values, after = _decode_varints(buf, cursor[present] + 1)
+        if field in names:
+            packets[names[field]][present] = values
+        cursor[present] = after
+    return packets
+
+
+class TraceHeader(NamedTuple):
+    obj_id: str
+    tick_freq: int
+
+
+def _parse_header(message: bytes) -> TraceHeader:
+    obj_id = ""
+    tick_freq = 0
+    pos = 0
+    while pos < len(message):
+        key, pos = _read_varint(message, pos)
+        if key & 0x7 == 2:
+            length, pos = _read_varint(message, pos)
+            if key >> 3 == 1:
+                obj_id = message[pos : pos + length].decode()
+            pos += length
+        else:
+            value, pos = _read_varint(message, pos)
+            if key >> 3 == 3:
+                tick_freq = value
+    return TraceHeader(obj_id, tick_freq)
+
+
+def read_trace_header(path: Path) -> TraceHeader:
+    with _open_trace(Path(path), "rb") as f:
+        data = f.read(4096)
+    _check_magic(data, path)
+    length, pos = _read_varint(data, 4)
+    return _parse_header(data[pos : pos + length])
+
+
+def _check_magic(data: bytes, path) -> None:
+    if len(data) < 4 or int.from_bytes(data[:4], "little") != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a gem5 packet trace.")
+
+
+def read_trace(
+    path: Path, chunk_size: int = CHUNK_SIZE
+) -> Iterator[np.ndarray]:
+    """
+    Decode the packets of a trace, a chunk at a time.
+
+    :param path: The trace. It is decompressed on the fly if it ends in .gz.
+    :param chunk_size: The number of (decompressed) bytes decoded at a time.
+
+    :returns: An iterator of `PACKET_DTYPE` arrays.
+    """
+    path = Path(path)
+    with _open_trace(path, "rb") as f:
+        data = f.read(chunk_size)
+        _check_magic(data, path)
+        length, pos = _read_varint(data, 4)
+        data = data[pos + length :]
+        while True:
+            more = f.read(chunk_size)
+            data += more
+            # find the packets which are complete in this chunk
+            starts = []
+            ends = []
+            pos = 0
+            while pos < len(data):
+                if data[pos] < 0x80:
+                    length = data[pos]
+                    start = pos + 1
+                elif pos + _MAX_VARINT <= len(data) or not more:
+                    length, start = _read_varint(data, pos)
+                else:
+                    break
+                if start + length > len(data):
+                    break
+                starts.append(start)
+                ends.append(start + length)
+                pos = start + length
+            if starts:
+                # pad so varints can be read past the end of the buffer
+                buf = np.frombuffer(
+                    data[:pos] + bytes(_MAX_VARINT + 1), dtype=np.uint8
+                )
+                yield _decode_packets(
+                    buf,
+                    np.array(starts, dtype=np.int64),
+                    np.array(ends, dtype=np.int64),
+                )
+            data = data[pos:]
+            if not more:
+                if data:
+                    raise ValueError(f"{path} ends with a truncated packet.")
+                return
+
+
+def _encode_varints(values: np.ndarray, width: int):
+    """
+    Encode ``values`` as varints.
+
+    :returns: A (len(values), width) array of the encoded bytes and a mask of
+    the bytes which are part of each encoding.
+    """
+    shifts = np.arange(width, dtype=np.uint64) * np.uint64(7)
+    groups = values.astype(np.uint64)[:, None] >> shifts
+    more = (groups >> np.uint64(7)) != 0
+    data = (groups & np.uint64(0x7F)).astype(np.uint8)
+    data |= more.astype(np.uint8) << 7
+    used = np.ones_like(more)
+    used[:, 1:] = more[:, :-1]
+    return data, used
+
+
+def _encode_packets(packets: np.ndarray) -> bytes:
+    """Encode the tick, cmd, addr and size of packets."""
+    num_packets = len(packets)
+    fields = []
+    for key, name, width in (
+        (0x08, "tick", _MAX_VARINT),
+        (0x10, "cmd", 5),
+        (0x18, "addr", _MAX_VARINT),
+        (0x20, "size", 5),
+    ):
+        fields.append(
+            (
+                np.full((num_packets, 1), key, dtype=np.uint8),
+                np.ones((num_packets, 1), dtype=bool),
+            )
+        )
+        fields.append(_encode_varints(packets[name], width))
+    used = np.hstack([field_used for _, field_used in fields])
+    # these four fields are at most 34 bytes long, so the length of each
+    # packet is a single byte
+    length = used.sum(axis=1).astype(np.uint8)[:, None]
+    data = np.hstack([length] + [field_data for field_data, _ in fields])
+    used = np.hstack([np.ones((num_packets, 1), dtype=bool), used])
+    return data[used].tobytes()
+
+
+class TraceInfo(NamedTuple):
+    num_reads: int
+    num_writes: int
+    first_tick: int
+    last_tick: int
+    max_addr: int
+
+
+def normalize_trace(
+    src: Path, dst: Path, chunk_size: int = CHUNK_SIZE
+) -> TraceInfo:
+    """
+    Rewrite the trace ``src`` to ``dst`` with only ReadReqs and WriteReqs,
+    which `TraceGen` can replay. The other requests (e.g., CleanEvicts) do
+    not move data and are dropped.
+
+    :returns: A summary of the new trace.
+    """
+    src = Path(src)
+    dst = Path(dst)
+    header = read_trace_header(src)
+    obj_id = header.obj_id.encode()
+    header_message = (
+        b"\x0a"
+        + _write_varint(len(obj_id))
+        + obj_id
+        + b"\x10\x00\x18"
+        + _write_varint(header.tick_freq)
+    )
+
+    num_reads = num_writes = max_addr = 0
+    first_tick = last_tick = None
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}")
+    with _open_trace(tmp, "wb") as f:
+        f.write(TRACE_MAGIC.to_bytes(4, "little"))
+        f.write(_write_varint(len(header_message)) + header_message)
+        for packets in read_trace(src, chunk_size):
+            reads = np.isin(packets["cmd"], READ_CMDS)
+            writes = np.isin(packets["cmd"], WRITE_CMDS)
+            keep = reads | writes
+            packets = packets[keep]
+            packets["cmd"] = np.where(reads[keep], READ_REQ, WRITE_REQ)
+            if len(packets) == 0:
+                continue
+            num_reads += int(reads.sum())
+            num_writes += int(writes.sum())
+            if first_tick is None:
+                first_tick = int(packets["tick"][0])
+            last_tick = int(packets["tick"][-1])
+            max_addr = max(
+                max_addr, int((packets["addr"] + packets["size"]).max())
+            )
+            f.write(_encode_packets(packets))
+    os.replace(tmp, dst)
+    return TraceInfo(
+        num_reads, num_writes, first_tick or 0, last_tick or 0, max_addr
+    )
+
+
+class TracedMemory(AbstractMemorySystem):
+    """
+    A memory system which records every request it receives. A
+    `MemTraceProbe` is attached to a `CommMonitor` in front of every port of
+    the wrapped memory; the trace of port i is written to
+    `<outdir>/<trace_file><i>.gz`.
+    """
+
+    def __init__(
+        self, memory: AbstractMemorySystem, trace_file: str = "mem_trace"
+    ) -> None:
+        """
+        :param memory: The memory system to trace.
+        :param trace_file: The prefix of the trace files.
+        """
+        super().__init__()
+        self.memory = memory
+        self._trace_file = trace_file
+        self._monitors = []
+
+    @overrides(AbstractMemorySystem)
+    def incorporate_memory(self, board: AbstractBoard) -> None:
+        self.memory.incorporate_memory(board)
+
+    @overrides(AbstractMemorySystem)
+    def get_mem_ports(self) -> Sequence[Tuple[AddrRange, Port]]:
+        # the ports are only asked for once the memory range is set
+        if not self._monitors:
+            for i, (_, port) in enumerate(self.memory.get_mem_ports()):
+                monitor = CommMonitor()
+                monitor.trace = MemTraceProbe(
+                    trace_file=f"{self._trace_file}{i}", trace_compress=True
+                )
+                monitor.mem_side_port = port
+                self._monitors.append(monitor)
+            self.monitors = self._monitors
+        return [
+            (addr_range, monitor.cpu_side_port)
+            for (addr_range, _), monitor in zip(
+                self.memory.get_mem_ports(), self._monitors
+            )
+        ]
+
+    @overrides(AbstractMemorySystem)
+    def get_memory_controllers(self) -> List[MemCtrl]:
+        return self.memory.get_memory_controllers()
+
+    @overrides(AbstractMemorySystem)
+    def get_size(self) -> int:
+        return self.memory.get_size()
+
+    @overrides(AbstractMemorySystem)
+    def set_memory_range(self, ranges: List[AddrRange]) -> None:
+        self.memory.set_memory_range(ranges)
+
+    def get_trace_files(self, outdir: str) -> List[Path]:
+        """The trace files written by the monitors, once simulated."""
+        return [
+            Path(outdir) / f"{self._trace_file}{i}.gz"
+            for i in range(len(self._monitors))
+        ]
+
+
+class TraceReplayCore(AbstractGeneratorCore):
+    """A generator core which replays a packet trace."""
+
+    def __init__(self, duration: int, trace_file: str) -> None:
+        """
+        :param duration: The number of ticks to replay the trace for.
+        :param trace_file: The (normalized) trace to replay.
+        """
+        super().__init__()
+        self.generator = PyTrafficGen()
+        self._duration = duration
+        self._trace_file = str(trace_file)
+
+    @overrides(AbstractGeneratorCore)
+    def connect_dcache(self, port: Port) -> None:
+        self.generator.port = port
+
+    def _create_traffic(self) -> Iterator[BaseTrafficGen]:
+        yield self.generator.createTrace(self._duration, self._trace_file, 0)
+        yield self.generator.createExit(0)
+
+    @overrides(AbstractGeneratorCore)
+    def start_traffic(self) -> None:
+        self.generator.start(self._create_traffic())
+
+
+class TraceReplayGenerator(AbstractGenerator):
+    """
+    Replays traces captured with `TracedMemory`, one core per trace.
+    Captured traces are normalized to `<trace>.replay` (next to the
+    trace) the first time they are replayed and reused afterwards.
+    """
+
+    def __init__(
+        self, trace_files: Sequence[str], duration: Optional[int] = None
+    ) -> None:
+        """
+        :param trace_files: The traces to replay.
+        :param duration: The number of ticks to replay the traces for.
+                         Defaults to the last tick of the traces, plus 10%
+                         to let the last requests finish.
+        """
+        self.trace_info = []
+        replay_files = []
+        for trace_file in trace_files:
+            replay_file, info = self._prepare(Path(trace_file))
+            replay_files.append(replay_file)
+            self.trace_info.append(info)
+        if duration is None:
+            last_tick = max(info.last_tick for info in self.trace_info)
+            duration = int(last_tick * 1.1) + 1
+        super().__init__(
+            cores=[
+                TraceReplayCore(duration, replay_file)
+                for replay_file in replay_files
+            ]
+        )
+
+    @staticmethod
+    def _prepare(trace_file: Path) -> Tuple[Path, TraceInfo]:
+        replay_file = trace_file.with_name(trace_file.name + ".replay")
+        info_file = trace_file.with_name(trace_file.name + ".replay.info")
+        if (
+            replay_file.exists()
+            and info_file.exists()
+            and replay_file.stat().st_mtime >= trace_file.stat().st_mtime
+        ):
+            info = TraceInfo(*map(int, info_file.read_text().split()))
+        else:
+            info = normalize_trace(trace_file, replay_file)
+            info_file.write_text(" ".join(map(str, info)))
+        return replay_file, info
+
+    def get_max_addr(self) -> int:
+        """The end of the highest request in the traces."""
+        return max(info.max_addr for info in self.trace_info)
+
+    @overrides(AbstractGenerator)
+    def start_traffic(self) -> None:
+        for core in self.cores:
+            core.start_traffic()
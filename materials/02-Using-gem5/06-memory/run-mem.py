@@ -8,6 +8,11 @@ library.
 
 This script can be run with the following command:
 gem5 run-mem.py
+
+The generator can also replay the memory trace of a CPU run captured with
+capture-mem-trace.py, so the same traffic can be run against many memory
+devices without simulating the CPU every time:
+gem5 run-mem.py -c TraceGenerator --trace capture/mem_trace0.gz
 """
 
 import argparse
@@ -23,9 +28,15 @@ from gem5.components.processors.linear_generator import LinearGenerator
 from gem5.components.processors.random_generator import RandomGenerator
 from gem5.simulate.simulator import Simulator
 
+from mem_trace import TraceReplayGenerator
+
 
 def generator_factory(
-    generator_class: str, rd_perc: int, rate, mem_size: MemorySize
+    generator_class: str,
+    rd_perc: int,
+    rate,
+    mem_size: MemorySize,
+    trace_files=(),
 ):
     rd_perc = int(rd_perc)
     if rd_perc > 100 or rd_perc < 0:
@@ -40,6 +51,17 @@ def generator_factory(
         return RandomGenerator(
             duration="1ms", rate=rate, max_addr=mem_size, rd_perc=rd_perc
         )
+    elif generator_class == "TraceGenerator":
+        if not trace_files:
+            raise ValueError("TraceGenerator needs at least one --trace.")
+        generator = TraceReplayGenerator(trace_files)
+        if generator.get_max_addr() > mem_size:
+            raise ValueError(
+                f"The traces access addresses up to "
+                f"{generator.get_max_addr()} but the memory is only "
+                f"{mem_size} bytes."
+            )
+        return generator
     else:
         raise ValueError(f"Unknown generator class {generator_class}")
 
@@ -53,9 +75,18 @@ parser.add_argument(
     "--generator_class",
     type=str,
     help="The class of the generator to use. "
-    "Available options: LinearGenerator, RandomGenerator",
+    "Available options: LinearGenerator, RandomGenerator, TraceGenerator",
     default="LinearGenerator",
 )
+parser.add_argument(
+    "-t",
+    "--trace",
+    type=str,
+    action="append",
+    default=[],
+    help="A memory trace captured with capture-mem-trace.py, replayed by "
+    "the TraceGenerator (can be repeated, e.g., once per channel).",
+)
 parser.add_argument(
     "-r",
     "--read_percentage",
@@ -83,7 +114,11 @@ args = parser.parse_args()
 
 
 generator = generator_factory(
-    args.generator_class, args.read_percentage, args.bandwidth, memory.get_size()
+    args.generator_class,
+    args.read_percentage,
+    args.bandwidth,
+    memory.get_size(),
+    args.trace,
 )
 
 # We use the Test Board. This is a special board to run traffic generation
@@ -1,39 +1,34 @@
-baseline_ipc = 0.0
-baseline_stats_file = "/workspaces/2024/materials/02-Using-gem5/09-sampling/01-simpoint/complete/full-detailed-run-m5out/stats.txt"
+import sys
+from pathlib import Path
 
-with open(baseline_stats_file, "r") as f:
-    for line in f:
-        if "board.processor.cores.core.ipc" in line:
-            line = line.split()
-            baseline_ipc = float(line[1])
-            break
+sys.path.append(Path(__file__).resolve().parents[2].as_posix())
+from simpoint_replay import (
+    IPC_STAT,
+    collect_results,
+    load_simpoint_weights,
+    weighted_stats,
+)
+from stats_reader import StatsFile
 
-num_simpoints = 3
-simpoint_ipcs = []
-simpoint_weights = []
+simpoint_dir = Path("/workspaces/2024/materials/02-Using-gem5/09-sampling/01-simpoint/complete")
 
-for i in range(num_simpoints):
-    simpoint_stats_file = f"/workspaces/2024/materials/02-Using-gem5/09-sampling/01-simpoint/complete/simpoint{i}-run/stats.txt"
-    with open(simpoint_stats_file, "r") as f:
-        simpoint_ipc = 0.0
-        for line in f:
-            if "board.processor.cores.core.ipc" in line:
-                line = line.split()
-                simpoint_ipc = float(line[1])
-        simpoint_ipcs.append(simpoint_ipc)
-    simpoint_stdout_file = f"/workspaces/2024/materials/02-Using-gem5/09-sampling/01-simpoint/complete/simpoint{i}-run/simout.txt"
-    simpoint_weight = 0.0
-    with open(simpoint_stdout_file, "r") as f:
-        for line in f:
-            if "Ran SimPoint" in line:
-                line = line.split()
-                simpoint_weight = float(line[-1])
-    simpoint_weights.append(simpoint_weight)
+baseline_ipc = StatsFile(
+    simpoint_dir / "full-detailed-run-m5out" / "stats.txt"
+).stat(IPC_STAT)[0]
 
-predicted_ipc = 0.0
+# One weight per SimPoint, in SimPoint id order
+simpoint_weights = load_simpoint_weights(
+    simpoint_dir / "results.simpts", simpoint_dir / "results.weights"
+)
+results = collect_results(simpoint_dir, simpoint_weights)
 
-for i in range(num_simpoints):
-    predicted_ipc += simpoint_ipcs[i] * simpoint_weights[i]
+for result in results:
+    print(
+        f"SimPoint {result.sid}: weight {result.weight}, "
+        f"IPC {result.stats.get(IPC_STAT)}"
+    )
+
+predicted_ipc = weighted_stats(results)[IPC_STAT]
 
 print(f"predicted IPC: {predicted_ipc}")
 print(f"actual IPC: {baseline_ipc}")
@@ -1,21 +1,11 @@
 #!/bin/bash
 
-# Run the gem5 commands in parallel
-gem5 -re --outdir=simpoint0-run simpoint-run.py --sid=0 &
-pid0=$!
-gem5 -re --outdir=simpoint1-run simpoint-run.py --sid=1 &
-pid1=$!
-gem5 -re --outdir=simpoint2-run simpoint-run.py --sid=2 &
-pid2=$!
-
-# Array of PIDs and SIDs
-pids=($pid0 $pid1 $pid2)
-sids=(0 1 2)
-
-# Loop to wait for each process and echo a message when it finishes
-for i in "${!pids[@]}"; do
-    wait ${pids[$i]} && echo "gem5 with sid ${sids[$i]} finished"
-done
-
-# Wait for all background jobs to finish
-wait
+# Restore every SimPoint checkpoint in simpoint-checkpoint/ in parallel (one
+# gem5 process per host core) and write the per-SimPoint and weighted results
+# to simpoint-results.json.
+python3 /workspaces/2024/materials/02-Using-gem5/09-sampling/simpoint_replay.py \
+    --script simpoint-run.py \
+    --checkpoint-dir simpoint-checkpoint \
+    --simpoints /workspaces/2024/materials/02-Using-gem5/09-sampling/01-simpoint/results.simpts \
+    --weights /workspaces/2024/materials/02-Using-gem5/09-sampling/01-simpoint/results.weights \
+    "$@"
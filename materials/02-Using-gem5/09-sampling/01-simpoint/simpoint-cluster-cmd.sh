@@ -0,0 +1,3 @@
+python3 /workspaces/2024/materials/02-Using-gem5/09-sampling/simpoint_clustering.py \
+    --bbv simpoint-analysis-m5out/simpoint.bb.gz --max-k 5 --simpoints \
+    results.simpts --weights results.weights
@@ -40,13 +40,41 @@ from m5.params import PcCountPair
 from gem5.isas import ISA
 import m5
 
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(Path(__file__).resolve().parents[2].as_posix())
+from binary_stats import BinaryStatsSink
+
 requires(isa_required = ISA.X86)
 
 '''
 Usage:
-    gem5 -re run-elfies.py
+    gem5 -re run-elfies.py [--binary-stats [--text-stats]]
 '''
 
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--binary-stats",
+    action="store_true",
+    help="Write every stats dump as a row of <outdir>/stats.bin, which can "
+    "be loaded with stats_reader.BinaryStatsFile, instead of to stats.txt.",
+)
+parser.add_argument(
+    "--text-stats",
+    action="store_true",
+    help="With --binary-stats, also write every stats dump to stats.txt.",
+)
+args = parser.parse_args()
+
+if args.binary_stats:
+    dump_stats = BinaryStatsSink(
+        Path(m5.options.outdir) / "stats.bin", text=args.text_stats
+    ).dump
+else:
+    dump_stats = m5.stats.dump
+
 cache_hierarchy = PrivateL1SharedL2CacheHierarchy(
     l1i_size="32KiB",
     l1i_assoc=8,
@@ -96,7 +124,7 @@ def start_end_handler():
     # and exit the simulation.
     print(f"reached {targets[1]}\n")
     print("now dump stats and exit simulation\n")
-    m5.stats.dump()
+    dump_stats()
     yield True
 
 simulator = Simulator(
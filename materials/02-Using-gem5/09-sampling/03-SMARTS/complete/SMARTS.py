@@ -28,12 +28,22 @@
 Usage
 -----
 
-gem5 -re SMARTS.py
+gem5 -re SMARTS.py [--target-error 0.03] [--confidence 0.997]
+
+Sampling stops early once the IPC estimate reaches the target error at the
+requested confidence.
+
+With --adaptive, the sampling interval k is adapted to the IPC variance seen
+so far instead of being derived from a known program length, so no profiling
+run is needed:
+
+gem5 -re SMARTS.py --adaptive [--initial-interval 100]
 
 """
 
 import argparse
 import math
+import sys
 from pathlib import Path
 
 from gem5.components.boards.simple_board import SimpleBoard
@@ -50,9 +60,86 @@ from gem5.resources.resource import BinaryResource
 from gem5.utils.requires import requires
 import json
 import m5
+from m5.util.convert import toFrequency
+
+sys.path.append(Path(__file__).resolve().parents[2].as_posix())
+from smarts_estimator import AdaptiveSamplingInterval, SMARTSEstimator
+from binary_stats import BinaryStatsSink
 
 requires(isa_required=ISA.X86)
 
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--unit-size",
+    type=int,
+    default=1000,
+    help="The sampling unit size, U, in instructions.",
+)
+parser.add_argument(
+    "--warmup",
+    type=int,
+    default=2000,
+    help="The detailed warmup length, W, in instructions.",
+)
+parser.add_argument(
+    "--samples",
+    type=int,
+    default=50,
+    help="The number of samples the interval k is sized for.",
+)
+parser.add_argument(
+    "--target-error",
+    type=float,
+    default=0.03,
+    help="Stop sampling once the relative error of the IPC estimate is "
+    "below this bound.",
+)
+parser.add_argument(
+    "--confidence",
+    type=float,
+    default=0.997,
+    help="The confidence level of the error bound.",
+)
+parser.add_argument(
+    "--adaptive",
+    action="store_true",
+    help="Adapt the sampling interval k to the observed IPC variance. The "
+    "program length does not need to be known.",
+)
+parser.add_argument(
+    "--initial-interval",
+    type=int,
+    default=100,
+    help="The interval k used in adaptive mode until enough samples are in.",
+)
+parser.add_argument(
+    "--max-interval",
+    type=int,
+    default=100_000,
+    help="The largest interval k used in adaptive mode.",
+)
+parser.add_argument(
+    "--no-early-stop",
+    action="store_true",
+    help="Sample the whole program even after the target error is met.",
+)
+parser.add_argument(
+    "--binary-stats",
+    action="store_true",
+    help="Write every stats dump as a row of <outdir>/stats.bin, which can "
+    "be loaded with stats_reader.BinaryStatsFile, instead of to stats.txt.",
+)
+parser.add_argument(
+    "--text-stats",
+    action="store_true",
+    help="With --binary-stats, also write every stats dump to stats.txt.",
+)
+
+args = parser.parse_args()
+
+clk_freq = "3GHz"
+
 cache_hierarchy = PrivateL1PrivateL2WalkCacheHierarchy(
     l1d_size="32kB",
     l1i_size="32kB",
@@ -69,7 +156,7 @@ processor = SimpleSwitchableProcessor(
 )
 
 board = SimpleBoard(
-    clk_freq="3GHz",
+    clk_freq=clk_freq,
     processor=processor,
     memory=memory,
     cache_hierarchy=cache_hierarchy,
@@ -80,7 +167,14 @@ board.set_se_binary_workload(
 )
 
 def smarts_generator(
-    k: int, U: int, W: int, processor
+    k: int,
+    U: int,
+    W: int,
+    processor,
+    estimator=None,
+    early_stop=True,
+    interval=None,
+    dump_stats=m5.stats.dump,
 ):
     """
     :param k: the systematic sampling interval. Each interval simulation k*U
@@ -100,11 +194,27 @@ def smarts_generator(
     detailed warmup part, it resets the stats. When it reaches to the end of
     the detailed simulation, it dumps the stats; then it switches the core type
     and schedule for the start of the next detailed warmup part.
+
+    :param estimator: An optional SMARTSEstimator. If given, the IPC of every
+    sampling unit is added to it when the unit ends.
+    :param early_stop: Exit the simulation loop once the estimator has
+    reached its target error.
+    :param interval: An optional AdaptiveSamplingInterval. If given (together
+    with an estimator), k is updated from it after every sample and the
+    initial k is ignored.
+    :param dump_stats: The function called to dump the stats at the end of
+    every sampling unit.
     """
     is_switchable = isinstance(processor, SimpleSwitchableProcessor)
+    if interval is not None:
+        k = interval.k
     warmup_start = U * (k - 1) - W
     warmup_plus_detailed = U + W
     counter = 0
+    ticks_per_cycle = None
+    detail_start_tick = 0
+    # the first warmup starts after the first instruction
+    executed_insts = 1
 
     while is_switchable:
         print(f"curTick is {m5.curTick()}")
@@ -130,6 +240,7 @@ def smarts_generator(
 
         # reset stats
         m5.stats.reset()
+        detail_start_tick = m5.curTick()
         print("fall back to simulation\n")
         # fall back to simulation
         yield False
@@ -139,7 +250,27 @@ def smarts_generator(
         print("got to end of detail simulation\n")
         print("now dump stats\n")
         # dump stats
-        m5.stats.dump()
+        dump_stats()
+
+        if estimator is not None:
+            # The unit is exactly U instructions long, so its IPC follows
+            # from the number of cycles it took.
+            if ticks_per_cycle is None:
+                ticks_per_cycle = m5.ticks.fromSeconds(
+                    1 / toFrequency(clk_freq)
+                )
+            cycles = (m5.curTick() - detail_start_tick) / ticks_per_cycle
+            estimator.add_sample(U / cycles)
+            print(f"{estimator.summary()}\n")
+            if early_stop and estimator.is_converged():
+                print("target error reached, stop sampling\n")
+                yield True
+
+        executed_insts += warmup_plus_detailed
+        if interval is not None and estimator is not None:
+            k = interval.update(estimator, U, executed_insts)
+            warmup_start = U * (k - 1) - W
+            print(f"sampling interval k is now {k}\n")
 
         # switch core type
         print("switch core type\n")
@@ -150,6 +281,7 @@ def smarts_generator(
         # schedule for the next start of warmup
         print("schedule for the next start of warmup\n")
         processor.get_cores()[0]._set_simpoint([warmup_start], True)
+        executed_insts += warmup_start
         print("increase n counter\n")
         # increment sample counter
         counter += 1
@@ -157,11 +289,36 @@ def smarts_generator(
         print("fall back to simulation\n")
         yield False
 
-program_length = 9115640
-ideal_region_length = math.ceil(program_length/50)
-ideal_U = 1000
-ideal_k = math.ceil(ideal_region_length/ideal_U)
-ideal_W = 2 * ideal_U
+ideal_U = args.unit_size
+ideal_W = args.warmup
+
+if args.adaptive:
+    # the interval must leave room for the detailed warmup
+    min_k = math.ceil(ideal_W / ideal_U) + 2
+    interval = AdaptiveSamplingInterval(
+        initial_k=max(args.initial_interval, min_k),
+        min_k=min_k,
+        max_k=max(args.max_interval, min_k),
+    )
+    ideal_k = interval.k
+else:
+    interval = None
+    program_length = 9115640
+    ideal_region_length = math.ceil(program_length/args.samples)
+    ideal_k = math.ceil(ideal_region_length/ideal_U)
+
+estimator = SMARTSEstimator(
+    confidence=args.confidence,
+    target_error=args.target_error,
+    min_samples=min(30, args.samples),
+)
+
+if args.binary_stats:
+    dump_stats = BinaryStatsSink(
+        Path(m5.options.outdir) / "stats.bin", text=args.text_stats
+    ).dump
+else:
+    dump_stats = m5.stats.dump
 
 simulator = Simulator(
     board=board,
@@ -171,6 +328,10 @@ simulator = Simulator(
             U=ideal_U,
             W=ideal_W,
             processor=processor,
+            estimator=estimator,
+            early_stop=not args.no_early_stop,
+            interval=interval,
+            dump_stats=dump_stats,
         )
     }
 )
@@ -179,3 +340,9 @@ processor.get_cores()[0]._set_simpoint([1], False)
 simulator.run()
 
 print("Simulation Done")
+print(f"IPC estimate: {estimator.summary()}")
+if interval is not None:
+    print(
+        "Instructions executed up to the last sample: "
+        f"{interval.executed_insts}"
+    )
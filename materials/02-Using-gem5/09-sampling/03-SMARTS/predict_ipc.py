@@ -1,20 +1,30 @@
-from pathlib import Path
 import math
+import sys
+from pathlib import Path
+
+sys.path.append(Path(__file__).resolve().parents[1].as_posix())
+from smarts_estimator import SMARTSEstimator
+from stats_reader import StatsFile
 
 stats_file = Path("/workspaces/2024/materials/02-Using-gem5/09-sampling/03-SMARTS/m5out/stats.txt")
 
-with stats_file.open("r") as f:
-    num_samples = 0
-    sample_ipc = []
-    for line in f:
-        if "board.processor.switch.core.ipc" in line:
-            line = line.split()
-            ipc = float(line[1])
-            sample_ipc.append(ipc)
-            num_samples += 1
-    num_samples -= 1
-    avg_ipc = sum(sample_ipc[:-1]) / num_samples
-    print(f"Number of samples: {num_samples}")
-    print(f"Predicted Overall IPC: {avg_ipc}")
-    print(f"Actual Overall IPC: 1.247741")
-    print(f"Relative Error: {(math.fabs(avg_ipc - 1.247741)/1.247741)*100}%")
+# The --unit-size of SMARTS.py
+unit_size = 1000
+
+stats = StatsFile(stats_file)
+# Only dumps covering a complete sampling unit are used. The dump gem5 makes
+# when the simulation ends in the middle of a unit is dropped.
+estimator = SMARTSEstimator.from_stats(
+    stats,
+    sample_stat="board.processor.switch.core.ipc",
+    insts_stat="board.processor.switch.core.commitStats0.numInsts",
+    unit_size=unit_size,
+)
+avg_ipc = estimator.mean()
+low, high = estimator.confidence_interval()
+print(f"Number of samples: {estimator.num_samples}")
+print(f"Predicted Overall IPC: {avg_ipc}")
+print(f"Coefficient of Variation: {estimator.coefficient_of_variation()}")
+print(f"{estimator.confidence * 100:g}% Confidence Interval: [{low}, {high}]")
+print(f"Actual Overall IPC: 1.247741")
+print(f"Relative Error: {(math.fabs(avg_ipc - 1.247741)/1.247741)*100}%")
@@ -0,0 +1,185 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A binary stats sink for frequent dumps.
+
+`BinaryStatsSink.dump()` appends the current value of every scalar and
+vector stat as one float64 row to a binary file. The stat names are written
+once, to a JSON schema next to it, the first time stats are dumped. Nothing
+is formatted, so dumps are cheap enough to take very often, and the file can
+be memory-mapped as a (dumps x stats) matrix with
+`stats_reader.BinaryStatsFile`.
+
+The columns are named as the stats in stats.txt: scalars and vectors of one
+element (e.g., most formulas, like `ipc`) by the stat's name, and the
+elements of longer vectors `<stat>::<subname>`, or `<stat>::<index>` when the
+element has no subname. Distributions and histograms are not written.
+
+By default, the stats are only written to the binary file and not to
+stats.txt, which is what makes frequent dumps cheap. Pass `text=True` to
+write both.
+
+Usage
+-----
+
+```python
+from binary_stats import BinaryStatsSink
+
+sink = BinaryStatsSink(Path(m5.options.outdir) / "stats.bin")
+...
+sink.dump()  # instead of m5.stats.dump()
+```
+"""
+
+import fnmatch
+import json
+from pathlib import Path
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+import m5
+from m5.objects import Root
+
+from stats_reader import (
+    BINARY_STATS_VERSION,
+    TICK_COLUMN,
+    binary_schema_path,
+)
+
+
+def _collect(group, prefix: str, found: List[Tuple[str, object, object]]):
+    for stat in group.getStats():
+        found.append((prefix + stat.name, group, stat))
+    for name, child in group.getStatGroups().items():
+        _collect(child, f"{prefix}{name}.", found)
+
+
+class BinaryStatsSink:
+    """Appends every stats dump as one row of a binary file."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        patterns: Sequence[str] = ("*",),
+        text: bool = False,
+    ):
+        """
+        :param path: The binary stats file. The schema is written to
+        `<path>.schema.json`.
+        :param patterns: Only the stats matching one of these globs are
+        written.
+        :param text: Also dump the stats to the text output (stats.txt) with
+        `m5.stats.dump()`.
+        """
+        self._path = Path(path)
+        self._patterns = tuple(patterns)
+        self._text = text
+        self._file = None
+        self._groups = []
+        self._stats = []
+        self._widths = []
+        self._row = None
+
+    def _build_schema(self) -> None:
+        found = []
+        _collect(Root.getInstance(), "", found)
+        columns = [TICK_COLUMN]
+        groups = {}
+        for name, group, stat in found:
+            if not any(
+                fnmatch.fnmatchcase(name, pattern)
+                for pattern in self._patterns
+            ):
+                continue
+            try:
+                stat.prepare()
+                value = stat.value
+            except AttributeError:
+                # distributions and histograms have no single value
+                continue
+            if isinstance(value, (int, float)):
+                columns.append(name)
+                self._widths.append(0)
+            elif len(value) == 1:
+                # stats.txt prints vectors of one element as scalars
+                columns.append(name)
+                self._widths.append(1)
+            else:
+                subnames = list(getattr(stat, "subnames", []))
+                subnames += [""] * (len(value) - len(subnames))
+                columns += [
+                    f"{name}::{subname or i}"
+                    for i, subname in enumerate(subnames[: len(value)])
+                ]
+                self._widths.append(len(value))
+            self._stats.append(stat)
+            groups[id(group)] = group
+        self._groups = list(groups.values())
+        self._row = np.empty(len(columns), dtype=np.float64)
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with binary_schema_path(self._path).open("w") as f:
+            json.dump(
+                {
+                    "version": BINARY_STATS_VERSION,
+                    "dtype": self._row.dtype.str,
+                    "columns": columns,
+                },
+                f,
+            )
+        self._file = self._path.open("wb")
+
+    def dump(self) -> None:
+        """Dump the stats, i.e., append their current values as a row."""
+        if self._text:
+            m5.stats.dump()
+        if self._file is None:
+            self._build_schema()
+        if not self._text:
+            # m5.stats.dump() brings the stats up to date otherwise
+            for group in self._groups:
+                group.preDumpStats()
+            for stat in self._stats:
+                stat.prepare()
+
+        row = self._row
+        row[0] = m5.curTick()
+        column = 1
+        for stat, width in zip(self._stats, self._widths):
+            if width == 0:
+                row[column] = stat.value
+                column += 1
+            else:
+                row[column : column + width] = stat.value
+                column += width
+        self._file.write(row.tobytes())
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
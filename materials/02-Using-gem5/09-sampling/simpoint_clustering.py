@@ -0,0 +1,412 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A NumPy implementation of the SimPoint 3.2 clustering flow.
+
+It reads the basic block vectors (BBVs) written by `addSimPointProbe` and
+writes the `results.simpts` and `results.weights` files used by
+`gem5.utils.simpoint.SimPoint`, so the external SimPoint binary is not needed.
+
+The steps follow SimPoint:
+
+1. Every interval's BBV is normalized to sum to 1.
+2. The vectors are randomly projected down to a few (15) dimensions. This is
+   done while the (gzipped) BBV file is streamed, so the full, very sparse,
+   BBV matrix is never built.
+3. k-means is run for every k from 1 to max k. Large inputs use mini-batch
+   k-means, so each iteration only touches a small sample of the intervals.
+4. The smallest k whose BIC score is within the BIC threshold of the best
+   score is picked.
+5. The interval closest to each cluster's centroid is that cluster's
+   SimPoint, and the fraction of intervals in the cluster is its weight.
+
+Usage
+-----
+
+python3 simpoint_clustering.py \
+    --bbv simpoint-analysis-m5out/simpoint.bb.gz --max-k 5 \
+    --simpoints results.simpts --weights results.weights
+
+"""
+
+import argparse
+import gzip
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+import numpy as np
+
+
+def read_bbv(
+    path: Union[str, Path]
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Stream the basic block vectors in a (optionally gzipped) BBV file.
+
+    Each line of the file is one interval in the form
+    ``T:<bb id>:<count> :<bb id>:<count> ...``.
+
+    :returns: An iterator of (basic block ids, counts) per interval.
+    """
+    path = Path(path)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt") as f:
+        for line in f:
+            if not line.startswith("T"):
+                continue
+            fields = np.array(line[1:].replace(":", " ").split(), np.int64)
+            yield fields[0::2], fields[1::2].astype(np.float64)
+
+
+class RandomProjection:
+    """
+    A random linear projection of BBVs, whose dimension is not known up front,
+    down to ``dim`` dimensions.
+
+    The projection matrix grows as new basic block ids are seen. Its rows are
+    always drawn in id order, so the projection only depends on the seed.
+    """
+
+    def __init__(self, dim: int = 15, seed: int = 493575226):
+        self._dim = dim
+        self._rng = np.random.default_rng(seed)
+        self._matrix = np.empty((0, dim), dtype=np.float64)
+
+    def _grow(self, num_rows: int) -> None:
+        new_rows = self._rng.uniform(
+            -1.0, 1.0, size=(num_rows - len(self._matrix), self._dim)
+        )
+        self._matrix = np.concatenate((self._matrix, new_rows))
+
+    def project(self, ids: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Normalize and project one interval's BBV."""
+        if len(ids) and ids.max() >= len(self._matrix):
+            self._grow(max(ids.max() + 1, 2 * len(self._matrix)))
+        total = counts.sum()
+        if total == 0:
+            return np.zeros(self._dim)
+        return (counts / total) @ self._matrix[ids]
+
+
+def project_bbv(
+    path: Union[str, Path], dim: int = 15, seed: int = 493575226
+) -> np.ndarray:
+    """
+    Stream a BBV file and return its (intervals x dim) projected matrix.
+    """
+    projection = RandomProjection(dim=dim, seed=seed)
+    rows = []
+    for ids, counts in read_bbv(path):
+        rows.append(projection.project(ids, counts))
+    return np.array(rows, dtype=np.float64).reshape(-1, dim)
+
+
+def _sq_distances(data: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """The squared distance from every point to every center."""
+    return (
+        (data * data).sum(axis=1)[:, None]
+        - 2 * data @ centers.T
+        + (centers * centers).sum(axis=1)[None, :]
+    ).clip(min=0)
+
+
+def _cluster_sums(
+    data: np.ndarray, labels: np.ndarray, k: int
+) -> np.ndarray:
+    """The sum of the points in every cluster."""
+    return np.stack(
+        [
+            np.bincount(labels, weights=column, minlength=k)
+            for column in data.T
+        ],
+        axis=1,
+    )
+
+
+def assign(
+    data: np.ndarray, centers: np.ndarray, chunk_size: int = 65536
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assign every point to its closest center.
+
+    :returns: The label of every point and its squared distance to its
+    center.
+    """
+    labels = np.empty(len(data), dtype=np.int64)
+    distances = np.empty(len(data), dtype=np.float64)
+    for start in range(0, len(data), chunk_size):
+        d = _sq_distances(data[start : start + chunk_size], centers)
+        closest = d.argmin(axis=1)
+        labels[start : start + chunk_size] = closest
+        distances[start : start + chunk_size] = np.take_along_axis(
+            d, closest[:, None], axis=1
+        )[:, 0]
+    return labels, distances
+
+
+def _init_centers(
+    data: np.ndarray, k: int, rng: np.random.Generator
+) -> np.ndarray:
+    """k-means++ seeding."""
+    centers = np.empty((k, data.shape[1]), dtype=np.float64)
+    centers[0] = data[rng.integers(len(data))]
+    closest = _sq_distances(data, centers[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        if total == 0:
+            centers[i] = data[rng.integers(len(data))]
+        else:
+            centers[i] = data[rng.choice(len(data), p=closest / total)]
+        closest = np.minimum(
+            closest, _sq_distances(data, centers[i : i + 1])[:, 0]
+        )
+    return centers
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    rng: np.random.Generator,
+    max_iter: int = 100,
+    batch_size: int = 4096,
+    tolerance: float = 1e-4,
+) -> np.ndarray:
+    """
+    Cluster ``data`` into ``k`` clusters and return the centers.
+
+    If there are more points than ``batch_size``, mini-batch k-means
+    (Sculley, WWW 2010) is used; otherwise Lloyd's algorithm is run to
+    convergence.
+
+    :param tolerance: Mini-batch k-means stops once no center moves further
+    than this fraction of the data's spread in an iteration.
+    """
+    if len(data) > batch_size:
+        seed_sample = data[rng.integers(len(data), size=batch_size)]
+        centers = _init_centers(seed_sample, k, rng)
+        counts = np.zeros(k, dtype=np.float64)
+        max_shift = tolerance * max(float(data.std(axis=0).max()), 1e-300)
+        for _ in range(max_iter):
+            batch = data[rng.integers(len(data), size=batch_size)]
+            labels, _ = assign(batch, centers)
+            previous = centers.copy()
+            batch_counts = np.bincount(labels, minlength=k)
+            batch_sums = _cluster_sums(batch, labels, k)
+            counts += batch_counts
+            # Equivalent to applying the per-point update with learning rate
+            # 1 / count to every point of the batch.
+            updated = batch_counts > 0
+            centers[updated] += (
+                batch_sums[updated]
+                - batch_counts[updated, None] * centers[updated]
+            ) / counts[updated, None]
+            if np.abs(centers - previous).max() <= max_shift:
+                break
+        return centers
+
+    centers = _init_centers(data, k, rng)
+    for _ in range(max_iter):
+        labels, _ = assign(data, centers)
+        sums = _cluster_sums(data, labels, k)
+        sizes = np.bincount(labels, minlength=k)
+        non_empty = sizes > 0
+        updated = centers.copy()
+        updated[non_empty] = sums[non_empty] / sizes[non_empty, None]
+        if np.array_equal(updated, centers):
+            break
+        centers = updated
+    return centers
+
+
+def bic(data: np.ndarray, labels: np.ndarray, distances: np.ndarray) -> float:
+    """
+    The Bayesian Information Criterion of a clustering, as used by SimPoint
+    (Pelleg and Moore, ICML 2000).
+    """
+    num_points, dim = data.shape
+    sizes = np.bincount(labels)
+    sizes = sizes[sizes > 0]
+    k = len(sizes)
+    if num_points <= k:
+        return -np.inf
+    variance = max(distances.sum() / (num_points - k), 1e-300)
+    log_likelihood = np.sum(
+        sizes * np.log(sizes)
+        - sizes * np.log(num_points)
+        - sizes * dim / 2 * np.log(2 * np.pi * variance)
+        - (sizes - k) / 2
+    )
+    num_params = (k - 1) + dim * k + 1
+    return float(log_likelihood - num_params / 2 * np.log(num_points))
+
+
+class SimPointResult:
+    """The chosen clustering and its SimPoints."""
+
+    def __init__(
+        self,
+        labels: np.ndarray,
+        distances: np.ndarray,
+        bic_scores: List[float],
+    ):
+        self.labels = labels
+        self.bic_scores = bic_scores
+        self.clusters = np.unique(labels)
+        self.weights = np.bincount(labels)[self.clusters] / len(labels)
+        # the SimPoint of each cluster is its interval closest to the centroid
+        self.simpoints = np.array(
+            [
+                np.flatnonzero(labels == c)[
+                    distances[labels == c].argmin()
+                ]
+                for c in self.clusters
+            ],
+            dtype=np.int64,
+        )
+
+    @property
+    def k(self) -> int:
+        return len(self.clusters)
+
+    def write(
+        self, simpoints_path: Union[str, Path], weights_path: Union[str, Path]
+    ) -> None:
+        """Write the SimPoint and weight files in SimPoint 3.2's format."""
+        with open(simpoints_path, "w") as f:
+            for simpoint, cluster in zip(self.simpoints, self.clusters):
+                f.write(f"{simpoint} {cluster}\n")
+        with open(weights_path, "w") as f:
+            for weight, cluster in zip(self.weights, self.clusters):
+                f.write(f"{weight:g} {cluster}\n")
+
+
+def find_simpoints(
+    data: np.ndarray,
+    max_k: int,
+    bic_threshold: float = 0.9,
+    num_init_seeds: int = 5,
+    seed: int = 493575226,
+    batch_size: int = 4096,
+) -> SimPointResult:
+    """
+    Cluster the projected BBVs for k = 1..max_k and pick k by BIC.
+
+    :param data: The projected BBVs, one row per interval.
+    :param max_k: The largest number of clusters tried.
+    :param bic_threshold: The smallest k whose BIC score reaches this
+    fraction of the way from the worst to the best score is picked.
+    :param num_init_seeds: The number of k-means runs (with different
+    initial centers) for each k. The run with the lowest distortion is kept.
+    :param seed: The seed of the random number generator.
+    :param batch_size: The mini-batch size used for large inputs.
+    """
+    if len(data) == 0:
+        raise ValueError("The BBV file does not contain any interval.")
+    rng = np.random.default_rng(seed)
+    max_k = min(max_k, len(data))
+
+    candidates = []
+    for k in range(1, max_k + 1):
+        best = None
+        for _ in range(num_init_seeds):
+            centers = kmeans(data, k, rng, batch_size=batch_size)
+            labels, distances = assign(data, centers)
+            distortion = distances.sum()
+            if best is None or distortion < best[0]:
+                best = (distortion, labels, distances)
+        candidates.append(best[1:])
+
+    scores = [bic(data, labels, dist) for labels, dist in candidates]
+    finite = [s for s in scores if np.isfinite(s)]
+    if finite:
+        low, high = min(finite), max(finite)
+        cutoff = low + bic_threshold * (high - low)
+        chosen = next(i for i, s in enumerate(scores) if s >= cutoff)
+    else:
+        chosen = 0
+    labels, distances = candidates[chosen]
+    return SimPointResult(labels, distances, scores)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pick SimPoints and weights from a gem5 BBV file."
+    )
+    parser.add_argument(
+        "--bbv",
+        type=str,
+        required=True,
+        help="The BBV file written by addSimPointProbe (simpoint.bb.gz).",
+    )
+    parser.add_argument(
+        "--max-k", type=int, required=True, help="The most clusters to try."
+    )
+    parser.add_argument(
+        "--simpoints",
+        type=str,
+        default="results.simpts",
+        help="The SimPoint file to write.",
+    )
+    parser.add_argument(
+        "--weights",
+        type=str,
+        default="results.weights",
+        help="The weight file to write.",
+    )
+    parser.add_argument(
+        "--dim",
+        type=int,
+        default=15,
+        help="The number of dimensions to project the BBVs to.",
+    )
+    parser.add_argument(
+        "--bic-threshold",
+        type=float,
+        default=0.9,
+        help="Pick the smallest k whose BIC score reaches this fraction of "
+        "the best one.",
+    )
+    parser.add_argument(
+        "--num-init-seeds",
+        type=int,
+        default=5,
+        help="The number of k-means initializations per k.",
+    )
+    parser.add_argument("--seed", type=int, default=493575226)
+
+    args = parser.parse_args()
+
+    data = project_bbv(args.bbv, dim=args.dim, seed=args.seed)
+    result = find_simpoints(
+        data,
+        max_k=args.max_k,
+        bic_threshold=args.bic_threshold,
+        num_init_seeds=args.num_init_seeds,
+        seed=args.seed,
+    )
+    result.write(args.simpoints, args.weights)
+    print(f"Clustered {len(data)} intervals into {result.k} SimPoints")
@@ -0,0 +1,319 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Replay every SimPoint checkpoint in parallel and aggregate the results.
+
+`simpoints_save_checkpoint_generator` writes one `cpt.SimPoint<sid>`
+directory per SimPoint. This driver finds all of them, restores each one with
+`simpoint-run.py --sid=<sid>` in its own gem5 process (as many at a time as
+there are host cores) and combines the per-region stats with the SimPoint
+weights. The wall time is therefore about that of the longest region rather
+than the sum of all of them.
+
+The weights are read from the SimPoint files, in the same order as
+`gem5.utils.simpoint.SimPoint` (sorted by start instruction), rather than
+from each run's simout.txt.
+
+Usage
+-----
+
+python3 simpoint_replay.py --script simpoint-run.py \
+    --checkpoint-dir simpoint-checkpoint \
+    --simpoints results.simpts --weights results.weights
+
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from stats_reader import StatsFile
+
+IPC_STAT = "board.processor.cores.core.ipc"
+
+
+def load_simpoint_weights(
+    simpoints_path: Union[str, Path], weights_path: Union[str, Path]
+) -> List[float]:
+    """
+    Return the weight of every SimPoint, indexed by SimPoint id.
+
+    The SimPoint ids are assigned in order of the SimPoints' start intervals,
+    as done by `gem5.utils.simpoint.SimPoint` and the checkpoint generator.
+    """
+    intervals = {}
+    with open(simpoints_path) as f:
+        for line in f:
+            if line.strip():
+                interval, cluster = line.split()
+                intervals[int(cluster)] = int(interval)
+    weights = {}
+    with open(weights_path) as f:
+        for line in f:
+            if line.strip():
+                weight, cluster = line.split()
+                weights[int(cluster)] = float(weight)
+    clusters = sorted(intervals, key=lambda cluster: intervals[cluster])
+    return [weights[cluster] for cluster in clusters]
+
+
+def discover_checkpoints(
+    checkpoint_dir: Union[str, Path]
+) -> Dict[int, Path]:
+    """Find the `cpt.SimPoint<sid>` checkpoints in ``checkpoint_dir``."""
+    checkpoints = {}
+    for path in Path(checkpoint_dir).iterdir():
+        match = re.fullmatch(r"cpt\.SimPoint(\d+)", path.name)
+        if match and path.is_dir():
+            checkpoints[int(match.group(1))] = path
+    return dict(sorted(checkpoints.items()))
+
+
+class RegionResult:
+    """The outcome of replaying one SimPoint region."""
+
+    def __init__(
+        self,
+        sid: int,
+        weight: float,
+        outdir: Path,
+        returncode: int,
+        stats: Optional[Dict[str, float]] = None,
+    ):
+        self.sid = sid
+        self.weight = weight
+        self.outdir = outdir
+        self.returncode = returncode
+        self.stats = stats or {}
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0 and bool(self.stats)
+
+    def to_json(self) -> Dict:
+        return {
+            "sid": self.sid,
+            "weight": self.weight,
+            "outdir": self.outdir.as_posix(),
+            "returncode": self.returncode,
+            "stats": self.stats,
+        }
+
+
+def read_region_stats(
+    outdir: Path, stat_names: Sequence[str]
+) -> Dict[str, float]:
+    """
+    Read ``stat_names`` from a region's stats.txt. The last dump is used, as
+    the first one covers the warmup.
+    """
+    stats_path = outdir / "stats.txt"
+    if not stats_path.exists():
+        return {}
+    stats = StatsFile(stats_path)
+    if len(stats) == 0:
+        return {}
+    region = {}
+    for name in stat_names:
+        if name in stats:
+            region[name] = float(stats.stat(name, present_only=False)[-1])
+    return region
+
+
+def collect_results(
+    base_dir: Union[str, Path],
+    weights: List[float],
+    stat_names: Sequence[str] = (IPC_STAT,),
+    outdir_format: str = "simpoint{sid}-run",
+) -> List[RegionResult]:
+    """Collect the results of already finished region runs."""
+    results = []
+    for sid, weight in enumerate(weights):
+        outdir = Path(base_dir) / outdir_format.format(sid=sid)
+        stats = read_region_stats(outdir, stat_names)
+        results.append(RegionResult(sid, weight, outdir, 0, stats))
+    return results
+
+
+def run_regions(
+    script: Union[str, Path],
+    checkpoints: Dict[int, Path],
+    weights: List[float],
+    stat_names: Sequence[str] = (IPC_STAT,),
+    gem5: str = "gem5",
+    base_dir: Union[str, Path] = ".",
+    outdir_format: str = "simpoint{sid}-run",
+    num_workers: Optional[int] = None,
+) -> List[RegionResult]:
+    """
+    Replay every checkpoint with ``script`` in its own gem5 process.
+
+    :param script: The restore script. It is called with `--sid=<sid>`.
+    :param checkpoints: The checkpoints to replay, by SimPoint id.
+    :param weights: The weight of every SimPoint, by SimPoint id.
+    :param stat_names: The stats collected from each region.
+    :param gem5: The gem5 binary.
+    :param base_dir: The directory the runs are started from. The output
+    directories are created in it.
+    :param outdir_format: The output directory of each run.
+    :param num_workers: The number of concurrent gem5 processes. Defaults to
+    the number of host cores.
+    """
+    if len(checkpoints) != len(weights):
+        raise ValueError(
+            f"Found {len(checkpoints)} checkpoints but {len(weights)} "
+            "SimPoint weights."
+        )
+    base_dir = Path(base_dir).resolve()
+    script = Path(script).resolve()
+    num_workers = num_workers or os.cpu_count() or 1
+
+    def run(sid: int) -> RegionResult:
+        outdir = base_dir / outdir_format.format(sid=sid)
+        command = [
+            gem5,
+            "-re",
+            f"--outdir={outdir.as_posix()}",
+            script.as_posix(),
+            f"--sid={sid}",
+        ]
+        returncode = subprocess.run(command, cwd=base_dir).returncode
+        stats = {}
+        if returncode == 0:
+            stats = read_region_stats(outdir, stat_names)
+        return RegionResult(sid, weights[sid], outdir, returncode, stats)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(run, sid) for sid in checkpoints]
+        for future in as_completed(futures):
+            result = future.result()
+            status = "finished" if result.succeeded else "failed"
+            print(f"gem5 with sid {result.sid} {status}")
+            results.append(result)
+    return sorted(results, key=lambda result: result.sid)
+
+
+def weighted_stats(
+    results: List[RegionResult], stat_names: Sequence[str] = (IPC_STAT,)
+) -> Dict[str, float]:
+    """
+    Combine the per-region stats with the SimPoint weights.
+
+    Regions which failed are left out and the remaining weights are
+    renormalized, so the coverage (the sum of the weights used) should be
+    checked as well.
+    """
+    done = [result for result in results if result.succeeded]
+    weights = np.array([result.weight for result in done])
+    combined = {"coverage": float(weights.sum())}
+    for name in stat_names:
+        values = np.array([result.stats.get(name, np.nan) for result in done])
+        present = ~np.isnan(values)
+        if present.any() and weights[present].sum() > 0:
+            combined[name] = float(
+                np.average(values[present], weights=weights[present])
+            )
+        else:
+            combined[name] = float("nan")
+    return combined
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay all SimPoint checkpoints in parallel."
+    )
+    parser.add_argument(
+        "--script",
+        type=str,
+        required=True,
+        help="The gem5 script which restores a checkpoint given --sid.",
+    )
+    parser.add_argument(
+        "--checkpoint-dir", type=str, default="simpoint-checkpoint"
+    )
+    parser.add_argument("--simpoints", type=str, default="results.simpts")
+    parser.add_argument("--weights", type=str, default="results.weights")
+    parser.add_argument(
+        "--stat",
+        type=str,
+        action="append",
+        default=[],
+        help="An extra stat to collect and weight (can be repeated).",
+    )
+    parser.add_argument("--gem5", type=str, default="gem5")
+    parser.add_argument(
+        "-j",
+        "--num-workers",
+        type=int,
+        default=None,
+        help="The number of concurrent gem5 processes (default: host cores).",
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        default="simpoint-results.json",
+        help="Where to write the per-region and weighted results.",
+    )
+
+    args = parser.parse_args()
+
+    stat_names = [IPC_STAT] + args.stat
+    weights = load_simpoint_weights(args.simpoints, args.weights)
+    checkpoints = discover_checkpoints(args.checkpoint_dir)
+    results = run_regions(
+        args.script,
+        checkpoints,
+        weights,
+        stat_names=stat_names,
+        gem5=args.gem5,
+        num_workers=args.num_workers,
+    )
+    combined = weighted_stats(results, stat_names)
+
+    with open(args.results, "w") as f:
+        json.dump(
+            {
+                "regions": [result.to_json() for result in results],
+                "weighted": combined,
+            },
+            f,
+            indent=4,
+        )
+
+    print(f"weighted IPC: {combined[IPC_STAT]}")
+    print(f"weight coverage: {combined['coverage']}")
+    if not all(result.succeeded for result in results):
+        sys.exit(1)
@@ -0,0 +1,322 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The statistics behind SMARTS (Wunderlich et al., ISCA 2003).
+
+Given n sampling units with mean x and standard deviation s, the coefficient
+of variation is V = s / x and, for a confidence level with normal quantile z,
+the relative half-width of the confidence interval is
+
+    e = z * V / sqrt(n)
+
+so n >= (z * V / e) ** 2 samples are needed to reach a target error e. The
+default confidence of 99.7% gives z ~= 3, as in the paper.
+
+The estimator can be fed one sample at a time (e.g., from an exit event
+generator while the simulation runs) or built from a stats.txt file after the
+simulation has finished.
+"""
+
+import math
+from statistics import NormalDist
+from typing import Optional, Tuple
+
+import numpy as np
+
+from stats_reader import StatsFile
+
+
+class SMARTSEstimator:
+    """
+    Accumulates per-sampling-unit measurements (e.g., IPC) and reports the
+    sample mean, coefficient of variation and confidence interval.
+    """
+
+    def __init__(
+        self,
+        confidence: float = 0.997,
+        target_error: float = 0.03,
+        min_samples: int = 30,
+    ):
+        """
+        :param confidence: The confidence level of the interval, in (0, 1).
+        :param target_error: The target relative half-width of the confidence
+        interval (e.g., 0.03 for +/-3%).
+        :param min_samples: The estimate is never reported as converged
+        before this many samples. This keeps a few lucky early samples from
+        stopping the simulation.
+        """
+        if not 0 < confidence < 1:
+            raise ValueError("The confidence must be between 0 and 1.")
+        if target_error <= 0:
+            raise ValueError("The target error must be positive.")
+        if min_samples < 2:
+            raise ValueError("At least 2 samples are needed for a variance.")
+
+        self._confidence = confidence
+        self._z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self._target_error = target_error
+        self._min_samples = min_samples
+        self._samples = np.empty(64, dtype=np.float64)
+        self._num_samples = 0
+
+    @classmethod
+    def from_stats(
+        cls,
+        stats: StatsFile,
+        sample_stat: str,
+        insts_stat: Optional[str] = None,
+        unit_size: Optional[int] = None,
+        **kwargs,
+    ) -> "SMARTSEstimator":
+        """
+        Build an estimator from the dumps of a SMARTS run.
+
+        gem5 dumps the stats once more when it exits. If the simulation
+        stopped outside of a detailed unit (while fast-forwarding, or after
+        an early stop), this dump repeats the stats of the last unit, so
+        trailing dumps equal to the one before them are dropped.
+
+        :param stats: The stats of the SMARTS run.
+        :param sample_stat: The stat to estimate (e.g., the detailed core's
+        ipc).
+        :param insts_stat: The instruction count of the detailed core. If
+        given, only dumps which cover a complete sampling unit are used. This
+        also drops the final dump when the simulation stops in the middle of
+        a unit.
+        :param unit_size: The sampling unit size, U. The detailed core commits
+        up to its commit width at once, so a complete unit is U or a few more
+        instructions. If not given, U is taken as the median of
+        ``insts_stat``, and dumps within 5% of it are kept.
+        :param kwargs: Passed to the constructor.
+        """
+        samples = stats.stat(sample_stat, present_only=False)
+        keep = ~np.isnan(samples)
+        insts = None
+        if insts_stat is not None:
+            insts = stats.stat(insts_stat, present_only=False)
+            if unit_size is None:
+                unit_size = 0.95 * np.nanmedian(insts)
+            keep &= insts >= unit_size
+        last = len(samples) - 1
+        while (
+            last > 0
+            and samples[last] == samples[last - 1]
+            and (insts is None or insts[last] == insts[last - 1])
+        ):
+            keep[last] = False
+            last -= 1
+        estimator = cls(**kwargs)
+        estimator.add_samples(samples[keep])
+        return estimator
+
+    def add_sample(self, sample: float) -> None:
+        """Record the measurement of one sampling unit."""
+        if self._num_samples == len(self._samples):
+            self._samples = np.resize(self._samples, 2 * len(self._samples))
+        self._samples[self._num_samples] = sample
+        self._num_samples += 1
+
+    def add_samples(self, samples: np.ndarray) -> None:
+        """Record the measurements of many sampling units at once."""
+        samples = np.asarray(samples, dtype=np.float64).ravel()
+        needed = self._num_samples + len(samples)
+        if needed > len(self._samples):
+            self._samples = np.resize(
+                self._samples, max(needed, 2 * len(self._samples))
+            )
+        self._samples[self._num_samples : needed] = samples
+        self._num_samples = needed
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self._samples[: self._num_samples]
+
+    @property
+    def num_samples(self) -> int:
+        return self._num_samples
+
+    @property
+    def confidence(self) -> float:
+        return self._confidence
+
+    @property
+    def target_error(self) -> float:
+        return self._target_error
+
+    def mean(self) -> float:
+        if self._num_samples == 0:
+            return math.nan
+        return float(self.samples.mean())
+
+    def std(self) -> float:
+        """The sample standard deviation (with Bessel's correction)."""
+        if self._num_samples < 2:
+            return math.nan
+        return float(self.samples.std(ddof=1))
+
+    def coefficient_of_variation(self) -> float:
+        mean = self.mean()
+        if mean == 0:
+            return math.nan
+        return self.std() / mean
+
+    def relative_error(self) -> float:
+        """
+        The relative half-width of the confidence interval around the mean.
+        """
+        if self._num_samples < 2:
+            return math.nan
+        return (
+            self._z
+            * self.coefficient_of_variation()
+            / math.sqrt(self._num_samples)
+        )
+
+    def confidence_interval(self) -> Tuple[float, float]:
+        if self._num_samples < 2:
+            return math.nan, math.nan
+        half_width = self._z * self.std() / math.sqrt(self._num_samples)
+        mean = self.mean()
+        return mean - half_width, mean + half_width
+
+    def required_samples(self, include_minimum: bool = True) -> int:
+        """
+        The number of samples needed to reach the target error given the
+        coefficient of variation observed so far.
+
+        :param include_minimum: Never return less than ``min_samples``.
+        """
+        cv = self.coefficient_of_variation()
+        if math.isnan(cv):
+            return self._min_samples
+        required = math.ceil((self._z * cv / self._target_error) ** 2)
+        if include_minimum:
+            required = max(self._min_samples, required)
+        return required
+
+    def is_converged(self) -> bool:
+        """
+        Whether the target error has been met at the requested confidence.
+        """
+        if self._num_samples < self._min_samples:
+            return False
+        return self.relative_error() <= self._target_error
+
+    def summary(self) -> str:
+        low, high = self.confidence_interval()
+        return (
+            f"samples: {self._num_samples}, mean: {self.mean():.6f}, "
+            f"CV: {self.coefficient_of_variation():.6f}, "
+            f"{self._confidence * 100:g}% CI: [{low:.6f}, {high:.6f}] "
+            f"(+/-{self.relative_error() * 100:.3f}%)"
+        )
+
+
+class AdaptiveSamplingInterval:
+    """
+    Adapts the systematic sampling interval, k, to the variance observed so
+    far, so the program length does not have to be known ahead of time.
+
+    After every sample, the number of samples the observed variance needs to
+    reach the target error is taken from the estimator and spread over the
+    instructions executed so far, which is the best online estimate of the
+    program length.
+    A low variance needs few samples and therefore widens k; a high variance
+    shrinks it. As the program keeps running the executed instruction count
+    grows, so the interval keeps widening as long as the variance stays low.
+    """
+
+    def __init__(
+        self,
+        initial_k: int,
+        min_k: int,
+        max_k: int,
+        max_step: float = 2.0,
+        min_samples: int = 10,
+    ):
+        """
+        :param initial_k: The interval used until ``min_samples`` samples are
+        in.
+        :param min_k: The smallest interval. This must leave room for the
+        detailed warmup, i.e., (min_k - 1) * U > W.
+        :param max_k: The largest interval.
+        :param max_step: The largest factor k can grow or shrink by after a
+        single sample. This keeps one outlier from swinging the interval.
+        :param min_samples: The number of samples needed before the variance
+        is trusted enough to adapt k.
+        """
+        if not 0 < min_k <= initial_k <= max_k:
+            raise ValueError("Expected 0 < min_k <= initial_k <= max_k.")
+        if max_step <= 1:
+            raise ValueError("The maximum step must be greater than 1.")
+        if min_samples < 2:
+            raise ValueError("At least 2 samples are needed for a variance.")
+
+        self._k = initial_k
+        self._min_k = min_k
+        self._max_k = max_k
+        self._max_step = max_step
+        self._min_samples = min_samples
+        self._executed_insts = 0
+
+    @property
+    def k(self) -> int:
+        return self._k
+
+    @property
+    def executed_insts(self) -> int:
+        """
+        The instructions executed up to the last update. Once the simulation
+        ends this is the (online discovered) program length, up to the
+        instructions executed after the last sample.
+        """
+        return self._executed_insts
+
+    def update(
+        self, estimator: SMARTSEstimator, unit_size: int, executed_insts: int
+    ) -> int:
+        """
+        Compute the interval to use for the next sample.
+
+        :param estimator: The estimator holding the samples taken so far.
+        :param unit_size: The sampling unit size, U.
+        :param executed_insts: The number of instructions executed so far.
+
+        :returns: The new interval, k.
+        """
+        self._executed_insts = executed_insts
+        if estimator.num_samples < self._min_samples:
+            return self._k
+
+        required = max(1, estimator.required_samples(include_minimum=False))
+        target = executed_insts / (required * unit_size)
+        target = min(
+            max(target, self._k / self._max_step), self._k * self._max_step
+        )
+        self._k = int(min(max(round(target), self._min_k), self._max_k))
+        return self._k
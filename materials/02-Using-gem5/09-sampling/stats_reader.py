@@ -0,0 +1,341 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A streaming, indexed reader for gem5's stats.txt.
+
+The first time a stats file is opened, every dump block is parsed exactly once
+and two sidecar files are written next to it:
+
+* ``<stats>.idx.json``: the byte range of every dump and the column assigned to
+  every stat name.
+* ``<stats>.idx.npy``: a (dumps x stats) float64 matrix holding every value.
+
+Later queries are answered from the memory-mapped matrix without touching the
+text file again. If the stats file changes (size or modification time), the
+index is rebuilt.
+
+Usage
+-----
+
+```python
+from stats_reader import StatsFile
+
+stats = StatsFile("m5out/stats.txt")
+ipc = stats.stat("board.processor.switch.core.ipc")
+```
+
+Stats which are not present in a dump are stored as NaN.
+
+Stats written by `binary_stats.BinaryStatsSink` are already in this form and
+are loaded with `BinaryStatsFile("m5out/stats.bin")`, which has the same query
+methods.
+"""
+
+import fnmatch
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+BEGIN_MARKER = b"---------- Begin Simulation Statistics ----------"
+END_MARKER = b"---------- End Simulation Statistics   ----------"
+
+INDEX_VERSION = 1
+
+BINARY_STATS_VERSION = 1
+TICK_COLUMN = "curTick"
+
+
+def binary_schema_path(path: Union[str, Path]) -> Path:
+    """The path of the schema of the binary stats file ``path``."""
+    path = Path(path)
+    return path.with_name(f"{path.name}.schema.json")
+
+
+def _parse_line(line: bytes) -> Optional[Tuple[str, float]]:
+    """
+    Parse a single stat line into its name and (first) value.
+
+    Returns None for blank lines, markers and lines that do not carry a
+    numeric value.
+    """
+    fields = line.split(None, 2)
+    if len(fields) < 2 or fields[0].startswith(b"-"):
+        return None
+    try:
+        value = float(fields[1])
+    except ValueError:
+        return None
+    return fields[0].decode(), value
+
+
+class _StatsMatrix:
+    """
+    Queries over a (dumps x stats) value matrix. Subclasses set `_path`,
+    `_names`, `_columns` and `_values`.
+    """
+
+    _path: Path
+    _names: List[str]
+    _columns: Dict[str, int]
+    _values: np.ndarray
+
+    @property
+    def names(self) -> List[str]:
+        """The names of all stats, in column order."""
+        return list(self._names)
+
+    @property
+    def values(self) -> np.ndarray:
+        """The full (dumps x stats) value matrix. This is memory-mapped."""
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.iter_dumps()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def column(self, name: str) -> int:
+        """Return the column of the stat ``name`` in the value matrix."""
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise KeyError(f"Stat '{name}' not found in {self._path}")
+
+    def dump(self, dump: int) -> np.ndarray:
+        """Return the values of every stat in dump ``dump``."""
+        return self._values[dump]
+
+    def iter_dumps(
+        self, names: Optional[List[str]] = None
+    ) -> Iterator[np.ndarray]:
+        """
+        Lazily iterate over the dumps, one row at a time.
+
+        :param names: If given, only these stats (in this order) are returned
+        for each dump.
+        """
+        if names is None:
+            for dump in range(len(self)):
+                yield self._values[dump]
+        else:
+            cols = [self.column(name) for name in names]
+            for dump in range(len(self)):
+                yield self._values[dump, cols]
+
+    def stat(self, name: str, present_only: bool = True) -> np.ndarray:
+        """
+        Return the value of the stat ``name`` across all dumps.
+
+        :param present_only: Drop the dumps in which the stat was not present.
+        """
+        values = np.asarray(self._values[:, self.column(name)])
+        if present_only:
+            values = values[~np.isnan(values)]
+        return values
+
+    def match(self, pattern: str) -> List[str]:
+        """Return the stat names matching the glob ``pattern``."""
+        return fnmatch.filter(self._names, pattern)
+
+    def stats(self, pattern: str) -> np.ndarray:
+        """
+        Return a (dumps x matched stats) matrix for every stat matching the
+        glob ``pattern``. Columns are ordered as returned by ``match``.
+        """
+        cols = [self._columns[name] for name in self.match(pattern)]
+        return np.asarray(self._values[:, cols])
+
+
+class StatsFile(_StatsMatrix):
+    """
+    An indexed view of a (possibly very large) gem5 stats.txt file.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        index_dir: Optional[Union[str, Path]] = None,
+        rebuild: bool = False,
+    ):
+        """
+        :param path: The path to the stats.txt file.
+        :param index_dir: The directory to store the index in. By default the
+        index is stored next to the stats file.
+        :param rebuild: Rebuild the index even if a valid one exists.
+        """
+        self._path = Path(path)
+        index_dir = Path(index_dir) if index_dir else self._path.parent
+        self._meta_path = index_dir / f"{self._path.name}.idx.json"
+        self._values_path = index_dir / f"{self._path.name}.idx.npy"
+
+        if rebuild or not self._index_is_valid():
+            self._build_index()
+
+        with self._meta_path.open("r") as f:
+            meta = json.load(f)
+        self._ranges = [tuple(r) for r in meta["ranges"]]
+        self._columns: Dict[str, int] = meta["columns"]
+        self._names: List[str] = [None] * len(self._columns)
+        for name, column in self._columns.items():
+            self._names[column] = name
+        self._values = np.load(self._values_path, mmap_mode="r")
+
+    def _source_signature(self) -> Dict[str, int]:
+        st = os.stat(self._path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def _index_is_valid(self) -> bool:
+        if not (self._meta_path.exists() and self._values_path.exists()):
+            return False
+        try:
+            with self._meta_path.open("r") as f:
+                meta = json.load(f)
+        except ValueError:
+            return False
+        return (
+            meta.get("version") == INDEX_VERSION
+            and meta.get("source") == self._source_signature()
+        )
+
+    def _scan(self) -> Tuple[List[Tuple[int, int]], Dict[str, int]]:
+        """
+        First pass: find the byte range of every dump and the set of stat
+        names. Values are not converted here.
+        """
+        ranges = []
+        columns = {}
+        start = None
+        offset = 0
+        with self._path.open("rb") as f:
+            for line in f:
+                if line.startswith(BEGIN_MARKER):
+                    start = offset + len(line)
+                elif line.startswith(END_MARKER):
+                    if start is not None:
+                        ranges.append((start, offset))
+                    start = None
+                elif start is not None:
+                    parsed = _parse_line(line)
+                    if parsed is not None and parsed[0] not in columns:
+                        columns[parsed[0]] = len(columns)
+                offset += len(line)
+        # A simulation which crashed mid-dump leaves an unterminated block.
+        if start is not None and start < offset:
+            ranges.append((start, offset))
+        return ranges, columns
+
+    def _build_index(self) -> None:
+        ranges, columns = self._scan()
+        self._meta_path.parent.mkdir(parents=True, exist_ok=True)
+
+        values = np.lib.format.open_memmap(
+            self._values_path,
+            mode="w+",
+            dtype=np.float64,
+            shape=(len(ranges), len(columns)),
+        )
+        values[:] = np.nan
+        with self._path.open("rb") as f:
+            for dump, (start, end) in enumerate(ranges):
+                f.seek(start)
+                cols = []
+                vals = []
+                for line in f.read(end - start).splitlines():
+                    parsed = _parse_line(line)
+                    if parsed is not None:
+                        cols.append(columns[parsed[0]])
+                        vals.append(parsed[1])
+                values[dump, cols] = vals
+        values.flush()
+        del values
+
+        # The metadata is written last so a partially built index is never
+        # mistaken for a valid one.
+        with self._meta_path.open("w") as f:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "source": self._source_signature(),
+                    "ranges": ranges,
+                    "columns": columns,
+                },
+                f,
+            )
+
+    def byte_range(self, dump: int) -> Tuple[int, int]:
+        """Return the (start, end) byte offsets of dump ``dump``."""
+        return self._ranges[dump]
+
+
+class BinaryStatsFile(_StatsMatrix):
+    """
+    A view of the binary stats written by `binary_stats.BinaryStatsSink`.
+
+    The file holds one float64 row per dump and the stat names are read from
+    the schema next to it, so loading it takes no parsing at all. The first
+    column, `curTick`, is the tick of each dump.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param path: The path to the binary stats file (e.g., stats.bin).
+        """
+        self._path = Path(path)
+        with binary_schema_path(self._path).open("r") as f:
+            schema = json.load(f)
+        if schema.get("version") != BINARY_STATS_VERSION:
+            raise ValueError(
+                f"Unsupported binary stats version in {self._path}"
+            )
+        self._names = schema["columns"]
+        self._columns = {name: i for i, name in enumerate(self._names)}
+        dtype = np.dtype(schema["dtype"])
+        # a dump which was being written when the simulation stopped is
+        # ignored
+        row_size = dtype.itemsize * len(self._names)
+        num_dumps = os.path.getsize(self._path) // row_size
+        if num_dumps == 0:
+            self._values = np.empty((0, len(self._names)), dtype=dtype)
+        else:
+            self._values = np.memmap(
+                self._path,
+                dtype=dtype,
+                mode="r",
+                shape=(num_dumps, len(self._names)),
+            )
+
+    @property
+    def ticks(self) -> np.ndarray:
+        """The tick of every dump."""
+        return self.stat(TICK_COLUMN)
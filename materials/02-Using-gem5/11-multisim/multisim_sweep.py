@@ -0,0 +1,601 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A scheduler for the simulations in a MultiSim configuration script.
+
+`gem5 -m gem5.utils.multisim` hands the simulations to a fixed size process
+pool in the order they were added. With simulations of very different
+lengths, the longest one is often started last and the sweep ends with a
+single straggler. This script instead:
+
+* lists the simulation ids with `gem5 {config} --list` and runs each one as
+  `gem5 {config} {id}`, exactly as a single MultiSim simulation;
+* starts the simulations with the longest predicted run time first. The
+  prediction comes from the host time of earlier runs in the results file
+  (or from a JSON file of costs). Simulations without a prediction go first,
+  since they are the most likely to be the straggler;
+* only starts a new simulation when there is a free host core and enough
+  available memory for it (again predicted from earlier runs);
+* writes the key stats of every simulation to a single CSV results file, one
+  row per simulation id and one column per stat, as soon as it finishes;
+* skips simulations which already completed. A finished simulation leaves a
+  fingerprint of its inputs (the configuration script and the local modules
+  it imports, its id, the gem5 binary and the files it used, as listed in
+  its config.ini) in its output
+  directory. If the fingerprint still matches and the simulation's stats.txt
+  ends with a complete dump, it is not run again. Rerunning a sweep which
+  crashed therefore only pays for the missing or failed simulations.
+
+Usage
+-----
+
+python3 multisim_sweep.py multisim-experiment.py [-j 8] \
+    [--stat board.cache_hierarchy.l1d-cache-0.overallMissRate::total]
+
+"""
+
+import argparse
+import ast
+import configparser
+import csv
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+sys.path.append(
+    (Path(__file__).resolve().parents[1] / "09-sampling").as_posix()
+)
+from stats_reader import END_MARKER, StatsFile
+
+DEFAULT_STATS = ("simSeconds", "simInsts", "hostSeconds", "hostMemory")
+
+# The banner gem5 prints before running the configuration script ends with
+# this line.
+BANNER_END = "command line:"
+
+FINGERPRINT_FILE = "sweep-fingerprint.json"
+
+
+def list_simulator_ids(config: Path, gem5: str = "gem5") -> List[str]:
+    """Return the ids of the simulations in a MultiSim configuration."""
+    with tempfile.TemporaryDirectory() as outdir:
+        subprocess.run(
+            [gem5, "-re", "-d", outdir, config.as_posix(), "--list"],
+            check=True,
+        )
+        lines = (Path(outdir) / "simout.txt").read_text().splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith(BANNER_END):
+            lines = lines[i + 1 :]
+            break
+    return [line.strip() for line in lines if line.strip()]
+
+
+def find_stats(outdir: Path, sim_id: str) -> Optional[Path]:
+    """
+    Find the stats.txt of a simulation. Depending on the gem5 version,
+    MultiSim writes it to the output directory or to a subdirectory named
+    after the id.
+    """
+    for path in (outdir / "stats.txt", outdir / sim_id / "stats.txt"):
+        if path.exists():
+            return path
+    return None
+
+
+def has_complete_dump(stats_path: Path) -> bool:
+    """Whether a stats.txt ends with a complete stats dump."""
+    with stats_path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        lines = f.read().splitlines()
+    lines = [line for line in lines if line.strip()]
+    return bool(lines) and lines[-1].startswith(END_MARKER)
+
+
+_file_hashes: Dict[Path, tuple] = {}
+
+
+def file_hash(path: Path) -> str:
+    """
+    The SHA-256 of a file. Hashes are cached for as long as the file's size
+    and modification time do not change.
+    """
+    path = path.resolve()
+    st = path.stat()
+    key = (st.st_size, st.st_mtime_ns)
+    cached = _file_hashes.get(path)
+    if cached is None or cached[0] != key:
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        cached = (key, digest.hexdigest())
+        _file_hashes[path] = cached
+    return cached[1]
+
+
+def load_file_hashes(path: Path) -> None:
+    """
+    Add the hashes saved by `save_file_hashes` to the ones `file_hash`
+    caches. Hashing a gem5 binary takes seconds, so the processes which hash
+    the same files, e.g., every simulation using the same cache, share them
+    through this file.
+    """
+    try:
+        with path.open() as f:
+            saved = json.load(f)
+        for name, (size, mtime_ns, digest) in saved.items():
+            _file_hashes.setdefault(Path(name), ((size, mtime_ns), digest))
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def save_file_hashes(path: Path) -> None:
+    """Save the hashes `file_hash` cached, for `load_file_hashes`."""
+    saved = {
+        str(name): [key[0], key[1], digest]
+        for name, (key, digest) in _file_hashes.items()
+    }
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open("w") as f:
+        json.dump(saved, f)
+    os.replace(tmp, path)
+
+
+def used_files(config_ini: Path) -> List[str]:
+    """
+    The files (binaries, disk images, kernels, ...) a finished simulation
+    used, taken from the parameter values in its config.ini.
+    """
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.read(config_ini)
+    files = set()
+    for section in parser.sections():
+        for value in parser[section].values():
+            for token in value.split():
+                if token.startswith("/") and Path(token).is_file():
+                    files.add(token)
+    return sorted(files)
+
+
+def _module_files(root: Path, module: str) -> List[Path]:
+    """
+    The files of a dotted module and of the packages it is in, looked up in
+    root. Stops at the first part which is not in root.
+    """
+    files = []
+    path = root
+    for part in module.split("."):
+        path = path / part
+        if (path / "__init__.py").is_file():
+            files.append(path / "__init__.py")
+        elif path.with_suffix(".py").is_file():
+            files.append(path.with_suffix(".py"))
+            break
+        else:
+            break
+    return files
+
+
+def local_modules(config: Path) -> List[Path]:
+    """
+    The local modules a configuration script imports, directly or through
+    other local modules, e.g., a hierarchy.py or a components package next to
+    it. Absolute imports are looked up in the script's directory, which gem5
+    puts first on the module path, and relative imports in the importing
+    module's package. Modules found through directories added to sys.path by
+    the script are not included.
+    """
+    config = config.resolve()
+    root = config.parent
+    seen = {config}
+    queue = [config]
+    while queue:
+        path = queue.pop()
+        try:
+            tree = ast.parse(path.read_bytes(), path.as_posix())
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                candidates = [(root, alias.name) for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                base = root
+                if node.level:
+                    base = path.parents[node.level - 1]
+                prefix = f"{node.module}." if node.module else ""
+                candidates = [(base, node.module)] if node.module else []
+                candidates += [
+                    (base, prefix + alias.name) for alias in node.names
+                ]
+            else:
+                continue
+            for base, module in candidates:
+                for module_path in _module_files(base, module):
+                    module_path = module_path.resolve()
+                    if module_path not in seen:
+                        seen.add(module_path)
+                        queue.append(module_path)
+    seen.remove(config)
+    return sorted(seen)
+
+
+def fingerprint(
+    config: Path, sim_id: str, gem5_hash: str, files: Iterable[str]
+) -> str:
+    """
+    The fingerprint of a simulation's inputs. Besides the given files, it
+    covers the configuration script and the local modules it imports.
+    """
+    digest = hashlib.sha256()
+    digest.update(file_hash(config).encode())
+    for module in local_modules(config):
+        digest.update(os.path.relpath(module, config.parent).encode())
+        digest.update(file_hash(module).encode())
+    digest.update(sim_id.encode())
+    digest.update(gem5_hash.encode())
+    for path in sorted(files):
+        digest.update(path.encode())
+        digest.update(file_hash(Path(path)).encode())
+    return digest.hexdigest()
+
+
+def available_memory() -> int:
+    """The memory available to new processes, in bytes."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return sys.maxsize
+
+
+class ResultStore:
+    """
+    The sweep's results: one row per simulation id, one column per stat.
+
+    The whole file is rewritten (atomically) every time a simulation
+    finishes, so it is always complete up to the last finished simulation.
+    """
+
+    def __init__(self, path: Path, stat_names: Sequence[str]):
+        self._path = path
+        self._rows: Dict[str, Dict[str, str]] = {}
+        self._columns = ["id", "returncode", "wallSeconds"] + list(stat_names)
+        if path.exists():
+            with path.open(newline="") as f:
+                reader = csv.DictReader(f)
+                for column in reader.fieldnames or []:
+                    if column not in self._columns:
+                        self._columns.append(column)
+                for row in reader:
+                    self._rows[row["id"]] = row
+
+    def get(self, sim_id: str, column: str) -> Optional[float]:
+        try:
+            return float(self._rows[sim_id][column])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def record(self, sim_id: str, values: Dict[str, object]) -> None:
+        row = {"id": sim_id}
+        row.update({key: str(value) for key, value in values.items()})
+        self._rows[sim_id] = row
+        tmp = self._path.with_suffix(self._path.suffix + ".tmp")
+        with tmp.open("w", newline="") as f:
+            writer = csv.DictWriter(
+                f, fieldnames=self._columns, restval="", extrasaction="ignore"
+            )
+            writer.writeheader()
+            for sim_row in self._rows.values():
+                writer.writerow(sim_row)
+        os.replace(tmp, self._path)
+
+
+class Job:
+    def __init__(
+        self, sim_id: str, cost: Optional[float], memory: Optional[float]
+    ):
+        self.sim_id = sim_id
+        self.cost = cost
+        self.memory = memory
+        self.process: Optional[subprocess.Popen] = None
+        self.start_time = 0.0
+
+    def priority(self) -> float:
+        # unknown costs are scheduled first
+        return math.inf if self.cost is None else self.cost
+
+
+class SweepScheduler:
+    """
+    Runs the simulations of a MultiSim configuration, longest predicted
+    first, on as many host cores as are free.
+    """
+
+    def __init__(
+        self,
+        config: Path,
+        outdir: Path,
+        results: ResultStore,
+        stat_names: Sequence[str] = DEFAULT_STATS,
+        gem5: str = "gem5",
+        max_processes: Optional[int] = None,
+        default_memory: int = 1 << 30,
+        costs: Optional[Dict[str, float]] = None,
+        poll_interval: float = 0.5,
+    ):
+        """
+        :param config: The MultiSim configuration script.
+        :param outdir: Every simulation writes to `outdir/{id}`.
+        :param results: Where the stats of finished simulations are stored.
+        It also provides the predicted cost of simulations run before.
+        :param stat_names: The stats recorded for every simulation.
+        :param gem5: The gem5 binary.
+        :param max_processes: The most simulations run at the same time.
+        Defaults to the number of host cores.
+        :param default_memory: The memory (in bytes) a simulation is expected
+        to need when it has not been run before.
+        :param costs: Predicted run times by id. These take precedence over
+        the results of earlier runs.
+        :param poll_interval: How often (in seconds) to check for finished
+        simulations.
+        """
+        self._config = config.resolve()
+        self._outdir = outdir
+        self._results = results
+        self._stat_names = list(stat_names)
+        self._gem5 = gem5
+        self._max_processes = max_processes or os.cpu_count() or 1
+        self._default_memory = default_memory
+        self._costs = costs or {}
+        self._poll_interval = poll_interval
+        gem5_path = shutil.which(gem5)
+        self._gem5_hash = file_hash(Path(gem5_path)) if gem5_path else gem5
+
+    def is_complete(self, sim_id: str) -> bool:
+        """
+        Whether the simulation already ran to completion with the same
+        inputs.
+        """
+        outdir = self._outdir / sim_id
+        stats_path = find_stats(outdir, sim_id)
+        try:
+            with (outdir / FINGERPRINT_FILE).open() as f:
+                recorded = json.load(f)
+            current = fingerprint(
+                self._config, sim_id, self._gem5_hash, recorded["files"]
+            )
+        except (OSError, ValueError, KeyError):
+            return False
+        return (
+            recorded["fingerprint"] == current
+            and stats_path is not None
+            and has_complete_dump(stats_path)
+        )
+
+    def _write_fingerprint(self, sim_id: str) -> None:
+        outdir = self._outdir / sim_id
+        config_ini = outdir / "config.ini"
+        if not config_ini.exists():
+            config_ini = outdir / sim_id / "config.ini"
+        files = used_files(config_ini) if config_ini.exists() else []
+        with (outdir / FINGERPRINT_FILE).open("w") as f:
+            json.dump(
+                {
+                    "fingerprint": fingerprint(
+                        self._config, sim_id, self._gem5_hash, files
+                    ),
+                    "files": files,
+                },
+                f,
+                indent=4,
+            )
+
+    def _make_job(self, sim_id: str) -> Job:
+        cost = self._costs.get(sim_id)
+        if cost is None:
+            cost = self._results.get(sim_id, "hostSeconds")
+        memory = self._results.get(sim_id, "hostMemory")
+        return Job(sim_id, cost, memory)
+
+    def _can_start(self, job: Job, running: List[Job]) -> bool:
+        if not running:
+            # always make progress, however loaded the host is
+            return True
+        if len(running) >= self._max_processes:
+            return False
+        cpu_count = os.cpu_count() or 1
+        if os.getloadavg()[0] + 1 > cpu_count:
+            return False
+        needed = job.memory or self._default_memory
+        # simulations which just started have not reached their peak memory
+        pending = sum(
+            (j.memory or self._default_memory)
+            for j in running
+            if time.monotonic() - j.start_time < 10 * self._poll_interval
+        )
+        return available_memory() - pending >= needed
+
+    def _start(self, job: Job) -> None:
+        outdir = self._outdir / job.sim_id
+        # a stale fingerprint must not vouch for a run which does not finish
+        (outdir / FINGERPRINT_FILE).unlink(missing_ok=True)
+        command = [
+            self._gem5,
+            "-re",
+            "-d",
+            outdir.as_posix(),
+            self._config.as_posix(),
+            job.sim_id,
+        ]
+        job.start_time = time.monotonic()
+        job.process = subprocess.Popen(command, cwd=self._config.parent)
+
+    def _finish(self, job: Job) -> bool:
+        returncode = job.process.returncode
+        values = {
+            "returncode": returncode,
+            "wallSeconds": f"{time.monotonic() - job.start_time:.3f}",
+        }
+        stats_path = find_stats(self._outdir / job.sim_id, job.sim_id)
+        if stats_path is not None:
+            stats = StatsFile(stats_path)
+            for name in self._stat_names:
+                if len(stats) and name in stats:
+                    values[name] = stats.values[-1, stats.column(name)]
+        self._results.record(job.sim_id, values)
+        succeeded = returncode == 0
+        if succeeded:
+            self._write_fingerprint(job.sim_id)
+        print(
+            f"{job.sim_id} {'finished' if succeeded else 'failed'} "
+            f"({values['wallSeconds']}s)"
+        )
+        return succeeded
+
+    def run(self, sim_ids: Sequence[str], resume: bool = True) -> bool:
+        """
+        Run the simulations and return whether all of them succeeded.
+
+        :param resume: Skip the simulations which already completed.
+        """
+        if resume:
+            done = [sim_id for sim_id in sim_ids if self.is_complete(sim_id)]
+            if done:
+                print(f"Skipping {len(done)} already completed simulations")
+            sim_ids = [sim_id for sim_id in sim_ids if sim_id not in done]
+        pending = sorted(
+            (self._make_job(sim_id) for sim_id in sim_ids),
+            key=Job.priority,
+            reverse=True,
+        )
+        running: List[Job] = []
+        succeeded = True
+        while pending or running:
+            while pending and self._can_start(pending[0], running):
+                job = pending.pop(0)
+                self._start(job)
+                running.append(job)
+            time.sleep(self._poll_interval)
+            for job in [j for j in running if j.process.poll() is not None]:
+                running.remove(job)
+                succeeded &= self._finish(job)
+        return succeeded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the simulations of a MultiSim configuration, "
+        "longest first, and collect their stats."
+    )
+    parser.add_argument("config", type=str, help="The MultiSim config.")
+    parser.add_argument(
+        "ids",
+        type=str,
+        nargs="*",
+        help="The simulations to run (default: all of them).",
+    )
+    parser.add_argument(
+        "-j",
+        "--max-processes",
+        type=int,
+        default=None,
+        help="The most gem5 processes at a time (default: host cores).",
+    )
+    parser.add_argument("-d", "--outdir", type=str, default="m5out")
+    parser.add_argument(
+        "--results",
+        type=str,
+        default=None,
+        help="The results CSV file (default: {outdir}/results.csv).",
+    )
+    parser.add_argument(
+        "--stat",
+        type=str,
+        action="append",
+        default=[],
+        help="An extra stat to record (can be repeated).",
+    )
+    parser.add_argument(
+        "--costs",
+        type=str,
+        default=None,
+        help="A JSON file mapping simulation ids to predicted run times.",
+    )
+    parser.add_argument(
+        "--memory",
+        type=float,
+        default=1.0,
+        help="The memory (in GiB) assumed for a simulation not run before.",
+    )
+    parser.add_argument("--gem5", type=str, default="gem5")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rerun simulations which already completed.",
+    )
+
+    args = parser.parse_args()
+
+    config = Path(args.config)
+    outdir = Path(args.outdir).resolve()
+    outdir.mkdir(parents=True, exist_ok=True)
+    stat_names = list(DEFAULT_STATS) + args.stat
+    results = ResultStore(
+        Path(args.results) if args.results else outdir / "results.csv",
+        stat_names,
+    )
+    costs = None
+    if args.costs:
+        with open(args.costs) as f:
+            costs = json.load(f)
+
+    sim_ids = args.ids or list_simulator_ids(config, gem5=args.gem5)
+    scheduler = SweepScheduler(
+        config,
+        outdir,
+        results,
+        stat_names=stat_names,
+        gem5=args.gem5,
+        max_processes=args.max_processes,
+        default_memory=int(args.memory * (1 << 30)),
+        costs=costs,
+    )
+    if not scheduler.run(sim_ids, resume=not args.force):
+        sys.exit(1)
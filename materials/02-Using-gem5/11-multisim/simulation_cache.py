@@ -0,0 +1,310 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A content-addressed cache of whole simulations.
+
+`CachedSimulator` is a drop-in replacement for `Simulator`. Before running,
+it computes a key from
+
+* the board's configuration: every parameter and child of the board's
+  SimObjects and the attributes of the stdlib components they are built from,
+* the arguments of the `Simulator` (e.g., `on_exit_event`, with the exit
+  event generators and functions by their qualified names, or
+  `checkpoint_path`) and of `run()` (e.g., `max_ticks`),
+* the gem5 binary, and
+* every file the configuration refers to (workload binaries, disk images,
+  kernels, ...), by content.
+
+The file hashes are saved in the cache directory with the files' sizes and
+modification times, so unchanged files, like the gem5 binary, are only
+hashed once rather than by every simulation.
+
+If a simulation with the same key ran before, `run()` returns immediately:
+the cached stats (as stats.json), config.ini and config.json are copied to
+the output directory and `get_stats()` returns the cached stats. stats.txt is
+not cached, as gem5 only writes the final dump when it exits. Otherwise the
+simulation runs and its results are added to the cache. The least recently
+used entries are evicted when the cache grows over its size limit.
+
+The cache is only meant for scripts which call `run()` once and only look at
+the final stats.
+
+Usage
+-----
+
+```python
+from simulation_cache import CachedSimulator
+
+simulator = CachedSimulator(board=board)
+simulator.run()
+stats = simulator.get_stats()
+```
+"""
+
+import enum
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import m5
+from m5.SimObject import SimObject
+from m5.params import ParamValue
+
+from gem5.simulate.simulator import Simulator
+
+from multisim_sweep import file_hash, load_file_hashes, save_file_hashes
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "gem5-simulation-cache"
+
+# The files copied to and from the cache, relative to the output directory.
+CACHED_FILES = ("config.ini", "config.json")
+STATS_JSON = "stats.json"
+# The hashes of the gem5 binary and the files used, by size and modification
+# time, so they are not hashed again by every simulation.
+FILE_HASHES = ".file-hashes.json"
+
+_PRIMITIVES = (bool, int, float, str, type(None))
+
+
+def gem5_binary_hash() -> str:
+    """The hash of the running gem5 binary."""
+    try:
+        return file_hash(Path("/proc/self/exe"))
+    except OSError:
+        return "unknown"
+
+
+class _ConfigSerializer:
+    """
+    Turns a board into a canonical, JSON serializable tree. Objects reached
+    more than once (e.g., through `_parent`) are replaced by a reference to
+    the place they were first seen, and strings naming existing files are
+    replaced by the file's content hash.
+    """
+
+    def __init__(self):
+        self._seen: Dict[int, str] = {}
+
+    def serialize(self, value, path: str):
+        if isinstance(value, str):
+            if os.path.isfile(value):
+                return {"file": file_hash(Path(value))}
+            return value
+        if isinstance(value, _PRIMITIVES):
+            return value
+        if isinstance(value, enum.Enum):
+            return f"{type(value).__name__}.{value.name}"
+        if isinstance(value, os.PathLike):
+            return self.serialize(os.fspath(value), path)
+        if isinstance(value, (list, tuple)):
+            return [
+                self.serialize(item, f"{path}[{i}]")
+                for i, item in enumerate(value)
+            ]
+        if isinstance(value, (set, frozenset)):
+            items = [self.serialize(item, path) for item in value]
+            return sorted(
+                items, key=lambda item: json.dumps(item, default=str)
+            )
+        if isinstance(value, bytes):
+            return hashlib.sha256(value).hexdigest()
+        if isinstance(value, dict):
+            return {
+                str(key): self.serialize(value[key], f"{path}.{key}")
+                for key in sorted(value, key=str)
+            }
+        if isinstance(value, ParamValue):
+            return self.serialize(str(value), path)
+        if callable(value) and not isinstance(value, SimObject):
+            return getattr(value, "__qualname__", type(value).__name__)
+        if inspect.isgenerator(value):
+            # e.g., an exit event handler
+            return value.__qualname__
+
+        if id(value) in self._seen:
+            return {"ref": self._seen[id(value)]}
+        self._seen[id(value)] = path
+
+        node = {"type": type(value).__qualname__}
+        if isinstance(value, SimObject):
+            node["params"] = self.serialize(value._values, f"{path}.params")
+            node["children"] = self.serialize(
+                value._children, f"{path}.children"
+            )
+        attributes = getattr(value, "__dict__", {})
+        node["attrs"] = {
+            name: self.serialize(attributes[name], f"{path}.{name}")
+            for name in sorted(attributes)
+            if name not in ("_values", "_children")
+        }
+        return node
+
+
+def simulation_key(
+    board,
+    simulator_kwargs: Optional[Dict] = None,
+    run_args: Sequence = (),
+    run_kwargs: Optional[Dict] = None,
+) -> str:
+    """
+    The cache key of a simulation of ``board``, by a `Simulator` created with
+    ``simulator_kwargs`` (besides the board) and run with ``run_args`` and
+    ``run_kwargs``.
+    """
+    serializer = _ConfigSerializer()
+    tree = {
+        "gem5": gem5_binary_hash(),
+        "board": serializer.serialize(board, "board"),
+        "simulator": serializer.serialize(
+            simulator_kwargs or {}, "simulator"
+        ),
+        "run": serializer.serialize(
+            {"args": list(run_args), "kwargs": run_kwargs or {}}, "run"
+        ),
+    }
+    return hashlib.sha256(
+        json.dumps(tree, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class SimulationCache:
+    """A size-bounded, least recently used, on-disk simulation cache."""
+
+    def __init__(
+        self,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        max_size: int = 10 * (1 << 30),
+    ):
+        """
+        :param cache_dir: The directory the cache entries are stored in.
+        :param max_size: The largest size of the cache, in bytes.
+        """
+        self._cache_dir = Path(cache_dir)
+        self._max_size = max_size
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, board, *args, **kwargs) -> str:
+        """
+        The key of a simulation of ``board`` (see `simulation_key` for the
+        other arguments), reusing the file hashes of earlier simulations.
+        """
+        load_file_hashes(self._cache_dir / FILE_HASHES)
+        key = simulation_key(board, *args, **kwargs)
+        save_file_hashes(self._cache_dir / FILE_HASHES)
+        return key
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the entry for ``key``, or None if it is not cached."""
+        entry = self._cache_dir / key
+        if not (entry / STATS_JSON).exists():
+            return None
+        # the entry's modification time orders the entries for eviction
+        os.utime(entry)
+        return entry
+
+    def store(self, key: str, outdir: Path, stats: Dict) -> None:
+        """Add the results of a finished simulation to the cache."""
+        tmp = Path(tempfile.mkdtemp(dir=self._cache_dir, prefix=".tmp-"))
+        for name in CACHED_FILES:
+            if (outdir / name).exists():
+                shutil.copy2(outdir / name, tmp / name)
+        with (tmp / STATS_JSON).open("w") as f:
+            json.dump(stats, f)
+        try:
+            os.replace(tmp, self._cache_dir / key)
+        except OSError:
+            # another process stored the same simulation first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for entry in self._cache_dir.iterdir():
+            if entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((entry.stat().st_mtime, size, entry))
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= self._max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+class CachedSimulator(Simulator):
+    """
+    A Simulator which returns the results of an identical earlier
+    simulation instead of running it again.
+    """
+
+    def __init__(
+        self, board, cache: Optional[SimulationCache] = None, **kwargs
+    ):
+        """
+        :param board: The board to simulate.
+        :param cache: The cache to use. Defaults to a cache in
+        `~/.cache/gem5-simulation-cache`.
+        :param kwargs: Passed to `Simulator`.
+        """
+        super().__init__(board=board, **kwargs)
+        self._cached_board = board
+        self._simulator_kwargs = kwargs
+        self._cache = cache or SimulationCache()
+        self._cached_stats: Optional[Dict] = None
+
+    def is_cache_hit(self) -> bool:
+        return self._cached_stats is not None
+
+    def run(self, *args, **kwargs) -> None:
+        key = self._cache.key(
+            self._cached_board, self._simulator_kwargs, args, kwargs
+        )
+        entry = self._cache.lookup(key)
+        outdir = Path(m5.options.outdir)
+        if entry is not None:
+            for name in CACHED_FILES + (STATS_JSON,):
+                if (entry / name).exists():
+                    shutil.copy2(entry / name, outdir / name)
+            with (entry / STATS_JSON).open() as f:
+                self._cached_stats = json.load(f)
+            print(f"Simulation found in the cache ({key}), not simulating")
+            return
+
+        super().run(*args, **kwargs)
+        self._cache.store(key, outdir, super().get_stats())
+
+    def get_stats(self) -> Dict:
+        if self._cached_stats is not None:
+            return self._cached_stats
+        return super().get_stats()
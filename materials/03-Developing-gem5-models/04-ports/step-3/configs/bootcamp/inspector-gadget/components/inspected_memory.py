@@ -1,5 +1,8 @@
-from typing import Optional, Sequence, Tuple, Union, Type
+from typing import Dict, Optional, Sequence, Tuple, Union, Type
 
+import numpy as np
+
+import m5
 from m5.objects import (
     AddrRange,
     DRAMInterface,
@@ -54,3 +57,83 @@ class InspectedMemory(ChanneledMemory):
             (ctrl.dram.range, inspector.cpu_side_port)
             for ctrl, inspector in zip(self.mem_ctrl, self.inspectors)
         ]
+
+    def _stat_values(self, group) -> Dict[str, Union[float, np.ndarray]]:
+        values = {}
+        for stat in group.getStats():
+            stat.prepare()
+            value = stat.value
+            if isinstance(value, (int, float)):
+                values[stat.name] = float(value)
+            else:
+                values[stat.name] = np.asarray(value, dtype=np.float64)
+        return values
+
+    def latency_bucket_edges(self) -> np.ndarray:
+        """
+        Returns the lowest latency, in cycles, counted by every bucket of the
+        latency histograms. Bucket i counts latencies from edges[i] up to
+        edges[i + 1] (exclusive), the last one any latency from edges[-1].
+        """
+        num_buckets = self.inspectors[0].latency_histogram_buckets
+        edges = np.zeros(num_buckets, dtype=np.int64)
+        edges[1:] = 1 << np.arange(num_buckets - 1)
+        return edges
+
+    def get_channel_stats(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the current stats of every channel's InspectorGadget, e.g.,
+        from an exit event handler. They count from the last stats reset.
+
+        Every entry is an array with one row per channel:
+
+        - requests, responses: The number of packets forwarded.
+        - throughput: The data bytes forwarded per simulated second.
+        - inspection_buffer_latency, response_buffer_latency: The mean time,
+          in ticks, packets spent in the buffer.
+        - inspection_buffer_latency_hist, response_buffer_latency_hist: The
+          histograms of these latencies, see latency_bucket_edges().
+        - inspection_buffer_occupancy_hist, output_buffer_occupancy_hist,
+          response_buffer_occupancy_hist: Column i counts the packets that
+          found i entries of the buffer taken when they arrived.
+        """
+        channels = [
+            self._stat_values(inspector) for inspector in self.inspectors
+        ]
+
+        def column(name):
+            return np.array([channel[name] for channel in channels])
+
+        # the simulated seconds since the last stats reset
+        sim_seconds = column("elapsedTicks") / m5.ticks.fromSeconds(1.0)
+        requests = column("numRequestsFwded")
+        responses = column("numResponsesFwded")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "requests": requests,
+                "responses": responses,
+                "throughput": column("numBytesFwded") / sim_seconds,
+                "inspection_buffer_latency": column(
+                    "totalInspectionBufferLatency"
+                )
+                / requests,
+                "response_buffer_latency": column(
+                    "totalResponseBufferLatency"
+                )
+                / responses,
+                "inspection_buffer_latency_hist": column(
+                    "inspectionBufferLatencyHist"
+                ),
+                "response_buffer_latency_hist": column(
+                    "responseBufferLatencyHist"
+                ),
+                "inspection_buffer_occupancy_hist": column(
+                    "inspectionBufferOccupancyHist"
+                ),
+                "output_buffer_occupancy_hist": column(
+                    "outputBufferOccupancyHist"
+                ),
+                "response_buffer_occupancy_hist": column(
+                    "responseBufferOccupancyHist"
+                ),
+            }
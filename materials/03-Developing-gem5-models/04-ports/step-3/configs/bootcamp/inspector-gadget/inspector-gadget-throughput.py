@@ -0,0 +1,121 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measures how many packets the InspectorGadgets forward per host second.
+
+The HybridGenerator is run at a rate well above what the memory can serve,
+so the inspection, output and response buffers stay full and most of the
+host time is spent moving packets through the InspectorGadgets. Run it with
+gem5 builds from before and after a change to InspectorGadget (e.g., to how
+it allocates its SequenceNumberTags or buffers packets) and compare the
+packets per host second.
+
+Usage:
+
+./build/NULL/gem5.fast configs/bootcamp/inspector-gadget/inspector-gadget-throughput.py --rate 64GB/s
+"""
+
+import argparse
+import time
+
+import m5
+from m5.objects import Root
+
+from m5.objects.DRAMInterface import DDR3_1600_8x8
+
+from components.cache_hierarchy import MyPrivateL1SharedL2CacheHierarchy
+from components.hybrid_generator import HybridGenerator
+from components.inspected_memory import InspectedMemory
+
+from gem5.components.boards.test_board import TestBoard
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--rate", type=str, default="64GB/s", help="The rate of every core."
+)
+parser.add_argument("--duration", type=str, default="1ms")
+parser.add_argument("--num-cores", type=int, default=8)
+parser.add_argument("--num-channels", type=int, default=2)
+parser.add_argument(
+    "--rd-perc",
+    type=int,
+    default=100,
+    help="The percentage of reads among the generated requests.",
+)
+args = parser.parse_args()
+
+
+cache_hierarchy = MyPrivateL1SharedL2CacheHierarchy()
+
+memory = InspectedMemory(
+    dram_interface_class=DDR3_1600_8x8,
+    num_channels=args.num_channels,
+    interleaving_size="128",
+    size="512MiB",
+    inspection_buffer_entries=16,
+)
+for inspector in memory.inspectors:
+    inspector.insp_window = 4
+    inspector.num_insp_units = 4
+    inspector.insp_tot_latency = 4
+
+generator = HybridGenerator(
+    num_cores=args.num_cores,
+    rate=args.rate,
+    duration=args.duration,
+    rd_perc=args.rd_perc,
+)
+
+motherboard = TestBoard(
+    clk_freq="4GHz",
+    generator=generator,
+    memory=memory,
+    cache_hierarchy=cache_hierarchy,
+)
+
+root = Root(full_system=False, system=motherboard)
+motherboard._pre_instantiate()
+m5.instantiate()
+generator.start_traffic()
+
+start = time.perf_counter()
+exit_event = m5.simulate()
+host_seconds = time.perf_counter() - start
+
+channel_stats = memory.get_channel_stats()
+requests = channel_stats["requests"].sum()
+responses = channel_stats["responses"].sum()
+packets = requests + responses
+
+print(f"Exiting @ tick {m5.curTick()} because {exit_event.getCause()}.")
+print(f"Requests forwarded: {int(requests)}")
+print(f"Responses forwarded: {int(responses)}")
+print(f"Host seconds: {host_seconds:.3f}")
+print(f"Packets per host second: {packets / host_seconds:,.0f}")
+for channel, throughput in enumerate(channel_stats["throughput"]):
+    print(f"Channel {channel} throughput: {throughput / 1e9:.2f} GB/s")
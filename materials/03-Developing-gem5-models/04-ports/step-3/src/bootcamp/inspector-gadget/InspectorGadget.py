@@ -32,3 +32,9 @@ class InspectorGadget(ClockedObject):
     response_buffer_entries = Param.Int(
         "Number of entries in the response buffer."
     )
+
+    latency_histogram_buckets = Param.Int(
+        16,
+        "Number of log2 buckets in the histograms of buffer latencies. "
+        "The last bucket also counts the latencies that are longer.",
+    )
@@ -3,6 +3,7 @@
 #include <algorithm>
 #include <cmath>
 
+#include "base/intmath.hh"
 #include "debug/InspectorGadget.hh"
 
 namespace gem5
@@ -13,23 +14,29 @@ InspectorGadget::InspectorGadget(const InspectorGadgetParams& params):
     cpuSidePort(this, name() + ".cpu_side_port"),
     memSidePort(this, name() + ".mem_side_port"),
     inspectionBufferEntries(params.inspection_buffer_entries),
-    inspectionBuffer(clockPeriod()),
+    inspectionBuffer(clockPeriod(), params.inspection_buffer_entries),
     inspectionWindow(params.insp_window),
     numInspectionUnits(params.num_insp_units),
     totalInspectionLatency(params.insp_tot_latency),
-    inspectionUnitAvailableTimes((size_t) params.num_insp_units, 0),
     outputBufferEntries(params.output_buffer_entries),
-    outputBuffer(clockPeriod()),
+    outputBuffer(clockPeriod(), params.output_buffer_entries),
     responseBufferEntries(params.response_buffer_entries),
-    responseBuffer(clockPeriod()),
+    responseBuffer(clockPeriod(), params.response_buffer_entries),
     nextInspectionEvent([this]() { processNextInspectionEvent(); }, name() + ".nextInspectionEvent"),
     nextReqSendEvent([this](){ processNextReqSendEvent(); }, name() + ".nextReqSendEvent"),
     nextReqRetryEvent([this](){ processNextReqRetryEvent(); }, name() + ".nextReqRetryEvent"),
     nextRespSendEvent([this](){ processNextRespSendEvent(); }, name() + ".nextRespSendEvent"),
     nextRespRetryEvent([this](){ processNextRespRetryEvent(); }, name() + ".nextRespRetryEvent"),
     nextAvailableSeqNum(0), nextExpectedSeqNum(0),
+    latencyHistogramBuckets(params.latency_histogram_buckets),
     stats(this)
-{}
+{
+    fatal_if(numInspectionUnits < 1, "%s: num_insp_units should be >= 1.", name());
+    fatal_if(latencyHistogramBuckets < 1, "%s: latency_histogram_buckets should be >= 1.", name());
+    for (int i = 0; i < numInspectionUnits; i++) {
+        inspectionUnits.emplace(0, i);
+    }
+}
 
 void
 InspectorGadget::init()
@@ -55,12 +62,46 @@ InspectorGadget::align(Tick when)
     return clockEdge((Cycles) std::ceil((when - curTick()) / clockPeriod()));
 }
 
+int
+InspectorGadget::latencyBucket(Tick latency)
+{
+    Tick cycles = latency / clockPeriod();
+    if (cycles == 0) {
+        return 0;
+    }
+    return std::min(floorLog2(cycles) + 1, latencyHistogramBuckets - 1);
+}
+
+InspectorGadget::SequenceNumberTag*
+InspectorGadget::allocateSeqNumTag(uint64_t sequence_number)
+{
+    if (freeSeqNumTags.empty()) {
+        seqNumTagBlocks.emplace_back(new SequenceNumberTag[seqNumTagBlockSize]);
+        SequenceNumberTag* block = seqNumTagBlocks.back().get();
+        for (size_t i = seqNumTagBlockSize; i > 0; i--) {
+            freeSeqNumTags.push_back(&block[i - 1]);
+        }
+    }
+    SequenceNumberTag* seq_num_tag = freeSeqNumTags.back();
+    freeSeqNumTags.pop_back();
+    seq_num_tag->sequenceNumber = sequence_number;
+    return seq_num_tag;
+}
+
+void
+InspectorGadget::releaseSeqNumTag(SequenceNumberTag* seq_num_tag)
+{
+    freeSeqNumTags.push_back(seq_num_tag);
+}
+
 void
 InspectorGadget::inspectRequest(PacketPtr pkt)
 {
     panic_if(!pkt->isRequest(), "Should only inspect requests!");
-    SequenceNumberTag* seq_num_tag = new SequenceNumberTag(nextAvailableSeqNum);
-    pkt->pushSenderState(seq_num_tag);
+    // A packet that gets no response never comes back to release its tag.
+    if (pkt->needsResponse()) {
+        pkt->pushSenderState(allocateSeqNumTag(nextAvailableSeqNum));
+    }
     nextAvailableSeqNum++;
 }
 
@@ -73,7 +114,7 @@ InspectorGadget::inspectResponse(PacketPtr pkt)
     if (seq_num_tag->sequenceNumber != nextExpectedSeqNum) {
         stats.numReqRespDisplacements++;
     }
-    delete pkt->popSenderState();
+    releaseSeqNumTag(static_cast<SequenceNumberTag*>(pkt->popSenderState()));
     nextExpectedSeqNum++;
 }
 
@@ -106,6 +147,7 @@ InspectorGadget::recvTimingReq(PacketPtr pkt)
     if (inspectionBuffer.size() >= inspectionBufferEntries) {
         return false;
     }
+    stats.inspectionBufferOccupancyHist[inspectionBuffer.size()]++;
     inspectionBuffer.push(pkt, curTick());
     scheduleNextInspectionEvent(nextCycle());
     return true;
@@ -204,6 +246,7 @@ InspectorGadget::recvTimingResp(PacketPtr pkt)
     if (responseBuffer.size() >= responseBufferEntries) {
         return false;
     }
+    stats.responseBufferOccupancyHist[responseBuffer.size()]++;
     responseBuffer.push(pkt, curTick());
     scheduleNextRespSendEvent(nextCycle());
     return true;
@@ -236,11 +279,9 @@ InspectorGadget::processNextInspectionEvent()
     panic_if(!inspectionBuffer.hasReady(curTick()), "Should never try to inspect if no ready packets!");
 
     int insp_window_left = inspectionWindow;
-    for (int i = 0; i < numInspectionUnits; i++) {
-        if (inspectionUnitAvailableTimes[i] > curTick()) {
-            DPRINTF(InspectorGadget, "%s: Inspection unit %d is busy.\n", __func__,  i);
-            continue;
-        }
+    // Only the units that are available now are visited, in the order they
+    // became available.
+    while (!inspectionUnits.empty() && inspectionUnits.top().first <= curTick()) {
         if (inspectionBuffer.empty()) {
             DPRINTF(InspectorGadget, "%s: Inspection buffer is empty.\n", __func__);
             break;
@@ -249,22 +290,26 @@ InspectorGadget::processNextInspectionEvent()
             DPRINTF(InspectorGadget, "%s: Output buffer is full.\n", __func__);
             break;
         }
-        stats.totalInspectionBufferLatency += curTick() - inspectionBuffer.frontTime();
+        int unit = inspectionUnits.top().second;
+        inspectionUnits.pop();
+        DPRINTF(InspectorGadget, "%s: Inspection unit %d is inspecting.\n", __func__, unit);
+
+        Tick inspection_buffer_latency = curTick() - inspectionBuffer.frontTime();
+        stats.totalInspectionBufferLatency += inspection_buffer_latency;
+        stats.inspectionBufferLatencyHist[latencyBucket(inspection_buffer_latency)]++;
         PacketPtr pkt = inspectionBuffer.front();
         inspectRequest(pkt);
+        stats.outputBufferOccupancyHist[outputBuffer.size()]++;
         outputBuffer.push(pkt, clockEdge(totalInspectionLatency));
         inspectionBuffer.pop();
-        inspectionUnitAvailableTimes[i] = clockEdge(totalInspectionLatency);
+        // A unit inspects at most one packet per cycle.
+        inspectionUnits.emplace(std::max(clockEdge(totalInspectionLatency), nextCycle()), unit);
         insp_window_left--;
         if (insp_window_left == 0) {
             break;
         }
     }
 
-    for (int i = 0; i < numInspectionUnits; i++) {
-        inspectionUnitAvailableTimes[i] = std::max(inspectionUnitAvailableTimes[i], nextCycle());
-    }
-
     scheduleNextReqSendEvent(nextCycle());
     scheduleNextReqRetryEvent(nextCycle());
     scheduleNextInspectionEvent(nextCycle());
@@ -277,14 +322,10 @@ InspectorGadget::scheduleNextInspectionEvent(Tick when)
     bool have_entry = outputBuffer.size() < outputBufferEntries;
 
     if (have_packet && have_entry && !nextInspectionEvent.scheduled()) {
-        Tick first_avail_insp_unit_time = \
-            *std::min_element(
-                            inspectionUnitAvailableTimes.begin(),
-                            inspectionUnitAvailableTimes.end()
-                            );
+        // Wake up once, when both a packet and a unit are ready.
         Tick schedule_time = align(std::max({when,
                                             inspectionBuffer.firstReadyTime(),
-                                            first_avail_insp_unit_time
+                                            inspectionUnits.top().first
                                             }));
         schedule(nextInspectionEvent, schedule_time);
     }
@@ -298,6 +339,9 @@ InspectorGadget::processNextReqSendEvent()
 
     stats.numRequestsFwded++;
     PacketPtr pkt = outputBuffer.front();
+    if (pkt->hasData()) {
+        stats.numBytesFwded += pkt->getSize();
+    }
     memSidePort.sendPacket(pkt);
     outputBuffer.pop();
 
@@ -340,9 +384,14 @@ InspectorGadget::processNextRespSendEvent()
     panic_if(!responseBuffer.hasReady(curTick()), "Should never try to send if no ready packets!");
 
     stats.numResponsesFwded++;
-    stats.totalResponseBufferLatency += curTick() - responseBuffer.frontTime();
+    Tick response_buffer_latency = curTick() - responseBuffer.frontTime();
+    stats.totalResponseBufferLatency += response_buffer_latency;
+    stats.responseBufferLatencyHist[latencyBucket(response_buffer_latency)]++;
 
     PacketPtr pkt = responseBuffer.front();
+    if (pkt->hasData()) {
+        stats.numBytesFwded += pkt->getSize();
+    }
     inspectResponse(pkt);
     cpuSidePort.sendPacket(pkt);
     responseBuffer.pop();
@@ -387,8 +436,30 @@ InspectorGadget::InspectorGadgetStats::InspectorGadgetStats(InspectorGadget* ins
     ADD_STAT(numRequestsFwded, statistics::units::Count::get(), "Number of requests forwarded."),
     ADD_STAT(totalResponseBufferLatency, statistics::units::Tick::get(), "Total response buffer latency."),
     ADD_STAT(numResponsesFwded, statistics::units::Count::get(), "Number of responses forwarded."),
-    ADD_STAT(numReqRespDisplacements, statistics::units::Count::get(), "Number of request-response displacements.")
-{}
+    ADD_STAT(numReqRespDisplacements, statistics::units::Count::get(), "Number of request-response displacements."),
+    ADD_STAT(numBytesFwded, statistics::units::Byte::get(), "Number of data bytes in the requests and responses forwarded."),
+    ADD_STAT(inspectionBufferLatencyHist, statistics::units::Count::get(), "Inspection buffer latencies, in log2 buckets of cycles."),
+    ADD_STAT(responseBufferLatencyHist, statistics::units::Count::get(), "Response buffer latencies, in log2 buckets of cycles."),
+    ADD_STAT(inspectionBufferOccupancyHist, statistics::units::Count::get(), "Inspection buffer occupancy seen by arriving packets."),
+    ADD_STAT(outputBufferOccupancyHist, statistics::units::Count::get(), "Output buffer occupancy seen by arriving packets."),
+    ADD_STAT(responseBufferOccupancyHist, statistics::units::Count::get(), "Response buffer occupancy seen by arriving packets."),
+    ADD_STAT(elapsedTicks, statistics::units::Tick::get(), "Number of ticks since the stats were last reset."),
+    lastResetTick(0)
+{
+    elapsedTicks.method(this, &InspectorGadgetStats::ticksSinceReset);
+    inspectionBufferLatencyHist.init(inspector_gadget->latencyHistogramBuckets);
+    responseBufferLatencyHist.init(inspector_gadget->latencyHistogramBuckets);
+    inspectionBufferOccupancyHist.init(inspector_gadget->inspectionBufferEntries);
+    outputBufferOccupancyHist.init(inspector_gadget->outputBufferEntries);
+    responseBufferOccupancyHist.init(inspector_gadget->responseBufferEntries);
+}
+
+void
+InspectorGadget::InspectorGadgetStats::resetStats()
+{
+    statistics::Group::resetStats();
+    lastResetTick = curTick();
+}
 
 } // namespace gem5
 
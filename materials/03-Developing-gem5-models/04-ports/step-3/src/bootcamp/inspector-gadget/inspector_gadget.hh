@@ -1,7 +1,11 @@
 #ifndef __BOOTCAMP_INSPECTOR_GADGET_INSPECTOR_GADGET_HH__
 #define __BOOTCAMP_INSPECTOR_GADGET_INSPECTOR_GADGET_HH__
 
+#include <algorithm>
+#include <functional>
+#include <memory>
 #include <queue>
+#include <utility>
 #include <vector>
 
 #include "base/stats/group.hh"
@@ -63,44 +67,79 @@ class InspectorGadget : public ClockedObject
     class TimedQueue
     {
       private:
+        struct Entry
+        {
+            T item;
+            Tick insertionTime;
+        };
+
         Tick latency;
 
-        std::queue<T> items;
-        std::queue<Tick> insertionTimes;
+        // Ring buffer, sized for the buffer's number of entries up front.
+        std::vector<Entry> entries;
+        size_t head;
+        size_t count;
+
+        size_t index(size_t i) const {
+            size_t pos = head + i;
+            return pos < entries.size() ? pos : pos - entries.size();
+        }
+        void grow() {
+            std::vector<Entry> grown(std::max<size_t>(1, 2 * entries.size()));
+            for (size_t i = 0; i < count; i++) {
+                grown[i] = entries[index(i)];
+            }
+            entries.swap(grown);
+            head = 0;
+        }
 
       public:
-        TimedQueue(Tick latency): latency(latency) {}
+        TimedQueue(Tick latency, size_t capacity):
+            latency(latency), entries(std::max<size_t>(1, capacity)),
+            head(0), count(0)
+        {}
 
         void push(T item, Tick insertion_time) {
-            items.push(item);
-            insertionTimes.push(insertion_time);
+            if (count == entries.size()) {
+                grow();
+            }
+            entries[index(count)] = {item, insertion_time};
+            count++;
         }
         void pop() {
-            items.pop();
-            insertionTimes.pop();
+            head = index(1);
+            count--;
         }
 
-        T& front() { return items.front(); }
-        Tick frontTime() { return insertionTimes.front(); }
-        bool empty() const { return items.empty(); }
-        size_t size() const { return items.size(); }
+        T& front() { return entries[head].item; }
+        Tick frontTime() { return entries[head].insertionTime; }
+        bool empty() const { return count == 0; }
+        size_t size() const { return count; }
         bool hasReady(Tick current_time) const {
             if (empty()) {
                 return false;
             }
-            return (current_time - insertionTimes.front()) >= latency;
+            return (current_time - entries[head].insertionTime) >= latency;
         }
-        Tick firstReadyTime() { return insertionTimes.front() + latency; }
+        Tick firstReadyTime() { return entries[head].insertionTime + latency; }
     };
 
     struct SequenceNumberTag: public Packet::SenderState
     {
         uint64_t sequenceNumber;
-        SequenceNumberTag(uint64_t sequenceNumber):
+        SequenceNumberTag(uint64_t sequenceNumber = 0):
             SenderState(), sequenceNumber(sequenceNumber)
         {}
     };
 
+    // SequenceNumberTags are allocated in blocks and recycled through a
+    // free list, instead of a new/delete for every request.
+    static constexpr size_t seqNumTagBlockSize = 256;
+    std::vector<std::unique_ptr<SequenceNumberTag[]>> seqNumTagBlocks;
+    std::vector<SequenceNumberTag*> freeSeqNumTags;
+    SequenceNumberTag* allocateSeqNumTag(uint64_t sequence_number);
+    void releaseSeqNumTag(SequenceNumberTag* seq_num_tag);
+
     struct InspectorGadgetStats: public statistics::Group
     {
         statistics::Scalar totalInspectionBufferLatency;
@@ -108,7 +147,21 @@ class InspectorGadget : public ClockedObject
         statistics::Scalar totalResponseBufferLatency;
         statistics::Scalar numResponsesFwded;
         statistics::Scalar numReqRespDisplacements;
+        statistics::Scalar numBytesFwded;
+        // Bucket 0 counts latencies of 0 cycles, bucket i > 0 latencies of
+        // [2^(i-1), 2^i) cycles. The last bucket also counts anything longer.
+        statistics::Vector inspectionBufferLatencyHist;
+        statistics::Vector responseBufferLatencyHist;
+        // Bucket i counts the packets that found i entries taken on arrival.
+        statistics::Vector inspectionBufferOccupancyHist;
+        statistics::Vector outputBufferOccupancyHist;
+        statistics::Vector responseBufferOccupancyHist;
+        // The stats count from the last reset, so rates need its time.
+        statistics::Value elapsedTicks;
+        Tick lastResetTick;
+        Tick ticksSinceReset() const { return curTick() - lastResetTick; }
         InspectorGadgetStats(InspectorGadget* inspector_gadget);
+        void resetStats() override;
     };
 
 
@@ -122,7 +175,11 @@ class InspectorGadget : public ClockedObject
     int inspectionWindow;
     int numInspectionUnits;
     Cycles totalInspectionLatency;
-    std::vector<Tick> inspectionUnitAvailableTimes;
+    // (available time, unit id) of every inspection unit, the unit that is
+    // available first on top.
+    typedef std::pair<Tick, int> InspectionUnit;
+    std::priority_queue<InspectionUnit, std::vector<InspectionUnit>,
+                        std::greater<InspectionUnit>> inspectionUnits;
 
     int outputBufferEntries;
     TimedQueue<PacketPtr> outputBuffer;
@@ -158,6 +215,9 @@ class InspectorGadget : public ClockedObject
 
     Tick align(Tick when);
 
+    int latencyHistogramBuckets;
+    int latencyBucket(Tick latency);
+
     InspectorGadgetStats stats;
 
   public:
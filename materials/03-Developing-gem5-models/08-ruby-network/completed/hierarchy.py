@@ -11,6 +11,27 @@ cache_hierarchy = PrivateL1SharedL2CacheHierarchy(
     l2_size="2MiB",
     l2_assoc=16,
 )
+```
+
+To use another topology, e.g., a mesh with 16 L2 banks for a 64 core board,
+import it from `topologies.py`. It is in 08-ruby-network, next to the run
+scripts, not in completed/, so add that directory to the path when the script
+is somewhere else:
+
+```python
+import sys
+sys.path.append("materials/03-Developing-gem5-models/08-ruby-network")
+
+from topologies import SimpleTopology
+cache_hierarchy = PrivateL1SharedL2CacheHierarchy(
+    l1_size="32KiB",
+    l1_assoc=8,
+    l2_size="1MiB",
+    l2_assoc=16,
+    num_l2_banks=16,
+    network=lambda ruby_system: SimpleTopology(ruby_system, "mesh"),
+)
+```
 
 Note: This hierarchy is just an example of how to customize a CHI hierarchy.
 It has been tested with mostly user-mode workloads in SE mode and FS mode after
@@ -19,6 +40,7 @@ to fail to bring up PCI devices.
 """
 
 from itertools import chain
+from typing import Callable, Optional
 
 from gem5.components.cachehierarchies.chi.nodes.abstract_node import (
     AbstractNode,
@@ -113,12 +135,25 @@ class PrivateL1SharedL2CacheHierarchy(AbstractRubyCacheHierarchy):
     """A two level cache based on CHI
     """
 
-    def __init__(self, l1_size: str, l1_assoc: int, l2_size: str, l2_assoc: int):
+    def __init__(
+        self,
+        l1_size: str,
+        l1_assoc: int,
+        l2_size: str,
+        l2_assoc: int,
+        num_l2_banks: int = 2,
+        network: Optional[Callable[[RubySystem], RubyNetwork]] = None,
+    ):
         """
         :param l1_size: The size of the priavte I/D caches in the hierarchy.
         :param l1_assoc: The associativity of each cache.
         :param l2_size: The size of the shared L2 cache.
         :param l2_assoc: The associativity of the shared L2 cache.
+        :param num_l2_banks: The number of L2 banks (home nodes), each of
+                             l2_size. Must be a power of two.
+        :param network: Creates the network from the RubySystem. Defaults to
+                        `Ring`, which only works with the default of two L2
+                        banks.
         """
         super().__init__()
 
@@ -126,6 +161,10 @@ class PrivateL1SharedL2CacheHierarchy(AbstractRubyCacheHierarchy):
         self._l1_assoc = l1_assoc
         self._l2_size = l2_size
         self._l2_assoc = l2_assoc
+        if num_l2_banks < 1 or num_l2_banks & (num_l2_banks - 1):
+            raise ValueError("num_l2_banks must be a power of two.")
+        self._num_l2_banks = num_l2_banks
+        self._network = network if network is not None else Ring
 
     def incorporate_cache(self, board):
 
@@ -135,30 +174,39 @@ class PrivateL1SharedL2CacheHierarchy(AbstractRubyCacheHierarchy):
         self.ruby_system = RubySystem()
 
         # Ruby's global network.
-        self.ruby_system.network = Ring(self.ruby_system)
+        self.ruby_system.network = self._network(self.ruby_system)
 
         # Network configurations
         # virtual networks: 0=request, 1=snoop, 2=response, 3=data
         self.ruby_system.number_of_virtual_networks = 4
         self.ruby_system.network.number_of_virtual_networks = 4
 
-        # Create a L2/Home nodes sliced by the 7th bit
+        # Create the L2/Home nodes sliced by the address bits from the 7th up
+        intlv_bits = self._num_l2_banks.bit_length() - 1
+        if intlv_bits == 0:
+            # A single bank has all the addresses
+            l2_ranges = [AddrRange(start=0, size=MaxAddr)]
+        else:
+            l2_ranges = [
+                AddrRange(
+                    start=0,
+                    size=MaxAddr,
+                    intlvHighBit=6 + intlv_bits,
+                    xorHighBit=0,
+                    intlvBits=intlv_bits,
+                    intlvMatch=i,
+                )
+                for i in range(self._num_l2_banks)
+            ]
         self.l2caches = [
             SharedL2(
                 size=self._l2_size,
                 assoc=self._l2_assoc,
                 network=self.ruby_system.network,
                 cache_line_size=board.get_cache_line_size(),
-                addr_ranges = AddrRange(
-                    start=0,
-                    size=MaxAddr,
-                    intlvHighBit=7,
-                    xorHighBit=0,
-                    intlvBits=1,
-                    intlvMatch=i,
-                ),
+                addr_ranges=addr_range,
             )
-            for i in range(2)
+            for addr_range in l2_ranges
         ]
 
         for l2 in self.l2caches:
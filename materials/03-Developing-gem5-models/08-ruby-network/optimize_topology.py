@@ -0,0 +1,629 @@
+"""
+Places the L2 banks and memory controllers of a topology from the traffic of
+a profiling run.
+
+`TopologyLayout` places them from hop counts alone, as if every core and every
+bank had the same traffic. This script instead reads the number of messages
+every link delivered in a profiling run (see `profile-traffic.py`), and
+places them to minimize the hop count weighted by the traffic between the
+controllers.
+
+Only the messages each controller received are in the stats, not who they
+came from. The traffic between two controllers is estimated from these
+totals: a core sends its requests to every L2 bank in proportion to the
+bank's share of the L2 traffic (the banks are interleaved by address, so its
+requests are spread over the banks as everyone else's), and an L2 bank sends
+its misses to every memory controller in proportion to the memory
+controller's share of the memory traffic. The traffic is counted both ways,
+as every request gets a response.
+
+With these weights, the banks are placed for the current memory controllers,
+then the memory controllers for the current banks, until this no longer
+lowers the weighted hop count. Each step is an assignment of controllers to
+routers, solved by taking the best free router for the busiest controllers
+first, then moving and swapping controllers while this helps. As in
+`TopologyLayout.place`, no router gets more than its share of the L2 banks or
+of the memory controllers.
+
+The result is written as a Python module with an `OptimizedTopology`
+SimpleNetwork, which only depends on gem5. Copy it next to a `hierarchy.py`
+(e.g., in 07-chi-protocol or 08-ruby-network) and use it instead of
+`SimplePt2Pt` or `Ring`:
+
+```python
+from optimized_topology import OptimizedTopology
+
+self.ruby_system.network = OptimizedTopology(self.ruby_system)
+```
+
+It takes the controllers as `SimplePt2Pt` (one list) or as `Ring` (by kind)
+does, and checks there are as many as it was placed for.
+
+Usage:
+
+> gem5 profile-traffic.py --kind mesh --num-cores 16 --num-l2-banks 4
+> python3 optimize_topology.py m5out/stats.txt m5out/topology.json \\
+      --output optimized_topology.py
+
+`--check` checks the matching of the stats to the controllers and links on
+synthetic stats, without a profiling run.
+"""
+
+import argparse
+import os
+import re
+import tempfile
+from collections import defaultdict
+from math import ceil
+from typing import Dict, List, Sequence, Tuple
+
+from topology_layout import MACHINE_TYPES, TOPOLOGY_KINDS, TopologyLayout
+
+_THROTTLE_STAT = re.compile(
+    r"\.network\.routers(\d+)\.throttle(\d+)"
+    r"\.(msg_count|msg_bytes)\.\w+::(\w+)$"
+)
+
+
+def read_link_traffic(
+    stats_path: str, layout: TopologyLayout, metric: str = "msg_count"
+) -> Tuple[Dict[Tuple[str, int], float], Dict[Tuple[int, int], float]]:
+    """
+    Returns the traffic delivered to every controller, by (kind, index), and
+    carried by every internal link, by (src router, dst router), from the
+    last stats dump in stats_path.
+
+    In a SimpleNetwork, every output link of a router has a throttle. Ruby
+    creates the links sorted by their source and destination nodes, so the
+    throttles of a router are its links to its controllers, by machine id
+    (type, then version, see `TopologyLayout.machine_order`), then its links
+    to other routers, by router id.
+    """
+    # (router, throttle) -> subscript -> value, of the last dump
+    values = defaultdict(lambda: defaultdict(float))
+    with open(stats_path) as f:
+        for line in f:
+            if line.startswith("---------- Begin Simulation Statistics"):
+                values.clear()
+                continue
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            match = _THROTTLE_STAT.search(fields[0])
+            if not match or match.group(3) != metric:
+                continue
+            try:
+                value = float(fields[1])
+            except ValueError:
+                continue
+            router, throttle = int(match.group(1)), int(match.group(2))
+            values[(router, throttle)][match.group(4)] += value
+    if not values:
+        raise ValueError(f"No {metric} stats of the network in {stats_path}.")
+
+    ext_nodes = layout.ext_nodes()
+    machine_orders = [layout.machine_order(i) for i in range(len(ext_nodes))]
+    if len(set(machine_orders)) != len(machine_orders):
+        raise ValueError("Two controllers have the same type and version.")
+    out_links = [[] for _ in range(layout.num_routers)]
+    for i in sorted(range(len(ext_nodes)), key=layout.machine_order):
+        kind, index, router = ext_nodes[i]
+        out_links[router].append(("ext", (kind, index)))
+    for src, dst, _, _, _ in sorted(layout.links):
+        out_links[src].append(("int", (src, dst)))
+
+    ext_traffic = defaultdict(float)
+    int_traffic = defaultdict(float)
+    for (router, throttle), subscripts in values.items():
+        if router >= layout.num_routers or throttle >= len(out_links[router]):
+            raise ValueError(
+                f"routers{router}.throttle{throttle} is not in the layout, "
+                "the stats are not from a run with this topology."
+            )
+        if "total" in subscripts:
+            traffic = subscripts["total"]
+        else:
+            traffic = sum(
+                v for sub, v in subscripts.items() if sub.isdigit()
+            )
+        link_type, key = out_links[router][throttle]
+        if link_type == "ext":
+            ext_traffic[key] += traffic
+        else:
+            int_traffic[key] += traffic
+    return ext_traffic, int_traffic
+
+
+class TrafficModel:
+    """The estimated traffic between the cores, L2 banks and memory."""
+
+    def __init__(
+        self,
+        core_traffic: Sequence[float],
+        l2_traffic: Sequence[float],
+        mem_traffic: Sequence[float],
+    ):
+        """
+        :param core_traffic: The traffic received by every core's L1 caches.
+        :param l2_traffic: The traffic received by every L2 bank.
+        :param mem_traffic: The traffic received by every memory controller.
+        """
+        if not sum(core_traffic) or not sum(l2_traffic):
+            raise ValueError("No traffic between the cores and the L2 banks.")
+        l2_share = [t / sum(l2_traffic) for t in l2_traffic]
+        # core -> bank and bank -> memory, both ways
+        self.core_l2 = [
+            [2 * core * share for share in l2_share] for core in core_traffic
+        ]
+        if sum(mem_traffic):
+            mem_share = [t / sum(mem_traffic) for t in mem_traffic]
+            self.l2_mem = [
+                [2 * sum(mem_traffic) * share * mem for mem in mem_share]
+                for share in l2_share
+            ]
+        else:
+            self.l2_mem = [[0.0] * len(mem_traffic) for _ in l2_share]
+        self.total = sum(map(sum, self.core_l2)) + sum(map(sum, self.l2_mem))
+
+    def cost(
+        self,
+        layout: TopologyLayout,
+        l2_routers: Sequence[int],
+        mem_routers: Sequence[int],
+    ) -> float:
+        """The total hop count of the traffic, with the given placement."""
+        hops = layout.hops
+        cost = 0.0
+        for core, row in zip(layout.core_routers, self.core_l2):
+            cost += sum(t * hops[core][l2] for t, l2 in zip(row, l2_routers))
+        for l2, row in zip(l2_routers, self.l2_mem):
+            cost += sum(t * hops[l2][mem] for t, mem in zip(row, mem_routers))
+        return cost
+
+
+def assign(cost: List[List[float]], num_routers: int) -> List[int]:
+    """
+    Returns a router for every item, with a low total cost, where cost[i][r]
+    is the cost of item i on router r. No router gets more than
+    ceil(len(cost) / num_routers) items.
+    """
+    capacity = ceil(len(cost) / num_routers)
+    load = [0] * num_routers
+    routers = [0] * len(cost)
+    # the items with the most to lose first
+    order = sorted(
+        range(len(cost)),
+        key=lambda i: max(cost[i]) - min(cost[i]),
+        reverse=True,
+    )
+    for i in order:
+        router = min(
+            (r for r in range(num_routers) if load[r] < capacity),
+            key=lambda r: (cost[i][r], r),
+        )
+        routers[i] = router
+        load[router] += 1
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(cost)):
+            for r in range(num_routers):
+                if load[r] < capacity and cost[i][r] < cost[i][routers[i]]:
+                    load[routers[i]] -= 1
+                    load[r] += 1
+                    routers[i] = r
+                    improved = True
+            for j in range(i + 1, len(cost)):
+                ri, rj = routers[i], routers[j]
+                if cost[i][rj] + cost[j][ri] < cost[i][ri] + cost[j][rj]:
+                    routers[i], routers[j] = rj, ri
+                    improved = True
+    return routers
+
+
+def optimize(
+    layout: TopologyLayout,
+    traffic: TrafficModel,
+    max_rounds: int = 20,
+) -> Tuple[List[int], List[int]]:
+    """
+    Returns the L2 bank and memory controller routers that minimize the
+    traffic's hop count, starting from layout's placement.
+    """
+    hops = layout.hops
+    routers = range(layout.num_routers)
+    l2_routers = list(layout.l2_routers)
+    mem_routers = list(layout.mem_routers)
+    best = traffic.cost(layout, l2_routers, mem_routers)
+    for _ in range(max_rounds):
+        l2_cost = [
+            [
+                sum(
+                    t * hops[core][r]
+                    for t, core in zip(column, layout.core_routers)
+                )
+                + sum(t * hops[r][mem] for t, mem in zip(row, mem_routers))
+                for r in routers
+            ]
+            for column, row in zip(zip(*traffic.core_l2), traffic.l2_mem)
+        ]
+        new_l2_routers = assign(l2_cost, layout.num_routers)
+        mem_cost = [
+            [
+                sum(t * hops[l2][r] for t, l2 in zip(column, new_l2_routers))
+                for r in routers
+            ]
+            for column in zip(*traffic.l2_mem)
+        ]
+        new_mem_routers = assign(mem_cost, layout.num_routers)
+        cost = traffic.cost(layout, new_l2_routers, new_mem_routers)
+        if cost >= best:
+            break
+        best = cost
+        l2_routers, mem_routers = new_l2_routers, new_mem_routers
+    return l2_routers, mem_routers
+
+
+def synthetic_stats(
+    layout: TopologyLayout,
+    ext_traffic: Dict[Tuple[str, int], float],
+    int_traffic: Dict[Tuple[int, int], float],
+) -> str:
+    """
+    The msg_count stats of a SimpleNetwork with layout, as Ruby dumps them,
+    with the given traffic. The throttles of every router are numbered as in
+    Ruby's Topology: by destination node, where controller nodes are
+    numbered MachineType_base_number(type) + version, and router nodes come
+    after every controller node.
+    """
+    counts = {machine_type: 0 for machine_type in MACHINE_TYPES}
+    for machine_type, _ in layout.machine_ids:
+        counts[machine_type] += 1
+    base = {}
+    num_nodes = 0
+    for machine_type in MACHINE_TYPES:
+        base[machine_type] = num_nodes
+        num_nodes += counts[machine_type]
+
+    # (destination node, traffic) of every output link of every router
+    out_links = [[] for _ in range(layout.num_routers)]
+    for (kind, index, router), (machine_type, version) in zip(
+        layout.ext_nodes(), layout.machine_ids
+    ):
+        out_links[router].append(
+            (base[machine_type] + version, ext_traffic[(kind, index)])
+        )
+    for src, dst, _, _, _ in layout.links:
+        out_links[src].append((2 * num_nodes + dst, int_traffic[(src, dst)]))
+
+    lines = ["---------- Begin Simulation Statistics ----------"]
+    for router, links in enumerate(out_links):
+        for throttle, (_, traffic) in enumerate(sorted(links)):
+            name = (
+                "board.cache_hierarchy.ruby_system.network."
+                f"routers{router:02d}.throttle{throttle:02d}.msg_count"
+            )
+            # split over two message sizes and virtual networks
+            lines.append(f"{name}.Control::0 {traffic // 3} # (Count)")
+            lines.append(
+                f"{name}.Data::2 {traffic - traffic // 3} # (Count)"
+            )
+    lines.append("---------- End Simulation Statistics   ----------")
+    return "\n".join(lines) + "\n"
+
+
+def check_link_traffic() -> None:
+    """
+    Checks that `read_link_traffic` credits the traffic of synthetic stats
+    to the right controllers and links. The controllers are numbered as in
+    completed/hierarchy.py: the L2 banks get the first Cache versions, then
+    every core its L1D and L1I, then the DMA controllers.
+    """
+    for kind, num_cores, num_l2s, num_mems in (
+        ("mesh", 16, 4, 2),
+        ("cmesh", 16, 2, 2),
+        ("ring", 8, 8, 4),
+        ("torus", 9, 3, 1),
+    ):
+        layout = TopologyLayout(kind, num_cores)
+        layout.place_controllers(num_l2s, num_mems, num_dma_ctrls=1)
+        versions = {
+            "l1i": lambda i: ("Cache", num_l2s + 2 * i + 1),
+            "l1d": lambda i: ("Cache", num_l2s + 2 * i),
+            "l2": lambda i: ("Cache", i),
+            "mem": lambda i: ("Memory", i),
+            "dma": lambda i: ("Cache", num_l2s + 2 * num_cores + i),
+        }
+        layout.machine_ids = [
+            versions[node_kind](index)
+            for node_kind, index, _ in layout.ext_nodes()
+        ]
+        # different traffic for every controller and link
+        ext_traffic = {
+            (node_kind, index): 1000 + 10 * i
+            for i, (node_kind, index, _) in enumerate(layout.ext_nodes())
+        }
+        int_traffic = {
+            (src, dst): 100000 + 10 * i
+            for i, (src, dst, _, _, _) in enumerate(layout.links)
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            stats_path = os.path.join(tmp, "stats.txt")
+            with open(stats_path, "w") as f:
+                f.write(synthetic_stats(layout, ext_traffic, int_traffic))
+            layout_path = os.path.join(tmp, "topology.json")
+            layout.save(layout_path)
+            read_ext, read_int = read_link_traffic(
+                stats_path, TopologyLayout.load(layout_path)
+            )
+        if read_ext != ext_traffic or read_int != int_traffic:
+            raise AssertionError(
+                f"The throttles of a {kind} are matched to the wrong "
+                "controllers or links."
+            )
+        print(f"{kind}: the traffic of every controller and link is found")
+
+
+def _format_list(values: Sequence, indent: str = "    ") -> str:
+    lines = ["["]
+    line = indent
+    for value in values:
+        item = f"{value!r}, "
+        if len(line) + len(item) > 79:
+            lines.append(line.rstrip())
+            line = indent
+        line += item
+    if line.strip():
+        lines.append(line.rstrip())
+    lines.append("]")
+    return "\n".join(lines)
+
+
+_MODULE_TEMPLATE = '''"""
+A {kind} topology for the Ruby network, generated by optimize_topology.py
+from the traffic in {stats_path}.
+
+{description}
+
+Use it like SimplePt2Pt or Ring in hierarchy.py:
+
+```python
+from optimized_topology import OptimizedTopology
+
+self.ruby_system.network = OptimizedTopology(self.ruby_system)
+```
+"""
+
+from gem5.components.cachehierarchies.chi.nodes.dma_requestor import (
+    DMARequestor,
+)
+from gem5.components.cachehierarchies.chi.nodes.memory_controller import (
+    MemoryController,
+)
+
+from m5.objects import (
+    SimpleExtLink,
+    SimpleIntLink,
+    SimpleNetwork,
+    Switch,
+)
+
+NUM_ROUTERS = {num_routers}
+
+# The router of every core's L1I/L1D, L2 bank and memory controller. The DMA
+# controllers are on the router of the first memory controller.
+CORE_ROUTERS = {core_routers}
+L2_ROUTERS = {l2_routers}
+MEM_ROUTERS = {mem_routers}
+
+# (src, dst, weight, src_outport, dst_inport) of every internal link
+LINKS = {links}
+
+
+class OptimizedTopology(SimpleNetwork):
+    def __init__(self, ruby_system):
+        super().__init__()
+        self.netifs = []  # Used for garnet
+        self.ruby_system = ruby_system
+
+    def connectControllers(
+        self,
+        l1i_ctrls,
+        l1d_ctrls=None,
+        l2_ctrls=None,
+        mem_ctrls=None,
+        dma_ctrls=None,
+    ):
+        """
+        Takes the controllers either by kind, as Ring, or as one list, as
+        SimplePt2Pt. In a list, the L1 caches of a core have to be next to
+        each other, the L2 banks are the home nodes (is_HN), and the memory
+        and DMA controllers are told apart by their class.
+        """
+        if l1d_ctrls is None:
+            l1_ctrls, l2_ctrls, mem_ctrls, dma_ctrls = [], [], [], []
+            for ctrl in l1i_ctrls:
+                if isinstance(ctrl, MemoryController):
+                    mem_ctrls.append(ctrl)
+                elif isinstance(ctrl, DMARequestor):
+                    dma_ctrls.append(ctrl)
+                elif ctrl.is_HN:
+                    l2_ctrls.append(ctrl)
+                else:
+                    l1_ctrls.append(ctrl)
+            l1i_ctrls, l1d_ctrls = l1_ctrls[0::2], l1_ctrls[1::2]
+        dma_ctrls = dma_ctrls or []
+
+        for ctrls, routers, name in (
+            (l1i_ctrls, CORE_ROUTERS, "cores"),
+            (l1d_ctrls, CORE_ROUTERS, "cores"),
+            (l2_ctrls, L2_ROUTERS, "L2 banks"),
+            (mem_ctrls, MEM_ROUTERS, "memory controllers"),
+        ):
+            if len(ctrls) != len(routers):
+                raise ValueError(
+                    f"This topology is for {{len(routers)}} {{name}}, got "
+                    f"{{len(ctrls)}}."
+                )
+
+        routers = [Switch(router_id=i) for i in range(NUM_ROUTERS)]
+        ext_nodes = (
+            list(zip(l1i_ctrls, CORE_ROUTERS))
+            + list(zip(l1d_ctrls, CORE_ROUTERS))
+            + list(zip(l2_ctrls, L2_ROUTERS))
+            + list(zip(mem_ctrls, MEM_ROUTERS))
+            + [(ctrl, MEM_ROUTERS[0]) for ctrl in dma_ctrls]
+        )
+        self.ext_links = [
+            SimpleExtLink(link_id=i, ext_node=ctrl, int_node=routers[router])
+            for i, (ctrl, router) in enumerate(ext_nodes)
+        ]
+        self.int_links = [
+            SimpleIntLink(
+                link_id=i,
+                src_node=routers[src],
+                dst_node=routers[dst],
+                weight=weight,
+                src_outport=src_outport,
+                dst_inport=dst_inport,
+            )
+            for i, (src, dst, weight, src_outport, dst_inport) in enumerate(
+                LINKS
+            )
+        ]
+        self.routers = routers
+'''
+
+
+def write_module(path: str, layout: TopologyLayout, stats_path: str) -> None:
+    with open(path, "w") as f:
+        f.write(
+            _MODULE_TEMPLATE.format(
+                kind=layout.kind,
+                stats_path=stats_path,
+                description=layout.describe(),
+                num_routers=layout.num_routers,
+                core_routers=_format_list(layout.core_routers),
+                l2_routers=_format_list(layout.l2_routers),
+                mem_routers=_format_list(layout.mem_routers),
+                links=_format_list(layout.links),
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "stats", nargs="?", help="The stats.txt of the profiling run."
+    )
+    parser.add_argument(
+        "layout",
+        nargs="?",
+        help="The topology.json saved by the profiling run.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check that the stats of every throttle are matched to "
+        "the right controller or link, on synthetic stats.",
+    )
+    parser.add_argument(
+        "--output",
+        default="optimized_topology.py",
+        help="The Python module to write the topology to.",
+    )
+    parser.add_argument(
+        "--save-layout",
+        default=None,
+        help="Also save the optimized layout as JSON, to this file.",
+    )
+    parser.add_argument(
+        "--kind",
+        choices=TOPOLOGY_KINDS,
+        default=None,
+        help="Place the controllers on another topology than the profiled "
+        "one. The traffic of every controller is assumed not to change.",
+    )
+    parser.add_argument("--num-rows", type=int, default=None)
+    parser.add_argument("--concentration", type=int, default=None)
+    parser.add_argument(
+        "--bytes",
+        action="store_true",
+        help="Weigh the traffic by bytes instead of messages.",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        check_link_traffic()
+        raise SystemExit(0)
+    if args.stats is None or args.layout is None:
+        parser.error("the stats and layout files are required")
+
+    profiled = TopologyLayout.load(args.layout)
+    metric = "msg_bytes" if args.bytes else "msg_count"
+    ext_traffic, int_traffic = read_link_traffic(args.stats, profiled, metric)
+    traffic = TrafficModel(
+        [
+            ext_traffic[("l1i", i)] + ext_traffic[("l1d", i)]
+            for i in range(profiled.num_cores)
+        ],
+        [ext_traffic[("l2", i)] for i in range(len(profiled.l2_routers))],
+        [ext_traffic[("mem", i)] for i in range(len(profiled.mem_routers))],
+    )
+
+    if int_traffic:
+        busiest = max(int_traffic, key=int_traffic.get)
+        print(
+            f"Profiled: busiest link {busiest[0]} -> {busiest[1]} with "
+            f"{int_traffic[busiest]:,.0f}, on average "
+            f"{sum(int_traffic.values()) / len(profiled.links):,.0f} per link"
+        )
+    profiled_cost = traffic.cost(
+        profiled, profiled.l2_routers, profiled.mem_routers
+    )
+    print(
+        "Profiled: weighted average hops "
+        f"{profiled_cost / traffic.total:.3f}"
+    )
+
+    if args.kind is None:
+        layout = TopologyLayout(
+            profiled.kind,
+            profiled.num_cores,
+            profiled.num_rows,
+            profiled.concentration,
+        )
+    else:
+        layout = TopologyLayout(
+            args.kind, profiled.num_cores, args.num_rows, args.concentration
+        )
+    layout.place_controllers(
+        len(profiled.l2_routers),
+        len(profiled.mem_routers),
+        num_dma_ctrls=profiled.num_dma_ctrls,
+    )
+    default_cost = traffic.cost(layout, layout.l2_routers, layout.mem_routers)
+    l2_routers, mem_routers = optimize(layout, traffic)
+    layout.place_controllers(
+        len(l2_routers),
+        len(mem_routers),
+        l2_routers,
+        mem_routers,
+        profiled.num_dma_ctrls,
+    )
+    cost = traffic.cost(layout, l2_routers, mem_routers)
+    print(
+        "Hop count placement: weighted average hops "
+        f"{default_cost / traffic.total:.3f}"
+    )
+    print(f"Optimized: weighted average hops {cost / traffic.total:.3f}")
+    print(layout.describe())
+
+    write_module(args.output, layout, args.stats)
+    print(f"Wrote {args.output}")
+    if args.save_layout is not None:
+        layout.save(args.save_layout)
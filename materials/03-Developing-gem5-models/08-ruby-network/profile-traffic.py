@@ -0,0 +1,81 @@
+"""
+A short profiling run for `optimize_topology.py`.
+
+Like run-test.py, this runs a linear generator on the CHI hierarchy in
+`completed/hierarchy.py` (the template next to this script does not take
+`num_l2_banks` and `network`), but on a `SimpleTopology`. The layout of the topology is saved to
+`topology.json` in the output directory, next to `stats.txt`, so that the
+message counts of every link in the stats can be matched to the routers and
+controllers. It includes the type and version of every controller, as Ruby
+orders the links to the controllers by these.
+
+> gem5 profile-traffic.py --kind mesh --num-cores 16 --num-l2-banks 4
+> python3 optimize_topology.py m5out/stats.txt m5out/topology.json
+"""
+
+import argparse
+import os
+import sys
+
+import m5
+
+# The completed hierarchy (and its ring.py) instead of the template next to
+# this script. topologies.py is only next to this script.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "completed")
+)
+from hierarchy import PrivateL1SharedL2CacheHierarchy
+from topologies import SimpleTopology
+from topology_layout import TOPOLOGY_KINDS
+
+from gem5.components.boards.test_board import TestBoard
+from gem5.components.memory.memory import ChanneledMemory
+from gem5.components.processors.linear_generator import LinearGenerator
+
+from gem5.simulate.simulator import Simulator
+
+from m5.objects import DDR4_2400_8x8
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--kind", choices=TOPOLOGY_KINDS, default="mesh")
+parser.add_argument("--num-rows", type=int, default=None)
+parser.add_argument("--concentration", type=int, default=None)
+parser.add_argument("--num-cores", type=int, default=16)
+parser.add_argument("--num-l2-banks", type=int, default=4)
+parser.add_argument("--num-channels", type=int, default=2)
+parser.add_argument("--duration", type=str, default="100us")
+parser.add_argument("--rd-perc", type=int, default=75)
+args = parser.parse_args()
+
+board = TestBoard(
+    generator=LinearGenerator(
+        num_cores=args.num_cores,
+        duration=args.duration,
+        max_addr=2**22,
+        rd_perc=args.rd_perc,
+    ),
+    cache_hierarchy=PrivateL1SharedL2CacheHierarchy(
+        l1_size="32KiB",
+        l1_assoc=8,
+        l2_size="2MiB",
+        l2_assoc=16,
+        num_l2_banks=args.num_l2_banks,
+        network=lambda ruby_system: SimpleTopology(
+            ruby_system,
+            args.kind,
+            num_rows=args.num_rows,
+            concentration=args.concentration,
+        ),
+    ),
+    memory=ChanneledMemory(
+        DDR4_2400_8x8, args.num_channels, 64, size="2GiB"
+    ),
+    clk_freq="3GHz",
+)
+
+sim = Simulator(board)
+sim.run()
+
+network = board.get_cache_hierarchy().ruby_system.network
+print(network.describe())
+network.get_layout().save(os.path.join(m5.options.outdir, "topology.json"))
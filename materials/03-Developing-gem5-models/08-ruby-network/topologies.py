@@ -0,0 +1,253 @@
+"""
+Ring, mesh, torus and concentrated mesh topologies for the Ruby network, for
+any number of controllers.
+
+Unlike `Ring` in `ring.py`, which needs exactly four L1 caches, two L2 caches
+and two memory controllers, these topologies are generated from the
+controllers they are given:
+
+- "ring": one router per core, each linked to its two neighbors.
+- "mesh": one router per core, on a 2D grid.
+- "torus": a mesh with wraparound links in both dimensions.
+- "cmesh": a mesh with `concentration` (4 by default) cores per router.
+
+The L1I and L1D caches of a core are on the same router. The L2 banks (home
+nodes) and the memory controllers are placed on the routers that minimize
+their average hop count: the L2 banks to the cores, as every core sends the
+same share of its requests to every bank, and the memory controllers to the
+L2 banks. No router gets more than its share of the banks or of the memory
+controllers, so with fewer of them than routers they go to different routers.
+The DMA controllers are on the router of the first memory controller.
+
+Routing
+-------
+
+All the links are unidirectional, one in each direction between neighbors.
+Ruby routes every message on the path of lowest total link weight, picking
+the lowest weight link when several paths tie. As in gem5's Mesh_XY, links
+along a row (X) have weight 1 and links along a column (Y) weight 2, so the
+messages are routed X first, then Y. In a mesh this routing is deadlock-free.
+The rings of "ring" and "torus" are cycles that a message can go around in
+either direction, which is only deadlock-free with SimpleNetwork's default
+unbounded buffers (`buffer_size=0`). `GarnetTopology` warns about them.
+
+Usage in `hierarchy.py`:
+
+```python
+from topologies import SimpleTopology
+
+self.ruby_system.network = SimpleTopology(self.ruby_system, "mesh")
+...
+self.ruby_system.network.connectControllers(
+    l1i_ctrls=..., l1d_ctrls=..., l2_ctrls=..., mem_ctrls=..., dma_ctrls=...
+)
+print(self.ruby_system.network.describe())
+```
+
+The layout (see `topology_layout.py`) of a network can be saved with
+`get_layout().save(path)`, e.g., for `optimize_topology.py` to place the L2
+banks and memory controllers from the traffic of a profiling run.
+"""
+
+from typing import Optional, Sequence
+
+from m5.objects import (
+    GarnetExtLink,
+    GarnetIntLink,
+    GarnetNetwork,
+    GarnetNetworkInterface,
+    GarnetRouter,
+    SimpleExtLink,
+    SimpleIntLink,
+    SimpleNetwork,
+    Switch,
+)
+from m5.util import warn
+
+from topology_layout import TopologyLayout
+
+
+def _connect_controllers(
+    network,
+    layout: TopologyLayout,
+    router_class,
+    ext_link_class,
+    int_link_class,
+    l1i_ctrls,
+    l1d_ctrls,
+    l2_ctrls,
+    mem_ctrls,
+    dma_ctrls,
+):
+    """Creates the routers and links of layout in network."""
+    routers = [router_class(router_id=i) for i in range(layout.num_routers)]
+
+    ctrls = {
+        "l1i": l1i_ctrls,
+        "l1d": l1d_ctrls,
+        "l2": l2_ctrls,
+        "mem": mem_ctrls,
+        "dma": dma_ctrls,
+    }
+    ext_nodes = [
+        (ctrls[kind][index], router)
+        for kind, index, router in layout.ext_nodes()
+    ]
+    network.ext_links = [
+        ext_link_class(link_id=i, ext_node=ctrl, int_node=routers[router])
+        for i, (ctrl, router) in enumerate(ext_nodes)
+    ]
+    # Ruby orders the links by the controllers' types and versions
+    layout.machine_ids = [
+        (ctrl.type.replace("_Controller", ""), int(ctrl.version))
+        for ctrl, _ in ext_nodes
+    ]
+
+    network.int_links = [
+        int_link_class(
+            link_id=i,
+            src_node=routers[src],
+            dst_node=routers[dst],
+            weight=weight,
+            src_outport=src_outport,
+            dst_inport=dst_inport,
+        )
+        for i, (src, dst, weight, src_outport, dst_inport) in enumerate(
+            layout.links
+        )
+    ]
+    network.routers = routers
+
+
+class SimpleTopology(SimpleNetwork):
+    """A ring, mesh, torus or concentrated mesh SimpleNetwork."""
+
+    def __init__(
+        self,
+        ruby_system,
+        kind: str = "mesh",
+        num_rows: Optional[int] = None,
+        concentration: Optional[int] = None,
+        l2_routers: Optional[Sequence[int]] = None,
+        mem_routers: Optional[Sequence[int]] = None,
+    ):
+        """
+        :param kind: One of "ring", "mesh", "torus" or "cmesh".
+        :param num_rows: See `TopologyLayout`.
+        :param concentration: See `TopologyLayout`.
+        :param l2_routers: The router of every L2 bank, instead of placing
+                           them.
+        :param mem_routers: The router of every memory controller, instead of
+                            placing them.
+        """
+        super().__init__()
+        self.netifs = []  # Used for garnet
+        self.ruby_system = ruby_system
+        self._kind = kind
+        self._num_rows = num_rows
+        self._concentration = concentration
+        self._l2_routers = l2_routers
+        self._mem_routers = mem_routers
+        self._layout = None
+
+    def connectControllers(
+        self, l1i_ctrls, l1d_ctrls, l2_ctrls, mem_ctrls, dma_ctrls
+    ):
+        assert len(l1i_ctrls) == len(l1d_ctrls)
+        self._layout = TopologyLayout(
+            self._kind, len(l1d_ctrls), self._num_rows, self._concentration
+        )
+        self._layout.place_controllers(
+            len(l2_ctrls),
+            len(mem_ctrls),
+            self._l2_routers,
+            self._mem_routers,
+            len(dma_ctrls),
+        )
+        _connect_controllers(
+            self,
+            self._layout,
+            Switch,
+            SimpleExtLink,
+            SimpleIntLink,
+            l1i_ctrls,
+            l1d_ctrls,
+            l2_ctrls,
+            mem_ctrls,
+            dma_ctrls,
+        )
+
+    def get_layout(self) -> TopologyLayout:
+        return self._layout
+
+    def describe(self) -> str:
+        return self._layout.describe()
+
+
+class GarnetTopology(GarnetNetwork):
+    """A ring, mesh, torus or concentrated mesh GarnetNetwork."""
+
+    def __init__(
+        self,
+        ruby_system,
+        kind: str = "mesh",
+        num_rows: Optional[int] = None,
+        concentration: Optional[int] = None,
+        l2_routers: Optional[Sequence[int]] = None,
+        mem_routers: Optional[Sequence[int]] = None,
+    ):
+        """See `SimpleTopology`."""
+        super().__init__()
+        self.netifs = []
+        self.ruby_system = ruby_system
+        # Same as in ring_garnet.py
+        self.ni_flit_size = 64
+        self.vcs_per_vnet = 16
+        self._kind = kind
+        self._num_rows = num_rows
+        self._concentration = concentration
+        self._l2_routers = l2_routers
+        self._mem_routers = mem_routers
+        self._layout = None
+
+    def connectControllers(
+        self, l1i_ctrls, l1d_ctrls, l2_ctrls, mem_ctrls, dma_ctrls
+    ):
+        assert len(l1i_ctrls) == len(l1d_ctrls)
+        self._layout = TopologyLayout(
+            self._kind, len(l1d_ctrls), self._num_rows, self._concentration
+        )
+        self._layout.place_controllers(
+            len(l2_ctrls),
+            len(mem_ctrls),
+            self._l2_routers,
+            self._mem_routers,
+            len(dma_ctrls),
+        )
+        if self._kind in ("ring", "torus"):
+            warn(
+                f"The routes of a Garnet {self._kind} can deadlock, its "
+                "rings have no dateline virtual channels."
+            )
+        self.num_rows = self._layout.num_rows
+        _connect_controllers(
+            self,
+            self._layout,
+            GarnetRouter,
+            GarnetExtLink,
+            GarnetIntLink,
+            l1i_ctrls,
+            l1d_ctrls,
+            l2_ctrls,
+            mem_ctrls,
+            dma_ctrls,
+        )
+        self.netifs = [
+            GarnetNetworkInterface(id=i) for i in range(len(self.ext_links))
+        ]
+
+    def get_layout(self) -> TopologyLayout:
+        return self._layout
+
+    def describe(self) -> str:
+        return self._layout.describe()
@@ -0,0 +1,288 @@
+"""
+The routers, links and controller placement of the topologies in
+`topologies.py`.
+
+This is plain Python, without any gem5 import, so that layouts can be
+generated, saved, loaded and compared outside of gem5, e.g., by
+`optimize_topology.py`.
+"""
+
+import json
+from collections import deque
+from math import ceil, sqrt
+from typing import List, Optional, Sequence, Tuple
+
+TOPOLOGY_KINDS = ("ring", "mesh", "torus", "cmesh")
+
+# The controller types of the CHI protocol, in the order of its MachineType
+# enum, i.e., of the machines in CHI.slicc. Ruby numbers the controllers by
+# type in this order, then by version. The L1 caches, L2 banks and DMA
+# controllers are all "Cache" controllers.
+MACHINE_TYPES = ("Cache", "Memory", "MiscNode")
+
+
+class TopologyLayout:
+    """The routers and links of a topology and where the controllers are."""
+
+    def __init__(
+        self,
+        kind: str,
+        num_cores: int,
+        num_rows: Optional[int] = None,
+        concentration: Optional[int] = None,
+    ):
+        """
+        :param kind: One of "ring", "mesh", "torus" or "cmesh".
+        :param num_cores: The number of cores (L1I/L1D pairs) to connect.
+        :param num_rows: The number of rows of the mesh or torus. By default,
+                         the grid is as square as possible.
+        :param concentration: The number of cores per router. Defaults to 4
+                              for "cmesh", 1 otherwise.
+        """
+        if kind not in TOPOLOGY_KINDS:
+            raise ValueError(
+                f"Unknown topology {kind}, expected one of {TOPOLOGY_KINDS}."
+            )
+        if concentration is None:
+            concentration = 4 if kind == "cmesh" else 1
+        if num_cores < 1 or concentration < 1:
+            raise ValueError("Need at least one core, one per router.")
+        self.kind = kind
+        self.num_cores = num_cores
+        self.concentration = concentration
+
+        num_routers = ceil(num_cores / concentration)
+        if kind == "ring":
+            num_rows = 1
+        elif num_rows is None:
+            num_rows = int(sqrt(num_routers))
+            while num_routers % num_rows:
+                num_rows -= 1
+            if num_rows == 1 and num_routers > 3:
+                # a prime number of routers, leave some routers without cores
+                # rather than making a single row
+                num_rows = int(sqrt(num_routers))
+        self.num_rows = num_rows
+        self.num_cols = ceil(num_routers / num_rows)
+        self.num_routers = self.num_rows * self.num_cols
+
+        # (src, dst, weight, src_outport, dst_inport) of every link
+        self.links: List[Tuple[int, int, int, str, str]] = []
+        wrap = kind in ("ring", "torus")
+        for row in range(self.num_rows):
+            for col in range(self.num_cols):
+                here = self.router(row, col)
+                if col + 1 < self.num_cols or (wrap and self.num_cols > 2):
+                    east = self.router(row, (col + 1) % self.num_cols)
+                    self.links.append((here, east, 1, "East", "West"))
+                    self.links.append((east, here, 1, "West", "East"))
+                if row + 1 < self.num_rows or (wrap and self.num_rows > 2):
+                    north = self.router((row + 1) % self.num_rows, col)
+                    self.links.append((here, north, 2, "North", "South"))
+                    self.links.append((north, here, 2, "South", "North"))
+
+        self.hops = self._hop_counts()
+        self.core_routers = [
+            core // concentration for core in range(num_cores)
+        ]
+        self.l2_routers: List[int] = []
+        self.mem_routers: List[int] = []
+        self.num_dma_ctrls = 0
+        # (type, version) of the controller of every external link, when the
+        # layout was connected to controllers, see `machine_order`.
+        self.machine_ids: Optional[List[Tuple[str, int]]] = None
+
+    def router(self, row: int, col: int) -> int:
+        return row * self.num_cols + col
+
+    def _hop_counts(self) -> List[List[int]]:
+        # the routes are minimal, so their hop counts are the BFS distances
+        neighbors = [[] for _ in range(self.num_routers)]
+        for src, dst, _, _, _ in self.links:
+            neighbors[src].append(dst)
+        hops = []
+        for start in range(self.num_routers):
+            distance = [-1] * self.num_routers
+            distance[start] = 0
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                for neighbor in neighbors[node]:
+                    if distance[neighbor] < 0:
+                        distance[neighbor] = distance[node] + 1
+                        queue.append(neighbor)
+            hops.append(distance)
+        return hops
+
+    def place(
+        self,
+        count: int,
+        sources: Sequence[int],
+        weights: Optional[Sequence[float]] = None,
+    ) -> List[int]:
+        """
+        Returns the routers of count controllers, minimizing the total hop
+        count from the sources (weighted by weights, 1 for every source by
+        default) to each controller.
+
+        Each router's cost does not depend on the others, so taking the
+        cheapest routers first, one controller per router until every router
+        has one, is optimal among the placements that spread the controllers
+        evenly. Between routers of the same cost, the one furthest from the
+        controllers placed so far is taken, e.g., in a torus where every
+        router costs the same.
+        """
+        if weights is None:
+            weights = [1] * len(sources)
+        cost = [
+            sum(w * self.hops[src][router] for src, w in zip(sources, weights))
+            for router in range(self.num_routers)
+        ]
+        placed = []
+        free = []
+        for _ in range(count):
+            if not free:
+                free = list(range(self.num_routers))
+
+            def key(router):
+                spread = min(
+                    (self.hops[p][router] for p in placed), default=0
+                )
+                return (cost[router], -spread, router)
+
+            router = min(free, key=key)
+            free.remove(router)
+            placed.append(router)
+        return placed
+
+    def place_controllers(
+        self,
+        num_l2s: int,
+        num_mem_ctrls: int,
+        l2_routers: Optional[Sequence[int]] = None,
+        mem_routers: Optional[Sequence[int]] = None,
+        num_dma_ctrls: int = 0,
+    ) -> None:
+        """
+        Places the L2 banks and memory controllers, unless given. The DMA
+        controllers are on the router of the first memory controller.
+        """
+        if l2_routers is None:
+            l2_routers = self.place(num_l2s, self.core_routers)
+        if mem_routers is None:
+            mem_routers = self.place(num_mem_ctrls, l2_routers)
+        for routers, count, name in (
+            (l2_routers, num_l2s, "L2"),
+            (mem_routers, num_mem_ctrls, "memory controller"),
+        ):
+            if len(routers) != count:
+                raise ValueError(
+                    f"Got {len(routers)} routers for {count} {name}s."
+                )
+            if not all(0 <= r < self.num_routers for r in routers):
+                raise ValueError(f"Invalid {name} router in {routers}.")
+        self.l2_routers = list(l2_routers)
+        self.mem_routers = list(mem_routers)
+        self.num_dma_ctrls = num_dma_ctrls
+
+    def ext_nodes(self) -> List[Tuple[str, int, int]]:
+        """
+        Returns (kind, index, router) for every controller, in the order of
+        the external links: the L1I caches ("l1i"), the L1D caches ("l1d"),
+        the L2 banks ("l2"), the memory controllers ("mem") and the DMA
+        controllers ("dma").
+        """
+        return (
+            [("l1i", i, r) for i, r in enumerate(self.core_routers)]
+            + [("l1d", i, r) for i, r in enumerate(self.core_routers)]
+            + [("l2", i, r) for i, r in enumerate(self.l2_routers)]
+            + [("mem", i, r) for i, r in enumerate(self.mem_routers)]
+            + [
+                ("dma", i, self.mem_routers[0])
+                for i in range(self.num_dma_ctrls)
+            ]
+        )
+
+    def machine_order(self, ext_index: int) -> Tuple[int, int]:
+        """
+        The position of the controller of an external link among Ruby's
+        machine ids: Ruby sorts the links of a router to its controllers by
+        these, not by external link.
+        """
+        if self.machine_ids is None:
+            raise ValueError(
+                "The layout has no controller types and versions, save it "
+                "from a network connected to its controllers."
+            )
+        machine_type, version = self.machine_ids[ext_index]
+        if machine_type not in MACHINE_TYPES:
+            raise ValueError(
+                f"Unknown controller type {machine_type}, expected one of "
+                f"{MACHINE_TYPES}."
+            )
+        return MACHINE_TYPES.index(machine_type), version
+
+    def average_hops(
+        self, sources: Sequence[int], destinations: Sequence[int]
+    ) -> float:
+        """The average hop count from every source to every destination."""
+        if not sources or not destinations:
+            return 0.0
+        total = sum(self.hops[s][d] for s in sources for d in destinations)
+        return total / (len(sources) * len(destinations))
+
+    def describe(self) -> str:
+        lines = [
+            f"{self.kind}: {self.num_rows}x{self.num_cols} routers, "
+            f"{self.concentration} core(s) per router",
+            f"L2 routers: {self.l2_routers}",
+            f"Memory controller routers: {self.mem_routers}",
+            "Average hops, core to L2: "
+            f"{self.average_hops(self.core_routers, self.l2_routers):.2f}",
+            "Average hops, L2 to memory: "
+            f"{self.average_hops(self.l2_routers, self.mem_routers):.2f}",
+        ]
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "num_cores": self.num_cores,
+            "num_rows": self.num_rows,
+            "concentration": self.concentration,
+            "l2_routers": self.l2_routers,
+            "mem_routers": self.mem_routers,
+            "num_dma_ctrls": self.num_dma_ctrls,
+            "machine_ids": self.machine_ids,
+        }
+
+    @classmethod
+    def from_dict(cls, layout: dict) -> "TopologyLayout":
+        new = cls(
+            layout["kind"],
+            layout["num_cores"],
+            layout["num_rows"],
+            layout["concentration"],
+        )
+        new.place_controllers(
+            len(layout["l2_routers"]),
+            len(layout["mem_routers"]),
+            layout["l2_routers"],
+            layout["mem_routers"],
+            layout["num_dma_ctrls"],
+        )
+        if layout.get("machine_ids") is not None:
+            new.machine_ids = [
+                (machine_type, version)
+                for machine_type, version in layout["machine_ids"]
+            ]
+        return new
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "TopologyLayout":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -30,6 +30,22 @@ from m5.params import *
 from m5.util.pybind import *
 
 
+class NativeExitHandler(SimObject):
+    type = "NativeExitHandler"
+    cxx_header = "cpu/probes/inst_tracker.hh"
+    cxx_class = "gem5::NativeExitHandler"
+
+    cxx_exports = [
+        PyBindMethod("trigger"),
+        PyBindMethod("getTriggerCount")
+    ]
+
+    actions = VectorParam.String(["dump", "reset"], "What to do when "
+                                 "triggered: dump and/or reset the stats")
+    period = Param.Latency("0ns", "Trigger every period (0 to disable)")
+    max_triggers = Param.Counter(0, "Exit to Python after this many "
+                                    "triggers (0 to never exit)")
+
 class GlobalInstTracker(SimObject):
     type = "GlobalInstTracker"
     cxx_header = "cpu/probes/inst_tracker.hh"
@@ -38,11 +54,25 @@ class GlobalInstTracker(SimObject):
     cxx_exports = [
         PyBindMethod("changeThreshold"),
         PyBindMethod("resetCounter"),
-        PyBindMethod("getThreshold")
+        PyBindMethod("getThreshold"),
+        PyBindMethod("getInstCount"),
+        PyBindMethod("getTotalInstCount"),
+        PyBindMethod("scheduleAction")
     ]
 
     inst_threshold = Param.Counter("The instruction threshold to trigger an"
                                                                 " exit event")
+    batch_size = Param.Counter(1, "The most instructions a LocalInstTracker "
+                        "counts before reporting them. 1 reports every "
+                        "instruction, e.g. 1024 reports far less often")
+    schedule = VectorParam.Counter([], "The total instruction counts at "
+                        "which the schedule_actions run")
+    schedule_actions = VectorParam.String([], "The action to run at each "
+                        "count of schedule: dump, reset, switch or "
+                        "checkpoint")
+    native_handler = Param.NativeExitHandler(NULL, "If set, it is triggered "
+                        "instead of exiting to Python when the threshold is "
+                        "reached, and the count restarts")
 
 class LocalInstTracker(ProbeListenerObject):
     type = "LocalInstTracker"
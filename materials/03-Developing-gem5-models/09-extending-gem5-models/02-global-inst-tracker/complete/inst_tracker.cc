@@ -28,21 +28,33 @@
 
 #include "cpu/probes/inst_tracker.hh"
 
+#include <algorithm>
+
+#include "sim/stat_control.hh"
+
 namespace gem5
 {
 
 LocalInstTracker::LocalInstTracker(const LocalInstTrackerParams &p)
     : ProbeListenerObject(p),
       globalInstTracker(p.global_inst_tracker),
-      listening(p.start_listening)
-{}
+      listening(p.start_listening),
+      batched(p.global_inst_tracker->getBatchSize() > 1),
+      instCount(0),
+      instBudget(1)
+{
+    if (batched) {
+        globalInstTracker->addLocalTracker(this);
+    }
+}
 
 void
 LocalInstTracker::regProbeListeners()
 {
     if (listening) {
         listeners.push_back(new LocalInstTrackerListener(this, "RetiredInsts",
-                                                &LocalInstTracker::checkPc));
+                batched ? &LocalInstTracker::countInst
+                        : &LocalInstTracker::checkPc));
     }
 }
 
@@ -65,16 +77,226 @@ LocalInstTracker::checkPc(const uint64_t& inst)
 GlobalInstTracker::GlobalInstTracker(const GlobalInstTrackerParams &p)
     : SimObject(p),
       instCount(0),
-      instThreshold(p.inst_threshold)
-{}
+      totalInstCount(0),
+      instThreshold(p.inst_threshold),
+      scheduledCount(0),
+      batchSize(p.batch_size),
+      nativeHandler(p.native_handler)
+{
+    fatal_if(p.schedule.size() != p.schedule_actions.size(),
+             "%s: schedule and schedule_actions must have the same length",
+             name());
+    for (size_t i = 0; i < p.schedule.size(); i++) {
+        scheduleAction(p.schedule[i], p.schedule_actions[i]);
+    }
+}
 
 void
 GlobalInstTracker::checkPc(const uint64_t& inst)
 {
-    instCount ++;
+    collectCounts(1);
+    if (!pendingActions.empty() &&
+        totalInstCount >= pendingActions.top().insts) {
+        runScheduledActions();
+    }
     if (instCount >= instThreshold) {
+        thresholdReached();
+    }
+}
+
+void
+GlobalInstTracker::thresholdReached()
+{
+    if (nativeHandler) {
+        // handle the event in C++ and count the next interval
+        instCount = 0;
+        nativeHandler->trigger();
+    } else {
         exitSimLoopNow("a thread reached the max instruction count");
     }
 }
 
+void
+GlobalInstTracker::addLocalTracker(LocalInstTracker *tracker)
+{
+    localTrackers.push_back(tracker);
+    grantBudgets();
+}
+
+void
+GlobalInstTracker::collectCounts(uint64_t count)
+{
+    instCount += count;
+    totalInstCount += count;
+}
+
+void
+GlobalInstTracker::collectCounts()
+{
+    for (auto tracker : localTrackers) {
+        collectCounts(tracker->takeCount());
+    }
+}
+
+void
+GlobalInstTracker::reconcile()
+{
+    collectCounts();
+    if (!pendingActions.empty() &&
+        totalInstCount >= pendingActions.top().insts) {
+        runScheduledActions();
+    }
+    if (instCount >= instThreshold) {
+        thresholdReached();
+    }
+    grantBudgets();
+}
+
+void
+GlobalInstTracker::scheduleAction(uint64_t insts, const std::string &action)
+{
+    Action parsed;
+    if (action == "dump") {
+        parsed = Action::Dump;
+    } else if (action == "reset") {
+        parsed = Action::Reset;
+    } else if (action == "switch") {
+        parsed = Action::Switch;
+    } else if (action == "checkpoint") {
+        parsed = Action::Checkpoint;
+    } else {
+        fatal("%s: unknown action %s, expected dump, reset, switch or "
+              "checkpoint", name(), action);
+    }
+    pendingActions.push({insts, scheduledCount++, parsed});
+    grantBudgets();
+}
+
+void
+GlobalInstTracker::runScheduledActions()
+{
+    while (!pendingActions.empty() &&
+           totalInstCount >= pendingActions.top().insts) {
+        switch (pendingActions.top().action) {
+          case Action::Dump:
+            statistics::schedStatEvent(true, false, curTick(), 0);
+            break;
+          case Action::Reset:
+            statistics::schedStatEvent(false, true, curTick(), 0);
+            break;
+          case Action::Switch:
+            // the same exits as the m5 switchcpu and checkpoint ops
+            exitSimLoop("switchcpu");
+            break;
+          case Action::Checkpoint:
+            exitSimLoop("checkpoint");
+            break;
+        }
+        pendingActions.pop();
+    }
+}
+
+void
+GlobalInstTracker::grantBudgets()
+{
+    if (localTrackers.empty()) {
+        return;
+    }
+    // The budgets add up to at most the instructions left, so no tracker
+    // can pass the threshold without running out of budget first. Near the
+    // threshold, the budget is 1 and every instruction is reconciled.
+    uint64_t left = instCount < instThreshold ? instThreshold - instCount : 0;
+    if (!pendingActions.empty()) {
+        uint64_t next = pendingActions.top().insts;
+        left = std::min(left,
+            totalInstCount < next ? next - totalInstCount : 0);
+    }
+    uint64_t budget = std::min<uint64_t>(batchSize, left / localTrackers.size());
+    budget = std::max<uint64_t>(budget, 1);
+    for (auto tracker : localTrackers) {
+        tracker->setBudget(budget);
+    }
+}
+
+void
+GlobalInstTracker::changeThreshold(uint64_t newThreshold)
+{
+    collectCounts();
+    instThreshold = newThreshold;
+    grantBudgets();
+}
+
+void
+GlobalInstTracker::resetCounter()
+{
+    // the total count, which the schedule is based on, keeps counting
+    collectCounts();
+    instCount = 0;
+    grantBudgets();
+}
+
+uint64_t
+GlobalInstTracker::getInstCount()
+{
+    collectCounts();
+    return instCount;
+}
+
+uint64_t
+GlobalInstTracker::getTotalInstCount()
+{
+    collectCounts();
+    return totalInstCount;
+}
+
+NativeExitHandler::NativeExitHandler(const NativeExitHandlerParams &p)
+    : SimObject(p),
+      dumpStats(false),
+      resetStats(false),
+      period(p.period),
+      maxTriggers(p.max_triggers),
+      triggerCount(0),
+      periodEvent([this]{ processPeriodEvent(); }, name() + ".periodEvent")
+{
+    for (const auto &action : p.actions) {
+        if (action == "dump") {
+            dumpStats = true;
+        } else if (action == "reset") {
+            resetStats = true;
+        } else {
+            fatal("%s: unknown action %s, expected dump or reset",
+                  name(), action);
+        }
+    }
+}
+
+void
+NativeExitHandler::startup()
+{
+    if (period != 0) {
+        schedule(periodEvent, curTick() + period);
+    }
+}
+
+void
+NativeExitHandler::trigger()
+{
+    triggerCount ++;
+    if (dumpStats || resetStats) {
+        // the stats are dumped before they are reset, as m5.stats does
+        statistics::schedStatEvent(dumpStats, resetStats, curTick(), 0);
+    }
+    if (maxTriggers != 0 && triggerCount >= maxTriggers) {
+        // scheduled after the stat event, so Python sees the last dump
+        exitSimLoop("the native exit handler reached max_triggers");
+    }
+}
+
+void
+NativeExitHandler::processPeriodEvent()
+{
+    trigger();
+    schedule(periodEvent, curTick() + period);
+}
+
 } // namespace gem5
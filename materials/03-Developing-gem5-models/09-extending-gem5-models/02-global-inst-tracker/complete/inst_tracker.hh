@@ -29,34 +29,133 @@
 #ifndef __CPU_PROBES_INST_TRACKER_HH__
 #define __CPU_PROBES_INST_TRACKER_HH__
 
+#include <functional>
+#include <queue>
+#include <string>
+#include <vector>
+
+#include "sim/eventq.hh"
 #include "sim/sim_exit.hh"
 #include "sim/probe/probe.hh"
 #include "params/GlobalInstTracker.hh"
 #include "params/LocalInstTracker.hh"
+#include "params/NativeExitHandler.hh"
 
 namespace gem5
 {
 
+/**
+ * Runs the actions a Python exit event handler would typically run (dump
+ * and/or reset the stats) without leaving the simulation loop. It is
+ * triggered by a GlobalInstTracker reaching its threshold, by its own
+ * period, or from Python.
+ */
+class NativeExitHandler : public SimObject
+{
+  public:
+    NativeExitHandler(const NativeExitHandlerParams &params);
+    void startup() override;
+
+    /** Run the actions, e.g., when an instruction threshold is reached. */
+    void trigger();
+
+  private:
+    void processPeriodEvent();
+
+    bool dumpStats;
+    bool resetStats;
+    const Tick period;
+    const uint64_t maxTriggers;
+    uint64_t triggerCount;
+    EventFunctionWrapper periodEvent;
+
+  public:
+    uint64_t getTriggerCount() const {
+      return triggerCount;
+    }
+};
+
+class LocalInstTracker;
+
+/**
+ * Counts the instructions retired by all the cores its LocalInstTrackers
+ * listen to. With a batch_size of 1, every instruction is forwarded to it.
+ * Otherwise, every LocalInstTracker counts up to a budget on its own and the
+ * counts are only folded into the global count when one of them runs out.
+ * The budgets never add up to more than the instructions left before the
+ * threshold, so the threshold is still caught on the exact instruction
+ * which reaches it.
+ */
 class GlobalInstTracker : public SimObject
 {
   public:
     GlobalInstTracker(const GlobalInstTrackerParams &params);
     void checkPc(const uint64_t& inst);
 
+    /** Count the instructions of a batching LocalInstTracker. */
+    void addLocalTracker(LocalInstTracker *tracker);
+
+    /**
+     * Fold the counts of the local trackers into the global count, check
+     * the threshold and hand out new budgets.
+     */
+    void reconcile();
+
+    /**
+     * Run an action once the cores have retired a number of instructions
+     * in total. "dump" and "reset" are handled without leaving the
+     * simulation loop. "switch" and "checkpoint" need the system to be
+     * drained, so they exit to Python as ExitEvent.SWITCHCPU and
+     * ExitEvent.CHECKPOINT.
+     *
+     * @param insts the total number of retired instructions
+     * @param action one of dump, reset, switch or checkpoint
+     */
+    void scheduleAction(uint64_t insts, const std::string &action);
+
   private:
+    enum class Action { Dump, Reset, Switch, Checkpoint };
+
+    struct ScheduledAction
+    {
+        uint64_t insts;
+        /** Breaks the ties, so actions run in the order they were added */
+        uint64_t order;
+        Action action;
+
+        bool operator>(const ScheduledAction &other) const {
+          return insts != other.insts ? insts > other.insts
+                                      : order > other.order;
+        }
+    };
+
+    void collectCounts(uint64_t count);
+    void collectCounts();
+    void thresholdReached();
+    void runScheduledActions();
+    void grantBudgets();
+
     uint64_t instCount;
+    uint64_t totalInstCount;
     uint64_t instThreshold;
+    std::priority_queue<ScheduledAction, std::vector<ScheduledAction>,
+                        std::greater<ScheduledAction>> pendingActions;
+    uint64_t scheduledCount;
+    const uint64_t batchSize;
+    NativeExitHandler *nativeHandler;
+    std::vector<LocalInstTracker *> localTrackers;
 
   public:
-    void changeThreshold(uint64_t newThreshold) {
-      instThreshold = newThreshold;
-    }
-    void resetCounter() {
-      instCount = 0;
-    }
+    void changeThreshold(uint64_t newThreshold);
+    void resetCounter();
     uint64_t getThreshold() const {
       return instThreshold;
     }
+    uint64_t getInstCount();
+    uint64_t getTotalInstCount();
+    uint64_t getBatchSize() const {
+      return batchSize;
+    }
 };
 
 class LocalInstTracker : public ProbeListenerObject
@@ -74,13 +173,36 @@ class LocalInstTracker : public ProbeListenerObject
      */
     void checkPc(const uint64_t& inst);
 
+    /**
+     * Used instead of checkPc when the global tracker batches the counts
+     *
+     * @param inst the number of retired instructions
+     */
+    void countInst(const uint64_t& inst) {
+      if (++instCount >= instBudget) {
+        globalInstTracker->reconcile();
+      }
+    }
+
   private:
     typedef ProbeListenerArg<LocalInstTracker, uint64_t>
                                                     LocalInstTrackerListener;
     bool listening;
     GlobalInstTracker *globalInstTracker;
+    bool batched;
+    uint64_t instCount;
+    uint64_t instBudget;
 
   public:
+    /** Return the instructions counted since the last call. */
+    uint64_t takeCount() {
+      uint64_t count = instCount;
+      instCount = 0;
+      return count;
+    }
+    void setBudget(uint64_t budget) {
+      instBudget = budget;
+    }
     void stopListening();
     void startListening() {
       listening = true;
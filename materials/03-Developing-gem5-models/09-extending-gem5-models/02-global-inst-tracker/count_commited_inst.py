@@ -1,19 +1,22 @@
-stats_file_path ="/workspaces/2024/materials/03-Developing-gem5-models/09-extending-gem5-models/02-global-inst-tracker/simple-sim-m5out/stats.txt"
+import sys
+from pathlib import Path
 
-committed_insts = 0
+sys.path.append(
+    (
+        Path(__file__).resolve().parents[3] / "02-Using-gem5" / "09-sampling"
+    ).as_posix()
+)
+from stats_reader import StatsFile
+
+stats_file_path ="/workspaces/2024/materials/03-Developing-gem5-models/09-extending-gem5-models/02-global-inst-tracker/simple-sim-m5out/stats.txt"
 
-targeted_lines = []
 cores = 8
 
+stats = StatsFile(stats_file_path)
+committed_insts = 0
 for i in range(cores):
-    targeted_lines.append(f"board.processor.cores{i}.core.commitStats0.numInsts")
-
-with open(stats_file_path) as f:
-    for line in f:
-        line = line.split()
-        if len(line) > 0:
-            if line[0] in targeted_lines:
-                committed_insts += int(line[1])
+    committed_insts += int(
+        stats.stat(f"board.processor.cores{i}.core.commitStats0.numInsts").sum()
+    )
 
 print(f"Total committed instructions: {committed_insts}")
-
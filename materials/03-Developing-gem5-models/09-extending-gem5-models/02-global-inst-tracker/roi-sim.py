@@ -0,0 +1,165 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# system components
+from gem5.components.boards.simple_board import SimpleBoard
+from gem5.components.processors.simple_processor import SimpleProcessor
+from gem5.components.memory.single_channel import SingleChannelDDR4_2400
+from gem5.components.cachehierarchies.classic.private_l1_cache_hierarchy import PrivateL1CacheHierarchy
+
+# simulation components
+from gem5.components.processors.cpu_types import CPUTypes
+from gem5.resources.resource import BinaryResource
+from gem5.simulate.exit_event import ExitEvent
+from gem5.simulate.simulator import Simulator
+from gem5.isas import ISA
+from pathlib import Path
+
+import argparse
+
+import m5
+
+from m5.objects import LocalInstTracker, GlobalInstTracker
+
+'''
+
+Measures several regions of interest of the parallel region of the workload
+in one run. The boundaries of the regions are scheduled on the
+GlobalInstTracker, which resets the stats at the start of every region and
+dumps them at its end without exiting to Python. The only exits are
+workbegin, to start counting, and the end of the last region. The
+LocalInstTrackers report their counts in batches of up to 1024 instructions.
+
+The regions are --region-length instructions long (over all the cores) and
+--gap instructions apart.
+
+Usage:
+
+/workspaces/2024/gem5/build/X86/gem5.fast -re --outdir=roi-sim-m5out roi-sim.py --num-regions 4
+
+There is one stats dump per region in roi-sim-m5out/stats.txt.
+
+'''
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--num-regions",
+    type=int,
+    default=4,
+    help="The number of regions of interest.",
+)
+parser.add_argument(
+    "--region-length",
+    type=int,
+    default=100000,
+    help="The number of instructions in every region.",
+)
+parser.add_argument(
+    "--gap",
+    type=int,
+    default=400000,
+    help="The number of instructions before every region.",
+)
+args = parser.parse_args()
+
+binary_path = Path("/workspaces/2024/materials/03-Developing-gem5-models/09-extending-gem5-models/simple-omp-workload/simple_workload")
+
+
+cache_hierarchy = PrivateL1CacheHierarchy(
+    l1d_size="64kB",
+    l1i_size="64kB",
+)
+
+memory = SingleChannelDDR4_2400("1GB")
+
+processor = SimpleProcessor(
+    cpu_type = CPUTypes.TIMING,
+    num_cores = 8,
+    isa = ISA.X86
+)
+
+schedule = []
+schedule_actions = []
+for region in range(args.num_regions):
+    start = region * (args.gap + args.region_length) + args.gap
+    schedule += [start, start + args.region_length]
+    schedule_actions += ["reset", "dump"]
+
+global_inst_tracker = GlobalInstTracker(
+    # exit after the last region has been dumped
+    inst_threshold = schedule[-1] + 1,
+    schedule = schedule,
+    schedule_actions = schedule_actions,
+    # the region boundaries are still exact, the local trackers just report
+    # less often
+    batch_size = 1024,
+)
+all_trackers = []
+
+for core in processor.get_cores():
+    tracker = LocalInstTracker(
+        global_inst_tracker = global_inst_tracker,
+        start_listening = False,
+    )
+    core.core.probeListener = tracker
+    all_trackers.append(tracker)
+
+
+board = SimpleBoard(
+    clk_freq="1GHz",
+    processor=processor,
+    memory=memory,
+    cache_hierarchy=cache_hierarchy,
+)
+
+board.set_se_binary_workload(
+    binary = BinaryResource(
+        local_path=binary_path.as_posix()
+    )
+)
+
+def workbegin_handler():
+    print("Reached workbegin")
+    print("Start listening for instructions")
+    for tracker in all_trackers:
+        tracker.startListening()
+    yield False
+
+def max_inst_handler():
+    print(f"Measured {args.num_regions} regions")
+    print("Exiting simulation")
+    yield True
+
+simulator = Simulator(
+    board=board,
+    on_exit_event={
+        ExitEvent.MAX_INSTS: max_inst_handler(),
+        ExitEvent.WORKBEGIN: workbegin_handler(),
+    }
+)
+
+simulator.run()
+print("Simulation Done")
@@ -0,0 +1,141 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# system components
+from gem5.components.boards.simple_board import SimpleBoard
+from gem5.components.processors.simple_processor import SimpleProcessor
+from gem5.components.memory.single_channel import SingleChannelDDR4_2400
+from gem5.components.cachehierarchies.classic.private_l1_cache_hierarchy import PrivateL1CacheHierarchy
+
+# simulation components
+from gem5.components.processors.cpu_types import CPUTypes
+from gem5.resources.resource import BinaryResource
+from gem5.simulate.exit_event import ExitEvent
+from gem5.simulate.simulator import Simulator
+from gem5.isas import ISA
+from pathlib import Path
+
+import argparse
+import time
+
+import m5
+
+from m5.objects import LocalInstTracker, GlobalInstTracker
+
+'''
+
+Measures the overhead of the instruction trackers. Every instruction is
+forwarded to the GlobalInstTracker with --batch-size 1, as the trackers
+originally did. With a larger batch size, the LocalInstTrackers count on
+their own and only report every batch.
+
+The simulation ends when the cores have retired --inst-threshold
+instructions in total. The exit tick does not depend on the batch size, as
+the threshold is caught exactly either way, so only the wall-clock times
+should differ.
+
+Usage:
+
+/workspaces/2024/gem5/build/X86/gem5.fast -re --outdir=overhead-1-m5out tracker-overhead.py --batch-size 1
+/workspaces/2024/gem5/build/X86/gem5.fast -re --outdir=overhead-1024-m5out tracker-overhead.py --batch-size 1024
+
+'''
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=1024,
+    help="The batch size of the GlobalInstTracker, 1 to not batch.",
+)
+parser.add_argument(
+    "--inst-threshold",
+    type=int,
+    default=10000000,
+    help="The number of instructions to simulate, over all the cores.",
+)
+args = parser.parse_args()
+
+binary_path = Path("/workspaces/2024/materials/03-Developing-gem5-models/09-extending-gem5-models/simple-omp-workload/simple_workload")
+
+
+cache_hierarchy = PrivateL1CacheHierarchy(
+    l1d_size="64kB",
+    l1i_size="64kB",
+)
+
+memory = SingleChannelDDR4_2400("1GB")
+
+processor = SimpleProcessor(
+    cpu_type = CPUTypes.ATOMIC,
+    num_cores = 8,
+    isa = ISA.X86
+)
+
+global_inst_tracker = GlobalInstTracker(
+    inst_threshold = args.inst_threshold,
+    batch_size = args.batch_size,
+)
+
+for core in processor.get_cores():
+    core.core.probeListener = LocalInstTracker(
+        global_inst_tracker = global_inst_tracker,
+        start_listening = True,
+    )
+
+
+board = SimpleBoard(
+    clk_freq="1GHz",
+    processor=processor,
+    memory=memory,
+    cache_hierarchy=cache_hierarchy,
+)
+
+board.set_se_binary_workload(
+    binary = BinaryResource(
+        local_path=binary_path.as_posix()
+    )
+)
+
+def max_inst_handler():
+    print("Reached MAX_INSTS")
+    yield True
+
+simulator = Simulator(
+    board=board,
+    on_exit_event={
+        ExitEvent.MAX_INSTS: max_inst_handler(),
+    }
+)
+
+start = time.perf_counter()
+simulator.run()
+wall_time = time.perf_counter() - start
+
+print(f"Batch size: {args.batch_size}")
+print(f"Exit tick: {m5.curTick()}")
+print(f"Instructions counted: {global_inst_tracker.getInstCount()}")
+print(f"Wall-clock time: {wall_time:.3f}s")
@@ -0,0 +1,58 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from m5.objects import SimObject
+from m5.objects.Probe import ProbeListenerObject
+from m5.params import *
+from m5.util.pybind import *
+
+
+class StatsSampler(SimObject):
+    type = "StatsSampler"
+    cxx_header = "cpu/probes/stats_sampler.hh"
+    cxx_class = "gem5::StatsSampler"
+
+    cxx_exports = [
+        PyBindMethod("sample"),
+        PyBindMethod("flush")
+    ]
+
+    stats = VectorParam.String("The full paths of the stats to sample, e.g., "
+                               "board.processor.cores0.core.numCycles")
+    interval = Param.Latency("0ns", "Sample every interval (0 to disable)")
+    inst_interval = Param.Counter(0, "Sample every inst_interval retired "
+                                     "instructions (0 to disable)")
+    buffer_size = Param.Unsigned(4096, "The number of samples buffered "
+                                       "before they are written out")
+    output_file = Param.String("stats-samples.bin", "The file the samples "
+                               "are written to, in the output directory")
+
+class StatsSamplerInstCounter(ProbeListenerObject):
+    type = "StatsSamplerInstCounter"
+    cxx_header = "cpu/probes/stats_sampler.hh"
+    cxx_class = "gem5::StatsSamplerInstCounter"
+
+    sampler = Param.StatsSampler("The sampler counting the instructions")
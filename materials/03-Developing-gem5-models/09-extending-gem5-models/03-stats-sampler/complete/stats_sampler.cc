@@ -0,0 +1,177 @@
+/*
+ * Copyright (c) 2024 The Regents of the University of California.
+ * All rights reserved.
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions are
+ * met: redistributions of source code must retain the above copyright
+ * notice, this list of conditions and the following disclaimer;
+ * redistributions in binary form must reproduce the above copyright
+ * notice, this list of conditions and the following disclaimer in the
+ * documentation and/or other materials provided with the distribution;
+ * neither the name of the copyright holders nor the names of its
+ * contributors may be used to endorse or promote products derived from
+ * this software without specific prior written permission.
+ *
+ * THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ * "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ * LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ * A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ * OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ * SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ * LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ * DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ * THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ * (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ * OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+#include "cpu/probes/stats_sampler.hh"
+
+#include <algorithm>
+
+#include "base/output.hh"
+#include "base/statistics.hh"
+#include "sim/core.hh"
+#include "sim/root.hh"
+
+namespace gem5
+{
+
+StatsSampler::StatsSampler(const StatsSamplerParams &p)
+    : SimObject(p),
+      interval(p.interval),
+      instInterval(p.inst_interval),
+      statNames(p.stats),
+      bufferSize(p.buffer_size),
+      outputFile(p.output_file),
+      numBuffered(0),
+      instCount(0),
+      sampleEvent([this]{ processSampleEvent(); }, name() + ".sampleEvent")
+{
+    fatal_if(interval == 0 && instInterval == 0,
+             "%s: either interval or inst_interval must be set", name());
+    fatal_if(bufferSize == 0, "%s: buffer_size must be at least 1", name());
+}
+
+void
+StatsSampler::startup()
+{
+    // the stat groups are only connected once all SimObjects exist
+    for (const auto &stat_name : statNames) {
+        const statistics::Info *info = Root::root()->resolveStat(stat_name);
+        fatal_if(!info, "%s: cannot find stat %s", name(), stat_name);
+        fatal_if(!dynamic_cast<const statistics::ScalarInfo *>(info) &&
+                 !dynamic_cast<const statistics::VectorInfo *>(info),
+                 "%s: %s is neither a scalar nor a vector stat",
+                 name(), stat_name);
+        stats.push_back(info);
+        previous.push_back(read(info));
+    }
+    buffer.resize(bufferSize * (stats.size() + 1));
+
+    writeSchema();
+    output.open(simout.resolve(outputFile),
+                std::ios::out | std::ios::binary | std::ios::trunc);
+    fatal_if(!output, "%s: cannot open %s", name(), outputFile);
+
+    // the stats start again from 0 after a reset
+    statistics::registerResetCallback([this]() {
+        std::fill(previous.begin(), previous.end(), 0.0);
+    });
+    registerExitCallback([this]() { flush(); });
+
+    if (interval != 0) {
+        schedule(sampleEvent, curTick() + interval);
+    }
+}
+
+double
+StatsSampler::read(const statistics::Info *info) const
+{
+    if (auto scalar = dynamic_cast<const statistics::ScalarInfo *>(info)) {
+        return scalar->value();
+    }
+    // vectors (and formulas) are sampled through their total
+    return static_cast<const statistics::VectorInfo *>(info)->total();
+}
+
+void
+StatsSampler::sample()
+{
+    double *row = &buffer[numBuffered * (stats.size() + 1)];
+    row[0] = curTick();
+    for (size_t i = 0; i < stats.size(); i++) {
+        double value = read(stats[i]);
+        row[i + 1] = value - previous[i];
+        previous[i] = value;
+    }
+    numBuffered++;
+    if (numBuffered == bufferSize) {
+        flush();
+    }
+}
+
+void
+StatsSampler::flush()
+{
+    if (numBuffered == 0) {
+        return;
+    }
+    output.write(reinterpret_cast<const char *>(buffer.data()),
+                 numBuffered * (stats.size() + 1) * sizeof(double));
+    output.flush();
+    numBuffered = 0;
+}
+
+void
+StatsSampler::countInsts(const uint64_t &insts)
+{
+    instCount += insts;
+    if (instInterval != 0 && instCount >= instInterval) {
+        instCount -= instInterval;
+        sample();
+    }
+}
+
+void
+StatsSampler::processSampleEvent()
+{
+    sample();
+    schedule(sampleEvent, curTick() + interval);
+}
+
+void
+StatsSampler::writeSchema() const
+{
+    // the same schema as the binary stats sink, so the samples can be
+    // loaded with stats_reader.BinaryStatsFile
+    std::ofstream schema(simout.resolve(outputFile + ".schema.json"));
+    schema << "{\"version\": 1, \"dtype\": \"<f8\", \"columns\": "
+           << "[\"curTick\"";
+    for (const auto &stat_name : statNames) {
+        schema << ", \"" << stat_name << "\"";
+    }
+    schema << "]}\n";
+}
+
+StatsSamplerInstCounter::StatsSamplerInstCounter(
+    const StatsSamplerInstCounterParams &p)
+    : ProbeListenerObject(p),
+      sampler(p.sampler)
+{}
+
+void
+StatsSamplerInstCounter::regProbeListeners()
+{
+    listeners.push_back(new RetiredInstsListener(this, "RetiredInsts",
+                                    &StatsSamplerInstCounter::countInsts));
+}
+
+void
+StatsSamplerInstCounter::countInsts(const uint64_t &insts)
+{
+    sampler->countInsts(insts);
+}
+
+} // namespace gem5
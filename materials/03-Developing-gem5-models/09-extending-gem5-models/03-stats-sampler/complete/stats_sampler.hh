@@ -0,0 +1,123 @@
+/*
+ * Copyright (c) 2024 The Regents of the University of California.
+ * All rights reserved.
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions are
+ * met: redistributions of source code must retain the above copyright
+ * notice, this list of conditions and the following disclaimer;
+ * redistributions in binary form must reproduce the above copyright
+ * notice, this list of conditions and the following disclaimer in the
+ * documentation and/or other materials provided with the distribution;
+ * neither the name of the copyright holders nor the names of its
+ * contributors may be used to endorse or promote products derived from
+ * this software without specific prior written permission.
+ *
+ * THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ * "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ * LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ * A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ * OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ * SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ * LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ * DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ * THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ * (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ * OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+#ifndef __CPU_PROBES_STATS_SAMPLER_HH__
+#define __CPU_PROBES_STATS_SAMPLER_HH__
+
+#include <fstream>
+#include <string>
+#include <vector>
+
+#include "base/stats/info.hh"
+#include "params/StatsSampler.hh"
+#include "params/StatsSamplerInstCounter.hh"
+#include "sim/eventq.hh"
+#include "sim/probe/probe.hh"
+#include "sim/sim_object.hh"
+
+namespace gem5
+{
+
+/**
+ * Samples a list of stats periodically, every interval ticks or every
+ * inst_interval retired instructions, without leaving the simulation loop.
+ * The change of every stat since the previous sample is appended to a
+ * fixed-size buffer, which is written to the output file in bulk and
+ * emptied when it is full, and written out when the simulation exits.
+ *
+ * The output file holds one row of float64 values per sample: the tick of
+ * the sample followed by the delta of every stat. The column names are
+ * written to <output_file>.schema.json.
+ */
+class StatsSampler : public SimObject
+{
+  public:
+    StatsSampler(const StatsSamplerParams &params);
+
+    void startup() override;
+
+    /** Record the change of every stat since the previous sample. */
+    void sample();
+
+    /** Write the buffered samples to the output file. */
+    void flush();
+
+    /**
+     * Called by the StatsSamplerInstCounters when instructions retire.
+     *
+     * @param insts the number of retired instructions
+     */
+    void countInsts(const uint64_t &insts);
+
+  private:
+    void processSampleEvent();
+    void writeSchema() const;
+    double read(const statistics::Info *info) const;
+
+    const Tick interval;
+    const uint64_t instInterval;
+    const std::vector<std::string> statNames;
+    const size_t bufferSize;
+    const std::string outputFile;
+
+    std::vector<const statistics::Info *> stats;
+    /** The value of every stat at the previous sample */
+    std::vector<double> previous;
+    /** bufferSize rows of (1 + stats.size()) values */
+    std::vector<double> buffer;
+    size_t numBuffered;
+    uint64_t instCount;
+    std::ofstream output;
+
+    EventFunctionWrapper sampleEvent;
+};
+
+class StatsSamplerInstCounter : public ProbeListenerObject
+{
+  public:
+    StatsSamplerInstCounter(const StatsSamplerInstCounterParams &params);
+
+    /** setup the probelistener */
+    virtual void regProbeListeners();
+
+    /**
+     * this function is called when the ProbePoint "RetiredInsts" is notified
+     *
+     * @param insts the number of retired instructions
+     */
+    void countInsts(const uint64_t &insts);
+
+  private:
+    typedef ProbeListenerArg<StatsSamplerInstCounter, uint64_t>
+                                                    RetiredInstsListener;
+    StatsSampler *sampler;
+};
+
+} // namespace gem5
+
+#endif // __CPU_PROBES_STATS_SAMPLER_HH__
@@ -0,0 +1,106 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A Simulator which samples stats periodically inside the simulation loop.
+
+Instead of scheduling `m5.stats.dump()` and `m5.stats.reset()` pairs from
+exit event generators, which exit to Python for every sample, the
+`StatsSampler` SimObject (see complete/) reads the stats itself every
+interval ticks or every inst_interval retired instructions. It records the
+change of every stat since the previous sample in a fixed-size buffer, and
+writes the buffer out in bulk whenever it fills up.
+
+The samples are written to <outdir>/stats-samples.bin and can be loaded
+with `BinaryStatsFile` from 02-Using-gem5/09-sampling/stats_reader.py.
+
+```python
+simulator = SamplingSimulator(
+    board=board,
+    sample_stats=["board.processor.cores0.core.numCycles"],
+    sample_inst_interval=100_000,
+)
+simulator.run()
+```
+"""
+
+from typing import Optional, Sequence
+
+from m5.objects import StatsSampler, StatsSamplerInstCounter
+
+from gem5.simulate.simulator import Simulator
+
+
+class SamplingSimulator(Simulator):
+    def __init__(
+        self,
+        board,
+        sample_stats: Sequence[str],
+        sample_interval: Optional[str] = None,
+        sample_inst_interval: Optional[int] = None,
+        sample_buffer_size: int = 4096,
+        sample_file: str = "stats-samples.bin",
+        **kwargs,
+    ):
+        """
+        :param board: The board to simulate.
+        :param sample_stats: The full paths of the stats to sample.
+        :param sample_interval: Sample every interval of simulated time
+        (e.g., "10us").
+        :param sample_inst_interval: Sample every this many instructions,
+        retired by any of the cores.
+        :param sample_buffer_size: The number of samples kept in memory
+        before they are written out.
+        :param sample_file: The file the samples are written to, in the
+        output directory.
+        :param kwargs: Passed to `Simulator`.
+        """
+        if (sample_interval is None) == (sample_inst_interval is None):
+            raise ValueError(
+                "Exactly one of sample_interval and sample_inst_interval "
+                "must be given."
+            )
+
+        sampler = StatsSampler(
+            stats=list(sample_stats),
+            buffer_size=sample_buffer_size,
+            output_file=sample_file,
+        )
+        if sample_interval is not None:
+            sampler.interval = sample_interval
+        else:
+            sampler.inst_interval = sample_inst_interval
+            for core in board.get_processor().get_cores():
+                core.core.statsSamplerCounter = StatsSamplerInstCounter(
+                    sampler=sampler
+                )
+        board.stats_sampler = sampler
+        self._sampler = sampler
+
+        super().__init__(board=board, **kwargs)
+
+    def get_sampler(self) -> StatsSampler:
+        return self._sampler
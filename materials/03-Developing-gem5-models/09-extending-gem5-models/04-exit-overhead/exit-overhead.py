@@ -0,0 +1,167 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measures what it costs to handle a periodic event by exiting to Python,
+compared to handling it in C++ with a NativeExitHandler.
+
+A linear traffic generator runs for --duration of simulated time. Every
+--period, the event is handled
+
+* python: by exiting the simulation loop to an ExitEvent.SCHEDULED_TICK
+  handler in `Simulator.run()`, which runs the actions and schedules the next
+  exit, or
+* native: by a NativeExitHandler, without leaving the simulation loop.
+
+With --mode none, the event is not handled at all, which gives the baseline
+the other modes are compared to. The wall-clock time of the simulation and
+the number of events handled are written to exit-overhead.json in the output
+directory. run-benchmark.py runs the whole sweep.
+
+The native mode needs the GlobalInstTracker extension of
+../02-global-inst-tracker/complete, which defines NativeExitHandler, to be
+built into gem5.
+
+Usage
+-----
+
+gem5 -re --outdir=m5out exit-overhead.py --mode python --period 10us
+
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import m5
+from m5.ticks import fromSeconds
+from m5.util.convert import toLatency
+
+from gem5.components.boards.test_board import TestBoard
+from gem5.components.cachehierarchies.classic.no_cache import NoCache
+from gem5.components.memory import SingleChannelDDR3_1600
+from gem5.components.processors.linear_generator import LinearGenerator
+from gem5.simulate.exit_event import ExitEvent
+from gem5.simulate.simulator import Simulator
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--mode",
+    choices=["none", "python", "native"],
+    default="python",
+    help="How the periodic event is handled.",
+)
+parser.add_argument(
+    "--period",
+    type=str,
+    default="10us",
+    help="The simulated time between two events.",
+)
+parser.add_argument(
+    "--duration",
+    type=str,
+    default="10ms",
+    help="The simulated time to run for.",
+)
+parser.add_argument(
+    "--actions",
+    type=str,
+    nargs="*",
+    choices=["dump", "reset"],
+    default=[],
+    help="What to do with the stats at every event. By default nothing is "
+    "done, so only the cost of handling the event itself is measured.",
+)
+
+args = parser.parse_args()
+
+generator = LinearGenerator(
+    num_cores=1,
+    duration=args.duration,
+    rate="1GB/s",
+)
+
+board = TestBoard(
+    clk_freq="3GHz",
+    generator=generator,
+    memory=SingleChannelDDR3_1600(),
+    cache_hierarchy=NoCache(),
+)
+
+m5.ticks.fixGlobalFrequency()
+period = fromSeconds(toLatency(args.period))
+duration = fromSeconds(toLatency(args.duration))
+
+num_exits = 0
+
+
+def scheduled_tick_handler():
+    global num_exits
+    while True:
+        num_exits += 1
+        if "dump" in args.actions:
+            m5.stats.dump()
+        if "reset" in args.actions:
+            m5.stats.reset()
+        m5.scheduleTickExitFromCurrent(period)
+        yield False
+
+
+native_handler = None
+if args.mode == "python":
+    m5.scheduleTickExitAbs(period)
+elif args.mode == "native":
+    from m5.objects import NativeExitHandler
+
+    native_handler = NativeExitHandler(period=args.period, actions=args.actions)
+    board.native_handler = native_handler
+
+simulator = Simulator(
+    board=board,
+    on_exit_event={ExitEvent.SCHEDULED_TICK: scheduled_tick_handler()},
+)
+
+start = time.perf_counter()
+simulator.run(max_ticks=duration)
+wall_time = time.perf_counter() - start
+
+if native_handler is not None:
+    num_exits = native_handler.getTriggerCount()
+
+result = {
+    "mode": args.mode,
+    "period": args.period,
+    "duration": args.duration,
+    "actions": args.actions,
+    "ticks": m5.curTick(),
+    "events": num_exits,
+    "wall_time": wall_time,
+}
+with (Path(m5.options.outdir) / "exit-overhead.json").open("w") as f:
+    json.dump(result, f, indent=2)
+print(json.dumps(result))
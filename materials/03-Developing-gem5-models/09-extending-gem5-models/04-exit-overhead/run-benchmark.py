@@ -0,0 +1,146 @@
+# Copyright (c) 2024 The Regents of the University of California
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Runs exit-overhead.py for every period and mode, and reports the cost of
+handling one event in each mode.
+
+The cost of one event is the wall-clock time a run took over the baseline
+run (--mode none), divided by the number of events. Each configuration runs
+--repeats times and the fastest run is kept, to filter out noise.
+
+This script is run with Python, not gem5.
+
+Usage
+-----
+
+python3 run-benchmark.py --gem5 /workspaces/2024/gem5/build/NULL/gem5.opt \
+    --periods 1us 10us 100us --actions dump reset
+
+"""
+
+import argparse
+import json
+import subprocess
+from pathlib import Path
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument(
+    "--gem5",
+    type=str,
+    required=True,
+    help="The gem5 binary to run. It needs NativeExitHandler built in.",
+)
+parser.add_argument(
+    "--periods",
+    type=str,
+    nargs="+",
+    default=["1us", "10us", "100us"],
+    help="The simulated times between two events.",
+)
+parser.add_argument(
+    "--duration",
+    type=str,
+    default="10ms",
+    help="The simulated time of every run.",
+)
+parser.add_argument(
+    "--actions",
+    type=str,
+    nargs="*",
+    choices=["dump", "reset"],
+    default=[],
+    help="What to do with the stats at every event.",
+)
+parser.add_argument(
+    "--repeats",
+    type=int,
+    default=3,
+    help="The number of times every configuration is run.",
+)
+parser.add_argument(
+    "--outdir",
+    type=str,
+    default="exit-overhead-out",
+    help="The directory the runs and the results are written to.",
+)
+
+args = parser.parse_args()
+
+script = Path(__file__).resolve().parent / "exit-overhead.py"
+outdir = Path(args.outdir)
+
+
+def run(mode: str, period: str) -> dict:
+    best = None
+    for repeat in range(args.repeats):
+        run_dir = outdir / f"{mode}-{period}-{repeat}"
+        command = [
+            args.gem5,
+            "-re",
+            f"--outdir={run_dir}",
+            script.as_posix(),
+            "--mode",
+            mode,
+            "--period",
+            period,
+            "--duration",
+            args.duration,
+        ]
+        if args.actions:
+            command += ["--actions"] + args.actions
+        subprocess.run(command, check=True)
+        with (run_dir / "exit-overhead.json").open() as f:
+            result = json.load(f)
+        if best is None or result["wall_time"] < best["wall_time"]:
+            best = result
+    return best
+
+
+baseline = run("none", args.periods[0])
+results = {"baseline": baseline, "runs": []}
+
+print(f"baseline: {baseline['wall_time']:.3f}s")
+print(f"{'period':>10} {'mode':>8} {'events':>10} {'wall (s)':>10} "
+      f"{'per event (us)':>15}")
+for period in args.periods:
+    for mode in ("python", "native"):
+        result = run(mode, period)
+        if result["events"] > 0:
+            result["cost_per_event"] = (
+                result["wall_time"] - baseline["wall_time"]
+            ) / result["events"]
+        else:
+            result["cost_per_event"] = None
+        results["runs"].append(result)
+        cost = result["cost_per_event"]
+        cost = f"{cost * 1e6:15.2f}" if cost is not None else f"{'-':>15}"
+        print(f"{period:>10} {mode:>8} {result['events']:>10} "
+              f"{result['wall_time']:>10.3f} {cost}")
+
+with (outdir / "results.json").open("w") as f:
+    json.dump(results, f, indent=2)
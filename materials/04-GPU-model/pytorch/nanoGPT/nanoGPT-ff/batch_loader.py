@@ -0,0 +1,99 @@
+"""
+Batch loader for the uint16 token files written by the data/*/prepare.py scripts.
+
+Compared to building every batch with a list comprehension over np.memmap slices:
+- every split is memory-mapped once, instead of once per batch
+- all the batch_size windows are gathered with a single fancy-index of the memmap
+- on cuda, the next batch is gathered into pinned memory and its copy to the GPU is
+  started right away, so get_batch() returns a batch that is already on its way
+
+The returned x, y are (batch_size, block_size) int64 tensors, with y shifted by one token.
+state_dict() / load_state_dict() save and restore where each split's batch sequence is,
+so a resumed run draws the same batches as an uninterrupted one.
+"""
+
+import os
+import zlib
+
+import numpy as np
+import torch
+
+class BatchLoader:
+
+    def __init__(self, data_dir, block_size, batch_size, device, seed=1337):
+        self.data_dir = data_dir
+        self.block_size = block_size
+        self.batch_size = batch_size
+        self.device = device
+        self.pin = 'cuda' in device
+        # the index draws of every split have their own generator, so they do not depend on
+        # the model's use of the RNG, nor on how the splits are interleaved
+        self.seed = seed
+        self.generators = {} # split -> torch.Generator
+        self.cursor = {} # split -> generator state the prefetched batch was drawn from
+        # row i of the gather is data[ix[i] : ix[i] + block_size + 1], x and y are both slices of it
+        self.offsets = np.arange(block_size + 1, dtype=np.int64)
+        self.data = {} # split -> np.memmap
+        self.buffers = {} # split -> pinned (x, y, copy done event) slots, used in turn
+        self.slot = {}
+        self.pending = {} # split -> the prefetched batch
+
+    def _open(self, split):
+        # the mapping is kept, its pages are file-backed and can be dropped by the OS at any time
+        self.data[split] = np.memmap(os.path.join(self.data_dir, f'{split}.bin'), dtype=np.uint16, mode='r')
+        if self.pin:
+            shape = (self.batch_size, self.block_size)
+            # two slots: one being filled while the copy from the other may still be in flight
+            self.buffers[split] = [(torch.empty(shape, dtype=torch.int64).pin_memory(),
+                                    torch.empty(shape, dtype=torch.int64).pin_memory(),
+                                    torch.cuda.Event()) for _ in range(2)]
+            self.slot[split] = 0
+
+    def _generator(self, split):
+        if split not in self.generators:
+            self.generators[split] = torch.Generator()
+            self.generators[split].manual_seed(self.seed + zlib.crc32(split.encode()))
+        return self.generators[split]
+
+    def _gather(self, split):
+        data = self.data[split]
+        ix = torch.randint(len(data) - self.block_size, (self.batch_size,), generator=self._generator(split)).numpy()
+        return data[ix[:, None] + self.offsets] # (batch_size, block_size + 1) uint16
+
+    def _load(self, split):
+        windows = self._gather(split)
+        if not self.pin:
+            x = torch.from_numpy(windows[:, :-1].astype(np.int64))
+            y = torch.from_numpy(windows[:, 1:].astype(np.int64))
+            return x.to(self.device), y.to(self.device)
+        k = self.slot[split]
+        self.slot[split] = (k + 1) % len(self.buffers[split])
+        x, y, copied = self.buffers[split][k]
+        # the last copy out of this slot has to be done before it is overwritten
+        copied.synchronize()
+        np.copyto(x.numpy(), windows[:, :-1])
+        np.copyto(y.numpy(), windows[:, 1:])
+        x, y = x.to(self.device, non_blocking=True), y.to(self.device, non_blocking=True)
+        copied.record()
+        return x, y
+
+    def get_batch(self, split):
+        if split not in self.data:
+            self._open(split)
+            self.pending[split] = self._load(split)
+        batch = self.pending[split]
+        self.cursor[split] = self._generator(split).get_state()
+        self.pending[split] = self._load(split)
+        return batch
+
+    def state_dict(self):
+        # the prefetched batches are not saved, they are drawn again from the cursor
+        return {'seed': self.seed, 'cursor': dict(self.cursor)}
+
+    def load_state_dict(self, state):
+        # only valid before any batch is drawn
+        assert not self.pending, "load_state_dict() has to be called before get_batch()"
+        self.seed = state['seed']
+        for split, generator_state in state['cursor'].items():
+            # a checkpoint loaded with map_location='cuda' has the state on the gpu
+            self._generator(split).set_state(generator_state.cpu())
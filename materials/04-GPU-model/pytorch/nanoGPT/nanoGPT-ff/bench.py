@@ -7,12 +7,15 @@ import numpy as np
 import time
 import torch
 from model import GPTConfig, GPT
+from batch_loader import BatchLoader
 
 # -----------------------------------------------------------------------------
 batch_size = 12
 block_size = 1024
 bias = False
 real_data = True
+dataset = 'openwebtext'
+batch_loader = True # use BatchLoader, or the original list comprehension get_batch?
 seed = 1337
 device = 'cuda' # examples: 'cpu', 'cuda', 'cuda:0', 'cuda:1', etc.
 dtype = 'bfloat16' if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else 'float16' # 'float32' or 'bfloat16' or 'float16'
@@ -31,16 +34,29 @@ ctx = nullcontext() if device_type == 'cpu' else torch.amp.autocast(device_type=
 
 # data loading init
 if real_data:
-    dataset = 'openwebtext'
     data_dir = os.path.join('data', dataset)
-    train_data = np.memmap(os.path.join(data_dir, 'train.bin'), dtype=np.uint16, mode='r')
-    def get_batch(split):
-        data = train_data # note ignore split in benchmarking script
-        ix = torch.randint(len(data) - block_size, (batch_size,))
-        x = torch.stack([torch.from_numpy((data[i:i+block_size]).astype(np.int64)) for i in ix])
-        y = torch.stack([torch.from_numpy((data[i+1:i+1+block_size]).astype(np.int64)) for i in ix])
-        x, y = x.pin_memory().to(device, non_blocking=True), y.pin_memory().to(device, non_blocking=True)
-        return x, y
+    if batch_loader:
+        loader = BatchLoader(data_dir, block_size, batch_size, device, seed=seed)
+        get_batch = lambda split: loader.get_batch('train') # note ignore split in benchmarking script
+    else:
+        train_data = np.memmap(os.path.join(data_dir, 'train.bin'), dtype=np.uint16, mode='r')
+        def get_batch(split):
+            data = train_data # note ignore split in benchmarking script
+            ix = torch.randint(len(data) - block_size, (batch_size,))
+            x = torch.stack([torch.from_numpy((data[i:i+block_size]).astype(np.int64)) for i in ix])
+            y = torch.stack([torch.from_numpy((data[i+1:i+1+block_size]).astype(np.int64)) for i in ix])
+            x, y = x.pin_memory().to(device, non_blocking=True), y.pin_memory().to(device, non_blocking=True)
+            return x, y
+    # time the data loading on its own, before the model takes the GPU
+    for stage, num_batches in enumerate([10, 100]): # burnin, then benchmark
+        t0 = time.time()
+        for k in range(num_batches):
+            X, Y = get_batch('train')
+        if device_type == 'cuda':
+            torch.cuda.synchronize()
+        dt = time.time() - t0
+        if stage == 1:
+            print(f"time per batch: {dt/num_batches*1000:.4f}ms ({'BatchLoader' if batch_loader else 'list comprehension'})")
 else:
     # alternatively, if fixed data is desired to not care about data loading
     x = torch.randint(50304, (batch_size, block_size), device=device)
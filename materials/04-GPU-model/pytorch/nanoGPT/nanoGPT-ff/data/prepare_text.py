@@ -0,0 +1,215 @@
+"""
+Prepare train.bin/val.bin from plain-text files on local disk, e.g. to build a bigger
+corpus into a GPUFS disk image offline.
+
+Unlike the per-dataset prepare.py scripts, the text is never loaded as a whole:
+- the files are cut into chunks of about --chunk_size bytes, right before line ends where the
+  tokenization cannot change (a newline followed by a letter or digit)
+- a pool of --num_proc workers reads and tokenizes the chunks, each from its own file offset
+- the chunks are written back in order, with at most a few of them per worker in flight,
+  into a uint16 memmap preallocated from a first, counting pass
+
+With the gpt2 tokenizer the counting pass only sums the file sizes, as no token is shorter
+than a byte, so the text is tokenized once and the .bin files are truncated to the tokens
+written. With the char tokenizer it counts the characters and builds the vocabulary (saved
+to meta.pkl, as in shakespeare_char) unless --meta is given.
+
+The last --val_fraction of the text (by bytes, moved to the next such line end) goes to val.bin.
+
+$ python data/prepare_text.py --out_dir=data/mycorpus --num_proc=16 corpus/*.txt
+$ python data/prepare_text.py --out_dir=data/mycorpus_char --tokenizer=char corpus/*.txt
+"""
+
+import os
+import re
+import pickle
+import argparse
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+# a newline where the gpt2 pre-tokenizer always splits, so chunks tokenize as the whole text.
+# The chunks are cut before the newline, not after: the pre-tokenizer merges a run of
+# whitespace into one token, except its last character when a letter or digit follows, so
+# e.g. the '\r\n' of a CRLF line end, a trailing '\xa0' or the '\n\n' of a blank line are two
+# tokens, but would be one at the end of a chunk cut after the newline.
+boundary = re.compile(rb'\n(?=[0-9A-Za-z])')
+
+# text with blank lines, indentation, trailing (also non-ascii) spaces and CRLF line ends,
+# to check the boundaries with
+check_text = ("Hello world.\n\nNext line\n  indented 42\nend \n\n\nA\n1\n\tB.\nC"
+              "\nno-break\xa0\nspace\u3000\nDOS line\r\nend\r\n\r\n2\r\nz")
+
+def next_boundary(f, pos, size):
+    """ the first chunk boundary at or after byte pos of file f """
+    while 0 < pos < size:
+        f.seek(pos)
+        block = f.read(1 << 16)
+        match = boundary.search(block)
+        if match:
+            return pos + match.start()
+        # the next block starts with the last byte, so a newline there is seen with the next byte
+        pos += max(len(block) - 1, 1)
+    return min(pos, size)
+
+def check_boundaries(text):
+    """ asserts that the text tokenizes the same whole and cut into chunks at every boundary """
+    data = text.encode('utf-8')
+    cuts = [0] + [m.start() for m in boundary.finditer(data)] + [len(data)]
+    chunks = [encode(data[a:b].decode('utf-8'), False) for a, b in zip(cuts, cuts[1:])]
+    assert np.array_equal(np.concatenate(chunks), encode(text, False)), \
+        "the chunk boundaries change the tokenization"
+
+def find_chunks(path, chunk_size):
+    """ yields the (start, end) byte offsets of the chunks of a file """
+    size = os.path.getsize(path)
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            end = next_boundary(f, start + chunk_size, size)
+            yield start, end
+            start = end
+
+def split_tasks(tasks, fraction):
+    """ splits the chunks in two, the second with about fraction of the bytes """
+    total = sum(end - start for _, start, end, _ in tasks)
+    cut = total - int(total * fraction)
+    for i, (path, start, end, eot) in enumerate(tasks):
+        if cut < end - start:
+            # cut this chunk at the first boundary after the cut
+            with open(path, 'rb') as f:
+                middle = next_boundary(f, start + cut, os.path.getsize(path))
+            if middle >= end:
+                return tasks[:i + 1], tasks[i + 1:]
+            return tasks[:i] + [(path, start, middle, False)], [(path, middle, end, eot)] + tasks[i + 1:]
+        cut -= end - start
+    return tasks, []
+
+# the worker's encoder, set up once per process by init_worker
+encode = None
+
+def init_worker(tokenizer, stoi):
+    global encode
+    if tokenizer == 'gpt2':
+        import tiktoken
+        enc = tiktoken.get_encoding("gpt2")
+        def encode(text, eot):
+            ids = enc.encode_ordinary(text) # encode_ordinary ignores any special tokens
+            if eot:
+                ids.append(enc.eot_token)
+            return np.array(ids, dtype=np.uint16)
+    else:
+        # a lookup table from unicode code points to ids
+        lut = np.full(max(map(ord, stoi)) + 1, -1, dtype=np.int32)
+        for ch, i in stoi.items():
+            lut[ord(ch)] = i
+        def encode(text, eot):
+            points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+            ids = lut[np.minimum(points, len(lut) - 1)]
+            bad = (ids < 0) | (points >= len(lut))
+            if bad.any():
+                raise ValueError(f"character {text[np.argmax(bad)]!r} is not in the vocabulary")
+            return ids.astype(np.uint16)
+
+def read_chunk(task):
+    path, start, end, _ = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode('utf-8')
+
+def tokenize(task):
+    return encode(read_chunk(task), task[3])
+
+def count_chars(task):
+    text = read_chunk(task)
+    return len(text), set(text)
+
+def ordered(pool, func, tasks, window):
+    """ like pool.imap, but never more than window tasks ahead of the consumer """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def write_split(pool, tasks, capacity, filename, window):
+    arr = np.memmap(filename, dtype=np.uint16, mode='w+', shape=(max(capacity, 1),))
+    idx = 0
+    for ids in ordered(pool, tokenize, tasks, window):
+        arr[idx : idx + len(ids)] = ids
+        idx += len(ids)
+    arr.flush()
+    del arr
+    os.truncate(filename, idx * np.dtype(np.uint16).itemsize)
+    return idx
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help="the plain-text (utf-8) input files")
+    parser.add_argument('--out_dir', required=True, help="where train.bin, val.bin (and meta.pkl) are written")
+    parser.add_argument('--tokenizer', choices=['gpt2', 'char'], default='gpt2')
+    parser.add_argument('--meta', default=None, help="char tokenizer: reuse the vocabulary of this meta.pkl")
+    parser.add_argument('--eot', action='store_true', help="gpt2 tokenizer: append the end of text token to every file")
+    parser.add_argument('--val_fraction', type=float, default=0.1)
+    parser.add_argument('--chunk_size', type=int, default=4 << 20, help="in bytes")
+    parser.add_argument('--num_proc', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # (path, start, end, append eot) for every chunk, in order
+    tasks = []
+    for path in args.files:
+        chunks = list(find_chunks(path, args.chunk_size))
+        for i, (start, end) in enumerate(chunks):
+            tasks.append((path, start, end, args.eot and i == len(chunks) - 1))
+    num_bytes = sum(end - start for _, start, end, _ in tasks)
+    train_tasks, val_tasks = split_tasks(tasks, args.val_fraction)
+    splits = {'train': train_tasks, 'val': val_tasks}
+    print(f"{len(args.files):,} files, {num_bytes:,} bytes in {len(tasks):,} chunks")
+
+    window = 2 * args.num_proc
+    stoi = None
+    capacity = {}
+    if args.tokenizer == 'char':
+        with Pool(args.num_proc) as pool:
+            counts = {split: 0 for split in splits}
+            chars = set()
+            for split, chunk_tasks in splits.items():
+                for n, chunk_chars in ordered(pool, count_chars, chunk_tasks, window):
+                    counts[split] += n
+                    chars |= chunk_chars
+        if args.meta is not None:
+            with open(args.meta, 'rb') as f:
+                meta = pickle.load(f)
+        else:
+            chars = sorted(chars)
+            meta = {
+                'vocab_size': len(chars),
+                'itos': { i:ch for i,ch in enumerate(chars) },
+                'stoi': { ch:i for i,ch in enumerate(chars) },
+            }
+            with open(os.path.join(args.out_dir, 'meta.pkl'), 'wb') as f:
+                pickle.dump(meta, f)
+        assert meta['vocab_size'] <= 1 << 16, "the ids have to fit in uint16"
+        stoi = meta['stoi']
+        print(f"vocab size: {meta['vocab_size']:,}")
+        capacity = counts
+    else:
+        # every gpt2 token is at least a byte long
+        for split, chunk_tasks in splits.items():
+            capacity[split] = sum(end - start + eot for _, start, end, eot in chunk_tasks)
+
+    if args.tokenizer == 'gpt2':
+        init_worker(args.tokenizer, stoi)
+        check_boundaries(check_text)
+    with Pool(args.num_proc, initializer=init_worker, initargs=(args.tokenizer, stoi)) as pool:
+        for split, chunk_tasks in splits.items():
+            filename = os.path.join(args.out_dir, f'{split}.bin')
+            num_tokens = write_split(pool, chunk_tasks, capacity[split], filename, window)
+            print(f"{split} has {num_tokens:,} tokens")
+
+    # to read the bin files later, e.g. with numpy:
+    # m = np.memmap('train.bin', dtype=np.uint16, mode='r')
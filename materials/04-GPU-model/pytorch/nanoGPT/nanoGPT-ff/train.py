@@ -5,6 +5,14 @@ and also in a larger training run with distributed data parallel (ddp).
 To run on a single GPU, example:
 $ python train.py --batch_size=32 --compile=False
 
+To fast-forward to iteration 2000, snapshot the whole training state and exit, then
+resume from the snapshot and run exactly 10 iterations between m5 workbegin/workend
+(e.g. only those under a detailed gem5 GPU model, see ../train-ff.sh). The resumed run
+skips the evaluation and checkpoint that would otherwise run at iteration 2000, a multiple
+of eval_interval, so only the training iterations are measured. Example:
+$ python train.py config/train_shakespeare_char.py --ff_to_iter=2000
+$ python train.py config/train_shakespeare_char.py --init_from=snapshot --run_iters=10 --m5_work_markers=True
+
 To run with DDP on 4 gpus on 1 node, example:
 $ torchrun --standalone --nproc_per_node=4 train.py
 
@@ -20,6 +28,7 @@ import os
 import time
 import math
 import pickle
+import subprocess
 from contextlib import nullcontext
 
 import numpy as np
@@ -28,6 +37,7 @@ from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.distributed import init_process_group, destroy_process_group
 
 from model import GPTConfig, GPT
+from batch_loader import BatchLoader
 
 # -----------------------------------------------------------------------------
 # default config values designed to train a gpt2 (124M) on OpenWebText
@@ -38,7 +48,12 @@ log_interval = 1
 eval_iters = 200
 eval_only = False # if True, script exits right after the first eval
 always_save_checkpoint = True # if True, always save a checkpoint after each eval
-init_from = 'scratch' # 'scratch' or 'resume' or 'gpt2*'
+init_from = 'scratch' # 'scratch' or 'resume' or 'snapshot' or 'gpt2*'
+# fast-forward and resume, for short measured runs
+ff_to_iter = -1 # if >= 0, save out_dir/snapshot.pt when iter_num gets there, then exit
+run_iters = -1 # if >= 0, exit after exactly this many iterations (without evaluating), e.g. after init_from='snapshot'
+m5_work_markers = False # if True, run m5 workbegin/workend around the iterations (in a gem5 full system simulation)
+m5_binary = '/sbin/m5'
 # wandb logging
 wandb_log = False # disabled by default
 wandb_project = 'owt'
@@ -111,24 +126,10 @@ device_type = 'cuda' if 'cuda' in device else 'cpu' # for later use in torch.aut
 ptdtype = {'float32': torch.float32, 'bfloat16': torch.bfloat16, 'float16': torch.float16}[dtype]
 ctx = nullcontext() if device_type == 'cpu' else torch.amp.autocast(device_type=device_type, dtype=ptdtype)
 
-# poor man's data loader
+# data loader, see batch_loader.py
 data_dir = os.path.join('data', dataset)
-def get_batch(split):
-    # We recreate np.memmap every batch to avoid a memory leak, as per
-    # https://stackoverflow.com/questions/45132940/numpy-memmap-memory-usage-want-to-iterate-once/61472122#61472122
-    if split == 'train':
-        data = np.memmap(os.path.join(data_dir, 'train.bin'), dtype=np.uint16, mode='r')
-    else:
-        data = np.memmap(os.path.join(data_dir, 'val.bin'), dtype=np.uint16, mode='r')
-    ix = torch.randint(len(data) - block_size, (batch_size,))
-    x = torch.stack([torch.from_numpy((data[i:i+block_size]).astype(np.int64)) for i in ix])
-    y = torch.stack([torch.from_numpy((data[i+1:i+1+block_size]).astype(np.int64)) for i in ix])
-    if device_type == 'cuda':
-        # pin arrays x,y, which allows us to move them to GPU asynchronously (non_blocking=True)
-        x, y = x.pin_memory().to(device, non_blocking=True), y.pin_memory().to(device, non_blocking=True)
-    else:
-        x, y = x.to(device), y.to(device)
-    return x, y
+loader = BatchLoader(data_dir, block_size, batch_size, device, seed=1337 + seed_offset)
+get_batch = loader.get_batch
 
 # init these up here, can override if init_from='resume' (i.e. from a checkpoint)
 iter_num = 0
@@ -178,6 +179,24 @@ elif init_from == 'resume':
     model.load_state_dict(state_dict)
     iter_num = checkpoint['iter_num']
     best_val_loss = checkpoint['best_val_loss']
+elif init_from == 'snapshot':
+    print(f"Resuming training from the snapshot in {out_dir}")
+    # like 'resume', but the snapshot also has the RNG, data loader and GradScaler states
+    # and the batch in flight, so the run continues exactly where ff_to_iter stopped it
+    snapshot = torch.load(os.path.join(out_dir, 'snapshot.pt'), map_location=device)
+    for k in ['n_layer', 'n_head', 'n_embd', 'block_size', 'bias', 'vocab_size']:
+        model_args[k] = snapshot['model_args'][k]
+    gptconf = GPTConfig(**model_args)
+    model = GPT(gptconf)
+    state_dict = snapshot['model']
+    unwanted_prefix = '_orig_mod.' # as for 'resume', when the snapshot was taken with compile=True
+    for k,v in list(state_dict.items()):
+        if k.startswith(unwanted_prefix):
+            state_dict[k[len(unwanted_prefix):]] = state_dict.pop(k)
+    model.load_state_dict(state_dict)
+    iter_num = snapshot['iter_num']
+    best_val_loss = snapshot['best_val_loss']
+    checkpoint = snapshot
 elif init_from.startswith('gpt2'):
     print(f"Initializing from OpenAI GPT-2 weights: {init_from}")
     # initialize from OpenAI GPT-2 weights
@@ -197,8 +216,16 @@ scaler = torch.cuda.amp.GradScaler(enabled=(dtype == 'float16'))
 
 # optimizer
 optimizer = model.configure_optimizers(weight_decay, learning_rate, (beta1, beta2), device_type)
-if init_from == 'resume':
+if init_from in ('resume', 'snapshot'):
     optimizer.load_state_dict(checkpoint['optimizer'])
+if init_from == 'snapshot':
+    if checkpoint['scaler']: # empty if saved from a disabled GradScaler
+        scaler.load_state_dict(checkpoint['scaler'])
+    loader.load_state_dict(checkpoint['loader'])
+    torch.set_rng_state(checkpoint['rng_state'].cpu())
+    if device_type == 'cuda' and checkpoint['cuda_rng_state'] is not None:
+        torch.cuda.set_rng_state(checkpoint['cuda_rng_state'].cpu())
+    snapshot_batch = checkpoint['X'].to(device), checkpoint['Y'].to(device)
 checkpoint = None # free up memory
 
 # compile the model
@@ -246,21 +273,56 @@ if wandb_log and master_process:
     import wandb
     wandb.init(project=wandb_project, name=wandb_run_name, config=config)
 
+def m5_op(op):
+    # gem5 counts the work items between these, e.g. to only simulate them in detail
+    if m5_work_markers and ff_to_iter < 0:
+        if device_type == 'cuda':
+            torch.cuda.synchronize()
+        subprocess.run([m5_binary, op], check=True)
+
 # training loop
-X, Y = get_batch('train') # fetch the very first batch
+if init_from == 'snapshot':
+    X, Y = snapshot_batch # the batch fetched before the snapshot was taken
+else:
+    X, Y = get_batch('train') # fetch the very first batch
 t0 = time.time()
 local_iter_num = 0 # number of iterations in the lifetime of this process
 raw_model = model.module if ddp else model # unwrap DDP container if needed
 running_mfu = -1.0
+m5_op('workbegin')
 while True:
 
+    # fast-forward and measured runs end here, at the start of an iteration
+    if iter_num == ff_to_iter:
+        if master_process:
+            snapshot = {
+                'model': raw_model.state_dict(),
+                'optimizer': optimizer.state_dict(),
+                'scaler': scaler.state_dict(),
+                'model_args': model_args,
+                'iter_num': iter_num,
+                'best_val_loss': best_val_loss,
+                'config': config,
+                'loader': loader.state_dict(),
+                'rng_state': torch.get_rng_state(),
+                'cuda_rng_state': torch.cuda.get_rng_state() if device_type == 'cuda' else None,
+                'X': X.cpu(),
+                'Y': Y.cpu(),
+            }
+            print(f"saving snapshot at iter {iter_num} to {out_dir}")
+            torch.save(snapshot, os.path.join(out_dir, 'snapshot.pt'))
+        break
+    if local_iter_num == run_iters:
+        break
+
     # determine and set the learning rate for this iteration
     lr = get_lr(iter_num) if decay_lr else learning_rate
     for param_group in optimizer.param_groups:
         param_group['lr'] = lr
 
-    # evaluate the loss on train/val sets and write checkpoints
-    if iter_num % eval_interval == 0 and master_process:
+    # evaluate the loss on train/val sets and write checkpoints, except in measured runs,
+    # which should only time the training iterations themselves
+    if iter_num % eval_interval == 0 and master_process and run_iters < 0:
         losses = estimate_loss()
         print(f"step {iter_num}: train loss {losses['train']:.4f}, val loss {losses['val']:.4f}")
         if wandb_log:
@@ -331,6 +393,7 @@ while True:
     # termination conditions
     if iter_num > max_iters:
         break
+m5_op('workend')
 
 if ddp:
     destroy_process_group()
@@ -1,3 +1,25 @@
 # This script assumes your GPUFS disk image have nanoGPT-ff in the /root/ directory.
+#
+# ./train-ff.sh                  trains from scratch
+# ./train-ff.sh snapshot <N>     trains to iteration N, saves out-shakespeare-char/snapshot.pt and exits
+# ./train-ff.sh resume <K>       runs K iterations from the snapshot, between m5 workbegin and workend
+#
+# Changes to the disk image are not kept after a gem5 run, so take the snapshot outside of gem5
+# (e.g. on the host, with --device=cpu --compile=False appended) and copy it into the image
+# along with nanoGPT-ff, then pass "resume <K>" to the application with --opts.
 cd nanoGPT-ff
-python3 train.py config/train_shakespeare_char.py
+case "$1" in
+    snapshot)
+        iters=${2:-100}
+        shift $(( $# < 2 ? $# : 2 ))
+        python3 train.py config/train_shakespeare_char.py --ff_to_iter=$iters "$@"
+        ;;
+    resume)
+        iters=${2:-1}
+        shift $(( $# < 2 ? $# : 2 ))
+        python3 train.py config/train_shakespeare_char.py --init_from=snapshot --run_iters=$iters --m5_work_markers=True "$@"
+        ;;
+    *)
+        python3 train.py config/train_shakespeare_char.py
+        ;;
+esac
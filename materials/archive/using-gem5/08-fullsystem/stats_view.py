@@ -0,0 +1,170 @@
+# Copyright (c) 2024 The Regents of the University of California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A lazy view of the live statistics of a simulation.
+
+`get_simstat(root).to_json()` prepares and serializes every statistic of
+the simulation, which on large systems is hundreds of thousands of entries,
+just to read a few of them. `StatsView` instead walks the stat groups along
+the requested dotted paths only, e.g.,
+
+```
+stats = StatsView(root)
+stats.stat("board.processor.cores2.core.commitStats0.numInsts")
+stats.sum("board.processor.cores*.core.commitStats0.numInsts")
+```
+
+Path components may be globs. Group names which contain dots (such as
+`exec_context.thread_0`) are matched as well. The stat groups a pattern
+resolves to are cached, so reading the same stats again (e.g., at the end of
+every region of interest) only reads their current values.
+"""
+
+import fnmatch
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from m5.objects import Root
+
+_GLOB_CHARS = frozenset("*?[")
+
+
+def _filter(names, pattern: str) -> List[str]:
+    if _GLOB_CHARS.isdisjoint(pattern):
+        return [pattern] if pattern in names else []
+    return fnmatch.filter(names, pattern)
+
+
+class StatsView:
+    """Resolves dotted stat paths against the live stat groups."""
+
+    def __init__(self, root: Root = None):
+        """
+        :param root: The root of the simulation. Defaults to the Root
+                     instance.
+        """
+        self._root = root if root is not None else Root.getInstance()
+        # the child groups and stats of every group visited so far, by path
+        self._nodes: Dict[str, Tuple[Dict, Dict]] = {}
+        # the (name, group, stat) triples every pattern resolved to
+        self._resolved: Dict[str, List[Tuple[str, object, object]]] = {}
+
+    def _node(self, path: str, group) -> Tuple[Dict, Dict]:
+        if path not in self._nodes:
+            self._nodes[path] = (
+                dict(group.getStatGroups()),
+                {stat.name: stat for stat in group.getStats()},
+            )
+        return self._nodes[path]
+
+    def _resolve(
+        self, path: str, group, parts: List[str]
+    ) -> List[Tuple[str, object, object]]:
+        groups, stats = self._node(path, group)
+        prefix = f"{path}." if path else ""
+        found = []
+        # a path component may span several dotted parts of the pattern
+        for end in range(1, len(parts) + 1):
+            pattern = ".".join(parts[:end])
+            if end < len(parts):
+                for name in _filter(groups, pattern):
+                    found += self._resolve(
+                        prefix + name, groups[name], parts[end:]
+                    )
+            else:
+                for name in _filter(stats, pattern):
+                    found.append((prefix + name, group, stats[name]))
+        return found
+
+    def _lookup(self, pattern: str) -> List[Tuple[str, object, object]]:
+        if pattern not in self._resolved:
+            found = self._resolve("", self._root, pattern.split("."))
+            unique = {}
+            for name, group, stat in found:
+                unique.setdefault(name, (name, group, stat))
+            self._resolved[pattern] = list(unique.values())
+        return self._resolved[pattern]
+
+    @staticmethod
+    def _read(found) -> List[Union[float, np.ndarray]]:
+        # only the groups owning the stats read are brought up to date
+        prepared = set()
+        values = []
+        for _, group, stat in found:
+            if id(group) not in prepared:
+                group.preDumpStats()
+                prepared.add(id(group))
+            stat.prepare()
+            value = stat.value
+            if isinstance(value, (int, float)):
+                values.append(float(value))
+            else:
+                values.append(np.asarray(value, dtype=np.float64))
+        return values
+
+    def match(self, pattern: str) -> List[str]:
+        """Return the paths of the stats matching ``pattern``."""
+        return [name for name, _, _ in self._lookup(pattern)]
+
+    def stat(self, path: str) -> Union[float, np.ndarray]:
+        """
+        Return the current value of the stat at ``path``. Vector stats are
+        returned as arrays.
+        """
+        found = self._lookup(path)
+        if len(found) != 1:
+            raise KeyError(
+                f"{path} matches {len(found)} stats, expected exactly one."
+            )
+        return self._read(found)[0]
+
+    def stats(self, pattern: str) -> Dict[str, Union[float, np.ndarray]]:
+        """Return the current values of the stats matching ``pattern``."""
+        found = self._lookup(pattern)
+        return {
+            name: value
+            for (name, _, _), value in zip(found, self._read(found))
+        }
+
+    def values(self, pattern: str) -> np.ndarray:
+        """
+        Return the current values of the stats matching ``pattern`` as one
+        array. Vector stats are flattened into it.
+        """
+        found = self._lookup(pattern)
+        if not found:
+            return np.empty(0)
+        return np.concatenate(
+            [np.atleast_1d(value) for value in self._read(found)]
+        )
+
+    def sum(self, pattern: str) -> float:
+        """Return the sum of the stats matching ``pattern``."""
+        if not self._lookup(pattern):
+            raise KeyError(f"No stat matches {pattern}.")
+        return float(self.values(pattern).sum())
@@ -62,9 +62,10 @@ from gem5.isas import ISA
 from gem5.coherence_protocol import CoherenceProtocol
 from gem5.resources.resource import Resource, CustomResource, CustomDiskImageResource
 
-from m5.stats.gem5stats import get_simstat
 from m5.util import warn
 
+from stats_view import StatsView
+
 requires(
     isa_required = ISA.X86,
     coherence_protocol_required=CoherenceProtocol.MESI_TWO_LEVEL,
@@ -312,22 +313,16 @@ else:
 # point, but, the ROI has. We collect the essential statistics here before
 # resuming the simulation again.
 
-# We get simInsts using get_simstat and output it in the final
-# print statement.
+# We read the instructions committed in the ROI with a StatsView, which only
+# looks up the stats we ask for rather than serializing all of them.
 
-gem5stats = get_simstat(root)
+gem5stats = StatsView(root)
 
 # We get the number of committed instructions from the timing
-# cores. We then sum and print them at the end.
-
-roi_insts = float(\
-    gem5stats.to_json()\
-    ["system"]["processor"]["cores2"]["core"]["exec_context.thread_0"]\
-    ["numInsts"]["value"]
-) + float(\
-    gem5stats.to_json()\
-    ["system"]["processor"]["cores3"]["core"]["exec_context.thread_0"]\
-    ["numInsts"]["value"]\
+# cores (cores2 and cores3). We then sum and print them at the end.
+
+roi_insts = gem5stats.sum(
+    "system.processor.cores[23].core.exec_context.thread_0.numInsts"
 )
 
 # Simulation is over at this point. We acknowledge that all the simulation